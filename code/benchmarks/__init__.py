@@ -0,0 +1,3 @@
+## @package benchmarks
+# Contains scripts to measure the performance of the storage and the processing of recordings.
+# Run them from the code directory, e.g. python -m benchmarks.nix_storage
@@ -0,0 +1,151 @@
+## @package benchmarks.kernels
+# Compares the numeric kernels of metrics.kernels with the previous computations on quantities.
+# For each kernel, the computation with quantities and the public function that calls the kernel are run on the same synthetic data,
+# their results are checked for agreement, and the time per call as well as the speedup are reported.
+# Run from the code directory: python -m benchmarks.kernels --repeats 20
+
+import argparse
+import time
+from math import floor, sqrt
+from statistics import median
+from typing import Callable, List, Tuple
+
+import numpy as np
+from neo.core import AnalogSignal, Event, Segment, SpikeTrain
+from quantities import Hz, Quantity, ms, s, uV
+from scipy.signal import correlate
+
+from features.extraction.normalized_energy import NormalizedSignalEnergyExtractor
+from features.extraction.spike_count import SpikeCountExtractor
+from fibre_tracking.track_correlation import search_for_max_tc
+from metrics import kernels
+from metrics.root_mean_square_power import median_RMS, root_mean_square_power
+from neo_importers.neo_wrapper import MNGRecording
+
+## The root mean square with quantities, as root_mean_square_power computed it
+def _quantity_rms(signal: Quantity) -> Quantity:
+    squared_signal = signal**2
+    return sqrt(np.sum(squared_signal.magnitude) / len(signal)) * signal.units * signal.units
+
+## The median RMS with quantities, as median_RMS computed it for analog signals
+def _quantity_median_rms(raw_signal: AnalogSignal, el_stimuli: List, center_stim_idx: int, latency_slope: Quantity, latency: Quantity, radius: int, window_size: Quantity) -> Quantity:
+    rms = []
+    for r, el_stimulus in zip(range(-radius, radius + 1), el_stimuli[center_stim_idx - radius : center_stim_idx + radius]):
+        t = el_stimulus.time + latency + r * latency_slope
+        t_min_idx = max(floor((t - (window_size / 2)) * raw_signal.sampling_rate), 0)
+        t_max_idx = max(min(floor((t + (window_size / 2)) * raw_signal.sampling_rate), len(raw_signal)), 0)
+        rms.append(_quantity_rms(raw_signal[t_min_idx : t_max_idx]))
+    return median(rms)
+
+## The search for the maximum track correlation with quantities, as search_for_max_tc computed it without penalty term
+def _quantity_search_for_max_tc(raw_signal: AnalogSignal, el_stimuli: List, sweep_idx: int, latency: Quantity, max_shift: Quantity, max_slope: Quantity, \
+    radius: int, window_size: Quantity) -> Tuple[Quantity, float]:
+    latencies = np.linspace(start = latency - max_shift, stop = latency + max_shift, num = 26)
+    slopes = np.linspace(start = -max_slope, stop = max_slope, num = 26)
+    tcs = [max(_quantity_median_rms(raw_signal, el_stimuli, sweep_idx, slope, lat, radius, window_size) for slope in slopes) for lat in latencies]
+    return latencies[np.argmax(tcs)], float(max(tcs))
+
+## The normalized energy with quantities, as NormalizedSignalEnergyExtractor computed it
+def _quantity_normalized_energy(raw_signal: Quantity) -> Quantity:
+    return np.sum(np.square(raw_signal)) / len(raw_signal)
+
+## The spike count with quantities and boolean masks, as SpikeCountExtractor computed it
+def _quantity_spike_count(ap_times: np.ndarray, ap_time: Quantity, timeframe: Quantity, num_intervals: int) -> Quantity:
+    t_min = ap_time - timeframe
+    interval_len = timeframe / num_intervals
+    spike_counts = np.zeros(shape = (num_intervals, ), dtype = int)
+    for interval_idx in range(num_intervals):
+        spike_counts[interval_idx] = len(ap_times[(ap_times > t_min.magnitude) & (ap_times < (t_min + interval_len).magnitude)])
+        t_min += interval_len
+    return spike_counts * Quantity(1.)
+
+## The normalized cross correlation of two plain arrays, as normalized_cross_correlation computed it
+def _python_normalized_cross_correlation(x: np.ndarray, y: np.ndarray) -> float:
+    corr = correlate(x, y, 'valid')
+    corr = corr / sqrt(np.sum(np.square(x)) * sum(np.square(y)))
+    return max(corr)
+
+## Creates a recording with a synthetic raw signal, regular stimuli and random APs
+#  @param duration duration of the signal in seconds
+#  @param sampling_rate sampling rate in Hz
+#  @returns the recording
+def _synthetic_recording(duration: float, sampling_rate: float) -> MNGRecording:
+    rng = np.random.default_rng(0)
+    segment = Segment()
+    segment.analogsignals.append(AnalogSignal(rng.normal(scale = 10.0, size = (int(duration * sampling_rate), 1)), units = uV, sampling_rate = sampling_rate * Hz, \
+        id = "rd.0", type_id = "rd"))
+    segment.events.append(Event(times = np.arange(0.5, duration - 1, 2.0) * s, labels = np.array(["stimulus"] * len(np.arange(0.5, duration - 1, 2.0))), id = "es.0", type_id = "es"))
+    ap_times = np.sort(rng.uniform(0, duration, size = int(duration * 10)))
+    segment.spiketrains.append(SpikeTrain(ap_times * s, t_stop = duration * s, waveforms = rng.normal(size = (len(ap_times), 1, 30)) * uV, \
+        sampling_rate = sampling_rate * Hz, id = "ap.0", type_id = "ap"))
+    return MNGRecording(segment, name = "benchmark")
+
+## Measures the time per call of a function
+#  @param func the function to call without arguments
+#  @param repeats number of calls
+#  @returns the median time per call in microseconds
+def _time_per_call(func: Callable[[], object], repeats: int) -> float:
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return float(np.median(durations)) * 1e6
+
+## Runs the benchmark for all kernels
+#  @param duration duration of the synthetic signal in seconds
+#  @param sampling_rate sampling rate in Hz
+#  @param repeats number of calls of each function
+#  @returns a list of rows with the name of the kernel, the time per call with quantities and with the kernel in microseconds, and the speedup
+def run_benchmark(duration: float, sampling_rate: float, repeats: int) -> List[Tuple[str, float, float, float]]:
+    recording = _synthetic_recording(duration, sampling_rate)
+    raw_signal: AnalogSignal = recording.raw_data_channels["rd.0"]
+    el_stimuli = recording.electrical_stimulus_channels["es.0"]
+    el_stimuli_list = list(el_stimuli)
+    ap_channel = recording.action_potential_channels["ap.0"]
+    action_potential = ap_channel[len(ap_channel) // 2]
+    center_idx = len(el_stimuli) // 2
+    window = raw_signal[1000 : 1040]
+    template = raw_signal[2000 : 2030].magnitude.ravel()
+    long_window = raw_signal[3000 : 3400].magnitude.ravel()
+
+    spike_count = SpikeCountExtractor(recording, 6, 2 * s)
+    spike_count.current_channel = ap_channel
+    spike_count.prepare_extraction()
+    normalized_energy = NormalizedSignalEnergyExtractor(recording)
+
+    # each case is the computation with quantities, the one with the kernel and a function to compare their results
+    cases = [
+        ("rms", lambda: _quantity_rms(window), lambda: root_mean_square_power(window), float),
+        ("median_rms", lambda: _quantity_median_rms(raw_signal, el_stimuli_list, center_idx, 1 * ms, 10 * ms, 2, 2 * ms), \
+            lambda: median_RMS(raw_signal, el_stimuli, center_idx, 1 * ms, 10 * ms, 2, 2 * ms), float),
+        ("track correlation search", lambda: _quantity_search_for_max_tc(raw_signal, el_stimuli_list, center_idx, 10 * ms, 3 * ms, 3 * ms, 2, 1 * ms), \
+            lambda: search_for_max_tc(raw_signal, el_stimuli, center_idx, 10 * ms, max_shift = 3 * ms, max_slope = 3 * ms, radius = 2, window_size = 1 * ms), \
+            lambda result: float(result[0].rescale(s))),
+        ("mean_square (normalized energy)", lambda: _quantity_normalized_energy(action_potential.raw_signal), \
+            lambda: normalized_energy.compute_feature_datapoint(action_potential), float),
+        ("interval_counts (spike count)", lambda: _quantity_spike_count(spike_count.ap_times, action_potential.time, 2 * s, 6), \
+            lambda: spike_count.compute_feature_datapoint(action_potential), lambda result: tuple(result.magnitude)),
+        ("normalized_cross_correlation", lambda: _python_normalized_cross_correlation(long_window, template), \
+            lambda: kernels.normalized_cross_correlation(long_window, template), lambda result: round(float(result), 9)),
+    ]
+
+    results = []
+    for name, quantity_func, kernel_func, compare in cases:
+        if compare(quantity_func()) != compare(kernel_func()) and not np.isclose(compare(quantity_func()), compare(kernel_func()), rtol = 1e-9):
+            raise AssertionError(f"The results of {name} differ: {quantity_func()} and {kernel_func()}")
+        quantity_time = _time_per_call(quantity_func, repeats)
+        kernel_time = _time_per_call(kernel_func, repeats)
+        results.append((name, quantity_time, kernel_time, quantity_time / kernel_time))
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Compares the numeric kernels with the computations on quantities.")
+    parser.add_argument("--duration", type = float, default = 120, help = "duration of the synthetic signal in seconds")
+    parser.add_argument("--sampling-rate", type = float, default = 20000, help = "sampling rate of the synthetic signal in Hz")
+    parser.add_argument("--repeats", type = int, default = 20, help = "number of calls of each function")
+    args = parser.parse_args()
+
+    print(f"{'kernel':<34}{'quantities (us)':>18}{'kernel (us)':>14}{'speedup':>10}")
+    for name, quantity_time, kernel_time, speedup in run_benchmark(args.duration, args.sampling_rate, args.repeats):
+        print(f"{name:<34}{quantity_time:>18.1f}{kernel_time:>14.1f}{speedup:>9.1f}x")
@@ -0,0 +1,97 @@
+## @package benchmarks.nix_storage
+# Compares the storage settings of recording_io.store_block for analog signals.
+# For each setting, a synthetic recording is written to a NIX file, and the file size, the write time and the latency of reading random short windows
+# through the lazy loading of recording_io.load_block are reported.
+# Run from the code directory: python -m benchmarks.nix_storage --duration 600 --windows 200
+
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+from neo.core import AnalogSignal, Block, Segment
+from quantities import Hz, s, uV
+
+from neo_importers.recording_io import close_lazy_files, load_block, store_block
+
+## Storage settings to compare, by their name, see store_block
+SETTINGS: Dict[str, Dict] = {
+    "default": {},
+    "chunk 4096": {"chunk_size": 4096},
+    "chunk 4096 gzip": {"chunk_size": 4096, "compression": "gzip", "compression_level": 4},
+    "chunk 4096 lzf": {"chunk_size": 4096, "compression": "lzf"},
+    "chunk 4096 float32": {"chunk_size": 4096, "dtype": "float32"},
+    "chunk 4096 int16": {"chunk_size": 4096, "dtype": "int16"},
+    "chunk 4096 int16 lzf": {"chunk_size": 4096, "dtype": "int16", "compression": "lzf"},
+    "chunk 65536 int16 gzip": {"chunk_size": 65536, "dtype": "int16", "compression": "gzip", "compression_level": 4},
+}
+
+## Creates a block with a synthetic raw signal: noise with spikes, which compresses about as well as a real recording
+#  @param duration duration of the signal in seconds
+#  @param sampling_rate sampling rate in Hz
+#  @returns the block with one segment containing the signal
+def _synthetic_block(duration: float, sampling_rate: float) -> Block:
+    rng = np.random.default_rng(0)
+    samples = rng.normal(scale = 10.0, size = int(duration * sampling_rate))
+    spike_idcs = rng.integers(0, len(samples) - 20, size = int(duration * 5))
+    for offset, amplitude in enumerate([40, 120, 80, -30, -20]):
+        samples[spike_idcs + offset] += amplitude
+    signal = AnalogSignal(samples[:, np.newaxis], units = uV, sampling_rate = sampling_rate * Hz, name = "Synthetic Signal")
+    signal.annotate(id = "rd.0", type_id = "rd")
+    segment = Segment()
+    segment.analogsignals.append(signal)
+    block = Block(name = "benchmark")
+    block.segments.append(segment)
+    return block
+
+## Measures the latency of reading windows from the lazily loaded signal
+#  @param file_name the NIX file
+#  @param window_starts the start times of the windows in seconds
+#  @param window_duration the duration of the windows in seconds
+#  @returns the median and the maximum latency in milliseconds
+def _window_read_latency(file_name: Path, window_starts: np.ndarray, window_duration: float) -> Tuple[float, float]:
+    block, _ = load_block(file_name, lazy = True)
+    proxy = block.segments[0].analogsignals[0]
+    latencies = []
+    for window_start in window_starts:
+        start = time.perf_counter()
+        proxy.time_slice(window_start * s, (window_start + window_duration) * s)
+        latencies.append((time.perf_counter() - start) * 1000)
+    close_lazy_files(file_name)
+    return float(np.median(latencies)), float(np.max(latencies))
+
+## Runs the benchmark for all settings
+#  @param duration duration of the synthetic signal in seconds
+#  @param sampling_rate sampling rate in Hz
+#  @param num_windows number of random windows to read
+#  @param window_duration duration of the windows in seconds
+#  @returns a list of rows with the name of the setting, the file size in MB, the write time in s and the median and maximum window read latency in ms
+def run_benchmark(duration: float, sampling_rate: float, num_windows: int, window_duration: float) -> List[Tuple[str, float, float, float, float]]:
+    block = _synthetic_block(duration, sampling_rate)
+    window_starts = np.random.default_rng(1).uniform(0, duration - window_duration, size = num_windows)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, settings in SETTINGS.items():
+            file_name = Path(tmp_dir)/"benchmark.nix"
+            start = time.perf_counter()
+            store_block(file_name, block, **settings)
+            write_time = time.perf_counter() - start
+            median_latency, max_latency = _window_read_latency(file_name, window_starts, window_duration)
+            results.append((name, os.path.getsize(file_name) / 1e6, write_time, median_latency, max_latency))
+            os.remove(file_name)
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Compares the storage settings for analog signals in NIX files.")
+    parser.add_argument("--duration", type = float, default = 300, help = "duration of the synthetic signal in seconds")
+    parser.add_argument("--sampling-rate", type = float, default = 20000, help = "sampling rate of the synthetic signal in Hz")
+    parser.add_argument("--windows", type = int, default = 200, help = "number of random windows to read")
+    parser.add_argument("--window-duration", type = float, default = 0.05, help = "duration of the windows in seconds")
+    args = parser.parse_args()
+
+    print(f"{'setting':<24}{'size (MB)':>12}{'write (s)':>12}{'read median (ms)':>18}{'read max (ms)':>15}")
+    for name, size, write_time, median_latency, max_latency in run_benchmark(args.duration, args.sampling_rate, args.windows, args.window_duration):
+        print(f"{name:<24}{size:>12.1f}{write_time:>12.2f}{median_latency:>18.2f}{max_latency:>15.2f}")
@@ -2,7 +2,7 @@ from neo_importers.neo_wrapper import MNGRecording, ActionPotentialWrapper
 from features.extraction.feature_extractor import FeatureExtractor
 from typing import Union
 from quantities import Quantity, millivolt
-import numpy as np
+from metrics import kernels
 
 ## Calculates the normalized signal energy for an action potential
 class NormalizedSignalEnergyExtractor(FeatureExtractor):
@@ -24,4 +24,5 @@ class NormalizedSignalEnergyExtractor(FeatureExtractor):
     # 2.) divide by the number of values for normalization
     # @param action_potential The AP for which the normalized energy is calculated.
     def compute_feature_datapoint(self, action_potential: ActionPotentialWrapper) -> Quantity:
-        return np.sum(np.square(action_potential.raw_signal)) / len(action_potential.raw_signal)
\ No newline at end of file
+        raw_signal = action_potential.raw_signal
+        return Quantity(kernels.mean_square(raw_signal.magnitude), raw_signal.dimensionality**2)
\ No newline at end of file
@@ -3,6 +3,7 @@ from typing import Union
 from neo_importers.neo_wrapper import MNGRecording, ActionPotentialWrapper
 from features.extraction.feature_extractor import FeatureExtractor
 from quantities import Quantity
+from metrics import kernels
 import numpy as np
 
 ## Extractor class for the regular spike count with equally sized intervals
@@ -30,30 +31,30 @@ class SpikeCountExtractor(FeatureExtractor):
     # Subdivide the timeframe before the action potential into several small fragments, then count the number of APs in each of these fragments.
     def compute_feature_datapoint(self, action_potential: ActionPotentialWrapper) -> Quantity:
 
-        t_min = action_potential.time - self.timeframe
-        interval_len = self.timeframe / self.num_intervals
-        # pre-allocate
-        spike_counts = np.zeros(shape = (self.num_intervals, ), dtype = np.int)
-
-        for interval_idx in range(self.num_intervals):
-            # calculate spike count and advance to next interval
-            spike_counts[interval_idx] = len(self.ap_times[(self.ap_times > t_min) & (self.ap_times < t_min + interval_len)])
-            t_min += interval_len
+        t_min = float(kernels.magnitude(action_potential.time, "s")) - self.timeframe_s
+        interval_len = self.timeframe_s / self.num_intervals
+        # the intervals follow each other, count the APs in all of them at once
+        # the starts are accumulated like advancing from one interval to the next, so the borders are the same up to the last bit
+        interval_starts = np.cumsum(np.concatenate([[t_min], np.full(self.num_intervals - 1, interval_len)]))
+        spike_counts = kernels.interval_counts(self.ap_times, interval_starts, interval_starts + interval_len)
 
         return spike_counts * self.feature_units()
 
     ## Here, we collect all APs in a single list s.t. we can compute the spike count later
     def prepare_extraction(self) -> None:
-        # get arrays of ap times for each channel
-        all_ap_times = [np.array([ap.time for ap in channel]) for channel in self.recording.action_potential_channels.values()]
+        # get arrays of ap times in seconds for each channel
+        all_ap_times = [kernels.magnitude(channel.times(), "s") for channel in self.recording.action_potential_channels.values()]
 
         # merge
         self.ap_times = np.concatenate(all_ap_times)
         self.ap_times.sort()
+        # a timeframe without units is given in seconds
+        self.timeframe_s = float(kernels.magnitude(self.timeframe, "s"))
 
     # perform some clean-up
     def finalize_feature(self, feature: Feature) -> Feature:
         del self.ap_times
+        del self.timeframe_s
         return super().finalize_feature(feature)
 
 ## Builds a feature vector that saves the number of action potentials for each sub-interval.
@@ -74,16 +75,10 @@ class AdaptiveSpikeCountExtractor(SpikeCountExtractor):
     # Subdivide the timeframe before the action potential into several small fragments, then count the number of APs in each of these fragments.
     def compute_feature_datapoint(self, action_potential: ActionPotentialWrapper) -> Quantity:
 
-        t_min = action_potential.time - self.timeframe
-        interval_len = self.timeframe / 2.0
-        # pre-allocate
-        spike_counts = np.zeros(shape = (self.num_intervals, ), dtype = np.int)
-
-        for interval_idx in range(self.num_intervals):
-            # calculate spike count and advance to next interval
-            spike_counts[interval_idx] = len(self.ap_times[(self.ap_times > t_min) & (self.ap_times < t_min + interval_len)])
-            # half the interval length and increase starting time
-            interval_len = interval_len / 2.0
-            t_min += interval_len
+        t_min = float(kernels.magnitude(action_potential.time, "s")) - self.timeframe_s
+        # half the interval length for each interval and increase the starting time by the new length
+        interval_lens = self.timeframe_s / 2.0 ** np.arange(1, self.num_intervals + 1)
+        interval_starts = np.cumsum(np.concatenate([[t_min], interval_lens[1:]]))
+        spike_counts = kernels.interval_counts(self.ap_times, interval_starts, interval_starts + interval_lens)
 
         return spike_counts * self.feature_units()
\ No newline at end of file
@@ -1,7 +1,7 @@
 from neo.core.analogsignal import AnalogSignal
 from quantities.quantity import Quantity
-from neo_importers.neo_wrapper import ActionPotentialWrapper, ElectricalStimulusWrapper
-from typing import Tuple, List, Iterable
+from neo_importers.neo_wrapper import ActionPotentialWrapper, ElectricalStimulusWrapper, ChannelWrapper, ChannelView, SweepIndex, TypeID
+from typing import Tuple, List, Iterable, Optional
 from pathlib import Path
 import csv
 import os
@@ -14,6 +14,17 @@ import traceback
 from fibre_tracking.ap_template import ActionPotentialTemplate
 from fibre_tracking.track_correlation import track_correlation, get_tc_noise_estimate, search_for_max_tc
 
+## Returns the cached sweep index of the recording, if the stimuli are a whole electrical stimulus channel and the APs are (a view of) an AP channel of the same recording
+# @param el_stimuli the electrical stimuli
+# @param aps the action potentials
+# @return the sweep index, or None if the arguments are other iterables of wrappers
+def _channel_sweep_index(el_stimuli: Iterable[ElectricalStimulusWrapper], aps: Iterable[ActionPotentialWrapper]) -> Optional[SweepIndex]:
+    if not isinstance(el_stimuli, ChannelWrapper) or isinstance(el_stimuli, ChannelView) or not isinstance(aps, ChannelWrapper):
+        return None
+    if el_stimuli.recording is not aps.recording or el_stimuli.type_id != TypeID.ELECTRICAL_STIMULUS or aps.type_id != TypeID.ACTION_POTENTIAL:
+        return None
+    return aps.recording.sweep_index(el_stimuli.id, aps.id)
+
 ## An AP track which means that a for number of sweeps 0 to k, we have latencies t_0, ..., t_k that belong to a latency track.
 # A latency track can therefore also be written as a list of entries (i, t_i) where i is the sweep index and t_i the corresponding latency.
 # This is what we are trying to achieve with this class.
@@ -39,12 +50,27 @@ class APTrack(object):
         self._latencies = sorted(latencies, key = lambda latency: latency[0])
         self._display_color = display_color
     
+    ## Method to construct an AP track from arrays of sweep indices and latencies, e.g. as returned by neo_utils.stimulus_indices
+    # @param sweep_idcs Array of the sweep index for each latency
+    # @param latencies Array of the latencies (as time quantity) 
+    @staticmethod
+    def from_arrays(sweep_idcs: Iterable[int], latencies: Quantity):
+        latencies = Quantity(latencies, "s") if not isinstance(latencies, Quantity) else latencies.rescale(second)
+        return APTrack(latencies = list(zip(np.asarray(sweep_idcs).tolist(), latencies)))
+
     ## Method to construct an AP track class from some action potentials.
+    # If the stimuli are a stimulus channel and the APs are (a view of) an AP channel of a recording, the sweeps are looked up in the cached sweep index of the recording
     # @param sweeps List of sweeps
     # @param aps List of action potentials
     @staticmethod
     def from_aps(el_stimuli: Iterable[ElectricalStimulusWrapper], aps: Iterable[ActionPotentialWrapper]):
-        
+        sweep_index = _channel_sweep_index(el_stimuli, aps)
+        if sweep_index is not None:
+            # look up the sweeps of all APs at once, APs before the first stimulus are assigned to the first sweep
+            sweep_idcs = np.maximum(sweep_index.sweep_indices[np.asarray(aps.indices)], 0)
+            latencies = aps.times() - el_stimuli.times(sweep_idcs) + aps.durations() / 2
+            return APTrack.from_arrays(sweep_idcs = sweep_idcs, latencies = latencies)
+
         # this list is meant to store the lateny tuples that are required to spawn a new AP track
         latencies = []
         
@@ -68,6 +94,7 @@ class APTrack(object):
         pass
 
     ## For each sweep and each latency, the closest AP is searched and assigned as an AP that belongs to this track.
+    # If the stimuli and the APs are channels of a recording, the APs of each sweep are looked up in the cached sweep index of the recording
     # @param sweeps List of sweeps in this recording
     # @return List of action potentials that potentially belong to this track
     def get_nearest_existing_aps(self, el_stimuli: Iterable[ElectricalStimulusWrapper], action_potentials: Iterable[ActionPotentialWrapper], dist_threshold = 0.05):
@@ -75,8 +102,25 @@ class APTrack(object):
         # TODO check if this should not rather return a neo channel object containing the times
         # this would fit better into our new data structure
         actpots = []
-        ap_idx = 0
 
+        sweep_index = _channel_sweep_index(el_stimuli, action_potentials)
+        if sweep_index is not None and not isinstance(action_potentials, ChannelView):
+            # the APs of each sweep and their latencies are looked up in the cached sweep index
+            units = sweep_index.latencies.units
+            threshold = float(Quantity(dist_threshold, "s").rescale(units).magnitude)
+            for (sweep_idx, latency) in self._latencies:
+                ap_start, ap_stop = sweep_index.ap_starts[sweep_idx], sweep_index.ap_stops[sweep_idx]
+                if ap_stop == ap_start:
+                    continue
+                # calculate the absolute distances between the projected latency track point and the APs
+                dists = np.abs(float(Quantity(latency, "s").rescale(units).magnitude) - sweep_index.latencies.magnitude[ap_start : ap_stop])
+                #Check if a valid AP according to the threshold was found
+                if np.min(dists) < threshold:
+                    # add the closest AP
+                    actpots.append(action_potentials[int(ap_start + np.argmin(dists))])
+            return actpots
+
+        ap_idx = 0
         for (sweep_idx, latency) in self._latencies:
             # get the sweep corresponding to this sweep index
             el_stimulus: ElectricalStimulusWrapper = el_stimuli[sweep_idx]
@@ -98,8 +142,8 @@ class APTrack(object):
             dists = [abs(latency - (ap.time - el_stimulus.time)) for ap in aps_in_sweep]
             #Check if a valid AP according to the threshold was found
             if np.min(dists) < dist_threshold:
-                # add the closest AP
-                min_dist_ap_idx = np.argmin(dists)
+                # add the closest AP, the distances are relative to the first AP of the sweep
+                min_dist_ap_idx = ap_idx + np.argmin(dists)
                 actpots.append(action_potentials[min_dist_ap_idx])
 
         return actpots
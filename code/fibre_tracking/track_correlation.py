@@ -7,7 +7,7 @@ import numpy as np
 import random as rnd
 from statistics import median
 from math import pi, cos
-from metrics import median_RMS
+from metrics.root_mean_square_power import median_RMS_grid
 from scipy.signal import argrelextrema
 from quantities import ms
 
@@ -25,12 +25,12 @@ def track_correlation(raw_signal: AnalogSignal, el_stimuli: Iterable[ElectricalS
     
     # build a linear space of float values between the minimum and maximum latency shift, i.e. the slope of the linear approximation of the track
     slopes = np.linspace(start = -max_slope, stop = max_slope, num = 26)
-    rms = [median_RMS(raw_signal = raw_signal, el_stimuli = el_stimuli, center_stim_idx = center_sweep_idx, latency_slope = slope, latency = latency, radius = radius, window_size = window_size) for slope in slopes]
+    rms = median_RMS_grid(raw_signal = raw_signal, el_stimuli = el_stimuli, center_stim_idx = center_sweep_idx, latency_slopes = slopes, latencies = latency, radius = radius, window_size = window_size)
     
     # get the maximum shift, i.e. the optimal slope
     max_slope = slopes[np.argmax(rms)]
     # return it together with the track correlation
-    return max(rms), max_slope
+    return rms[np.argmax(rms)], max_slope
 
 ## Runs a search for the maximum track correlation around a given latency as defined in the Turnquist paper. TC means track correlation, RMS means Root Mean Square.
 # @param sweeps List of sweeps
@@ -49,13 +49,12 @@ def search_for_max_tc(raw_signal: AnalogSignal, el_stimuli: Iterable[ElectricalS
     # create a linear space of latencies that we want to search
     latencies = np.linspace(start = latency - max_shift, stop = latency + max_shift, num = 26)
 
-    # calculate the tc and slopes for all latencies
-    # TODO parallelize this is some way
-    # Problem is that multiprocessing copies the objects, resulting in extreme memory requirements
-    # so maybe we have to extract the arrays and use their array manager objects
-    tcs_slopes = np.array([track_correlation(raw_signal = raw_signal, el_stimuli = el_stimuli, latency = lat, \
-        center_sweep_idx = sweep_idx, max_slope = max_slope, radius = radius, window_size = window_size) \
-            for lat in latencies])
+    # calculate the tc and slopes for all latencies at once, like track_correlation does for each latency
+    slopes = np.linspace(start = -max_slope, stop = max_slope, num = 26)
+    rms = median_RMS_grid(raw_signal = raw_signal, el_stimuli = el_stimuli, center_stim_idx = sweep_idx, latency_slopes = slopes[np.newaxis, :], \
+        latencies = latencies[:, np.newaxis], radius = radius, window_size = window_size)
+    max_slope_idcs = np.argmax(rms, axis = 1)
+    tcs_slopes = np.stack([rms.magnitude[np.arange(len(latencies)), max_slope_idcs], slopes.magnitude[max_slope_idcs]], axis = 1)
     
     # keep only the track correlations where we have a local maximum
     if enforce_local_maximum == True:
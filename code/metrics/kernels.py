@@ -0,0 +1,145 @@
+## @package metrics.kernels
+# Internal numeric kernels of the metrics, features and fibre tracking code.
+# The kernels work on plain numpy arrays and floats without units, all times are in seconds and all rates in Hz.
+# The public functions check the units of their arguments and convert them with magnitude, pass the magnitudes to the kernels and attach the units to the results,
+# so the unit bookkeeping of quantities is done once per call instead of once per element.
+# Run python -m benchmarks.kernels for the speedup over the computations with quantities.
+
+import numpy as np
+from math import sqrt
+from typing import Dict, Tuple, Union
+from quantities import Quantity
+from scipy.signal import correlate, fftconvolve
+
+## Conversion factors by the dimensionality of the quantity and the target units, see magnitude
+_conversion_factors: Dict[Tuple[str, str], float] = {}
+
+## Returns the magnitude of a quantity in the given units, for passing it to the kernels.
+# Rescaling a quantity takes much longer than most kernels, so the conversion factors are cached.
+# @param value a quantity, or a plain number or array which is taken to be in the given units
+# @param units the units of the result, e.g. "s"
+# @returns the magnitude as float or array
+def magnitude(value: Union[Quantity, float, np.ndarray], units: str) -> Union[float, np.ndarray]:
+    if not isinstance(value, Quantity):
+        return value
+    key = (value.dimensionality.string, units)
+    factor = _conversion_factors.get(key, None)
+    if factor is None:
+        # raises a ValueError for incompatible units
+        factor = float(Quantity(1.0, value.units).rescale(units).magnitude)
+        _conversion_factors[key] = factor
+    return value.magnitude * factor if factor != 1.0 else value.magnitude
+
+## Returns the samples of the first channel of a signal
+# @param samples 1-D array of samples, or 2-D array (samples x channels)
+# @returns 1-D array of the samples, a view if possible
+def first_channel(samples: np.ndarray) -> np.ndarray:
+    samples = np.asarray(samples)
+    return samples[:, 0] if samples.ndim == 2 else samples
+
+## Mean of the squared values, i.e. the normalized energy of a signal
+# @param samples array of signal values
+# @returns the mean square, or NaN for an empty array
+def mean_square(samples: np.ndarray) -> float:
+    samples = np.ravel(samples)
+    if len(samples) == 0:
+        return float("nan")
+    return float(np.dot(samples, samples)) / len(samples)
+
+## Root mean square of a signal
+# @param samples array of signal values
+# @returns the root mean square, or 0 for an empty array
+def rms(samples: np.ndarray) -> float:
+    samples = np.ravel(samples)
+    if len(samples) == 0:
+        return 0.0
+    return sqrt(mean_square(samples))
+
+## Converts times into sample indices of a regularly sampled signal, in the same way as the raw data windows are cut elsewhere
+# @param times array of times
+# @param t_start time of the first sample
+# @param sampling_rate sampling rate of the signal
+# @param num_samples number of samples of the signal, the indices are clipped to [0, num_samples]
+# @returns integer array of the indices with the shape of the times
+def sample_indices(times: np.ndarray, t_start: float, sampling_rate: float, num_samples: int) -> np.ndarray:
+    return np.clip(np.floor((np.asarray(times) - t_start) * sampling_rate), 0, num_samples).astype(np.int64)
+
+## Root mean square of many windows of a signal at once
+# @param samples 1-D array of signal values
+# @param starts array of the indices of the first sample of each window
+# @param stops array of the indices behind the last sample of each window, with the same shape as starts
+# @returns array of the root mean square of each window with the shape of starts, 0 for empty windows
+def window_rms(samples: np.ndarray, starts: np.ndarray, stops: np.ndarray) -> np.ndarray:
+    starts, stops = np.broadcast_arrays(np.asarray(starts, dtype = np.int64), np.asarray(stops, dtype = np.int64))
+    lengths = np.maximum(stops - starts, 0)
+    max_length = int(np.max(lengths)) if lengths.size > 0 else 0
+    if max_length == 0:
+        return np.zeros(starts.shape)
+
+    # gather the windows into a padded (windows x max length) matrix, the padding is masked out
+    idcs = starts[..., np.newaxis] + np.arange(max_length)
+    mask = np.arange(max_length) < lengths[..., np.newaxis]
+    values = np.where(mask, samples[np.minimum(idcs, len(samples) - 1)], 0.0)
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        return np.where(lengths > 0, np.sqrt(np.sum(np.square(values), axis = -1) / lengths), 0.0)
+
+## Median RMS of windows around the given centers, see metrics.root_mean_square_power.median_RMS
+# @param samples 1-D array of signal values
+# @param t_start time of the first sample
+# @param sampling_rate sampling rate of the signal
+# @param centers array of the window centers, the median is taken over the last axis
+# @param window_size size of the windows around the centers
+# @returns array of the median RMS with the shape of the centers without the last axis
+def median_rms(samples: np.ndarray, t_start: float, sampling_rate: float, centers: np.ndarray, window_size: float) -> np.ndarray:
+    starts = sample_indices(centers - window_size / 2, t_start, sampling_rate, len(samples))
+    stops = sample_indices(centers + window_size / 2, t_start, sampling_rate, len(samples))
+    return np.median(window_rms(samples, starts, stops), axis = -1)
+
+## Counts the sorted times strictly within each of the intervals (start, stop)
+# @param sorted_times sorted array of times
+# @param starts array of the starts of the intervals
+# @param stops array of the stops of the intervals, with the same shape as starts
+# @returns integer array of the counts with the shape of starts
+def interval_counts(sorted_times: np.ndarray, starts: np.ndarray, stops: np.ndarray) -> np.ndarray:
+    first_idcs = np.searchsorted(sorted_times, starts, side = "right")
+    stop_idcs = np.searchsorted(sorted_times, stops, side = "left")
+    return np.maximum(stop_idcs - first_idcs, 0)
+
+## Maximum of the cross correlation of two signals divided by the square root of the product of their energies
+# @param x 1-D array of the first signal
+# @param y 1-D array of the second signal, not longer than the first one
+# @returns the normalized cross correlation
+def normalized_cross_correlation(x: np.ndarray, y: np.ndarray) -> float:
+    x = np.ravel(x)
+    y = np.ravel(y)
+    corr = correlate(x, y, "valid")
+    return float(np.max(corr / sqrt(np.dot(x, x) * np.dot(y, y))))
+
+## Normalized cross correlation of a template with every offset in each window of a batch, see metrics.normalized_cross_correlation.batched_normalized_cross_correlation
+# @param windows 2-D array (number of windows x window length) of signal values
+# @param template 1-D array of the template, must not be longer than the windows
+# @param window_lengths Optionally, the number of valid values in each window, if the windows were padded to a common length
+# @returns 2-D array (number of windows x number of offsets), offsets where the template exceeds the valid part of a window are set to -inf
+def batched_normalized_cross_correlation(windows: np.ndarray, template: np.ndarray, window_lengths: np.ndarray = None) -> np.ndarray:
+    template_len = len(template)
+    num_offsets = windows.shape[1] - template_len + 1
+    if num_offsets < 1:
+        raise ValueError("Template is longer than the windows!")
+
+    # correlation is a convolution with the reversed template
+    correlations = fftconvolve(windows, template[np.newaxis, ::-1], mode = "valid", axes = 1)
+
+    # energy of the signal for every offset
+    cum_squares = np.zeros((windows.shape[0], windows.shape[1] + 1), dtype = np.float64)
+    np.cumsum(np.square(windows), axis = 1, out = cum_squares[:, 1:])
+    energies = np.maximum(cum_squares[:, template_len:] - cum_squares[:, : num_offsets], 0)
+    norms = np.sqrt(energies * np.dot(template, template))
+
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        correlations = np.where(norms > 0, correlations / norms, 0.0)
+
+    if window_lengths is not None:
+        valid_offsets = np.asarray(window_lengths)[:, np.newaxis] - template_len + 1
+        correlations[np.arange(num_offsets)[np.newaxis, :] >= valid_offsets] = -np.inf
+
+    return correlations
@@ -2,35 +2,55 @@ from typing import Union
 from neo.core.analogsignal import AnalogSignal
 from neo.core.irregularlysampledsignal import IrregularlySampledSignal
 import numpy as np
-from math import sqrt
-from scipy.signal import correlate
 from quantities import Quantity
+from typing import Tuple
+from metrics import kernels
 
 ## (An approximation of) the normalized cross correlation for two discrete input signals x and y as the maximum of the cross correlation computed by scipy divided by the square root of the multiplied energy of both signals.
 def normalized_cross_correlation(x: Union[Quantity, np.ndarray], y: Union[Quantity, np.ndarray]):
 
     if isinstance(x, Quantity) != isinstance(y, Quantity):
         raise ValueError("Please pass two quantities or two plain arrays. Don't mix these types.")
-    
-    corr = correlate(x, y, 'valid')
 
-    # handle the unit of quantities during normalization
+    # the normalization cancels the units, they only need to be compatible
     if isinstance(x, Quantity):
-        corr = corr / sqrt(np.sum(np.square(x.magnitude)) * sum(np.square(y.magnitude)))
-        corr = corr[0]
-    else:
-        corr = corr / sqrt(np.sum(np.square(x)) * sum(np.square(y)))
+        if x.dimensionality.simplified != y.dimensionality.simplified:
+            raise ValueError("The signals have incompatible units " + str(x.dimensionality) + " and " + str(y.dimensionality) + ".")
+        y = y.rescale(x.units).magnitude
+        x = x.magnitude
 
-    return max(corr)
+    return kernels.normalized_cross_correlation(x, y)
 
-# TODO add comment
+## Slides the template over the signal and calculates the normalized cross correlation for every offset, see also normalized_cross_correlation.
+# @param signal The signal over which the template is slided
+# @param template The template, it must not be longer than the signal
+# @returns Array of the normalized cross correlation for the offsets 0 to len(signal) - len(template) - 1
 def sliding_window_normalized_cross_correlation(signal: Union[Quantity, np.ndarray], template: Union[Quantity, np.ndarray]):
     if len(template) > len(signal):
         raise ValueError("Template is longer than the signal!")
 
     # slide the template over the window
-    correlations = []
-    for start_idx in range(0, len(signal) - len(template)):
-        correlations.append(normalized_cross_correlation(signal[start_idx : start_idx + len(template)], template))
+    correlations = batched_normalized_cross_correlation(np.asarray(signal).reshape(1, -1), template)[0]
+    return correlations[: len(signal) - len(template)]
 
-    return correlations
\ No newline at end of file
+## Calculates the normalized cross correlation of a template with every offset in each window of a batch, in a few vectorized calls.
+# The cross correlation of all the windows is computed at once with the FFT, the signal energy at each offset from cumulative sums.
+# @param windows 2-D array (number of windows x window length) of signal values
+# @param template The template to slide over the windows, must not be longer than the windows
+# @param window_lengths Optionally, the number of valid values in each window, if the windows were padded to a common length
+# @returns 2-D array (number of windows x number of offsets) containing the normalized cross correlation for every offset. 
+#          Offsets where the template exceeds the valid part of a window are set to -inf.
+def batched_normalized_cross_correlation(windows: np.ndarray, template: Union[Quantity, np.ndarray], window_lengths: np.ndarray = None) -> np.ndarray:
+    windows = np.asarray(windows, dtype = np.float64)
+    template = np.asarray(template, dtype = np.float64).ravel()
+    return kernels.batched_normalized_cross_correlation(windows, template, window_lengths)
+
+## Finds the offset with the best matching template in each window of a batch, see also batched_normalized_cross_correlation.
+# @param windows 2-D array (number of windows x window length) of signal values
+# @param template The template to slide over the windows, must not be longer than the windows
+# @param window_lengths Optionally, the number of valid values in each window, if the windows were padded to a common length
+# @returns Tuple of the offset with the maximum normalized cross correlation and this maximum for each window
+def batched_template_match(windows: np.ndarray, template: Union[Quantity, np.ndarray], window_lengths: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+    correlations = batched_normalized_cross_correlation(windows, template, window_lengths)
+    peak_idcs = np.argmax(correlations, axis = 1)
+    return peak_idcs, correlations[np.arange(len(peak_idcs)), peak_idcs]
@@ -1,10 +1,19 @@
-from math import sqrt, floor
 from neo.core.analogsignal import AnalogSignal
 from quantities.quantity import Quantity
-from neo_importers.neo_wrapper import ElectricalStimulusWrapper
-from statistics import median
-from typing import Iterable
+from neo_importers.neo_wrapper import ChannelWrapper, ElectricalStimulusWrapper, SegmentedSignal
+from typing import Iterable, Union
 from quantities import ms
+from metrics import kernels
+import numpy as np
+
+## Returns the times of a range of electrical stimuli in seconds
+# @param el_stimuli the stimulus channel or a list of stimuli
+# @param start_idx index of the first stimulus
+# @param stop_idx index behind the last stimulus
+def _stimulus_times(el_stimuli: Iterable[ElectricalStimulusWrapper], start_idx: int, stop_idx: int) -> np.ndarray:
+    if isinstance(el_stimuli, ChannelWrapper):
+        return kernels.magnitude(el_stimuli[start_idx : stop_idx].times(), "s")
+    return np.array([kernels.magnitude(el_stimulus.time, "s") for el_stimulus in el_stimuli[start_idx : stop_idx]], dtype = float)
 
 ## This method implements the median RMS as defined in the Turnquist-Namer paper dealing with track correlation for fibre tracking.
 # The paper can be accessed here: https://www.sciencedirect.com/science/article/abs/pii/S0165027016000054
@@ -15,35 +24,46 @@ from quantities import ms
 # @param radius Radius or number of sweeps which we want to consider during search of the median RMS, labelled r in the paper
 # @param window_size Size of the window around the (computed) latency which is used to calculate the RMS. Given in s!
 # @param sampling_rate Sampling rate of the recording, required for array access
-def median_RMS(raw_signal: AnalogSignal, el_stimuli: Iterable[ElectricalStimulusWrapper], center_stim_idx: int, latency_slope: Quantity, latency: Quantity, \
+# @param raw_signal The raw signal, either as one analog signal or as segmented signal, where only the recorded blocks are searched
+def median_RMS(raw_signal: Union[AnalogSignal, SegmentedSignal], el_stimuli: Iterable[ElectricalStimulusWrapper], center_stim_idx: int, latency_slope: Quantity, latency: Quantity, \
     radius: int, window_size: float = 2 * ms):
-    
+    return median_RMS_grid(raw_signal = raw_signal, el_stimuli = el_stimuli, center_stim_idx = center_stim_idx, latency_slopes = latency_slope, latencies = latency, \
+        radius = radius, window_size = window_size)[()]
+
+## Calculates the median RMS for many latencies and slopes at once, see median_RMS. The windows of all combinations are cut and evaluated in a few vectorized calls.
+# @param latency_slopes Slopes along which the RMS is calculated, as quantity array
+# @param latencies Latencies around which we look for the median RMS, as quantity array that can be broadcast with the slopes, e.g. latencies[:, np.newaxis] and slopes[np.newaxis, :]
+# @returns quantity array of the median RMS with the broadcast shape of the latencies and slopes
+def median_RMS_grid(raw_signal: Union[AnalogSignal, SegmentedSignal], el_stimuli: Iterable[ElectricalStimulusWrapper], center_stim_idx: int, latency_slopes: Quantity, \
+    latencies: Quantity, radius: int, window_size: float = 2 * ms) -> Quantity:
+
     # check if the input is valid
     if center_stim_idx - radius < 0 or center_stim_idx + radius > len(el_stimuli) - 1:
         raise ValueError("The radius for median RMS calculation exceeds either the first or the last position in the array of electrical stimuli. Reduce radius or increase the center sweep index to resolve this issue.")
-        
+
     # restrict only to the sweeps which lie within the radius around the "center sweep"
-    rms = []
-    
-    el_stimulus: ElectricalStimulusWrapper
-    for r, (_, el_stimulus) in zip(range(-radius, radius + 1), enumerate(el_stimuli[center_stim_idx - radius : center_stim_idx + radius])):        
-        # calculate the latency shift in each direction
-        t = el_stimulus.time + latency + r * latency_slope
-        # calculate the window borders
-        t_min_idx = max(floor((t - (window_size / 2)) * raw_signal.sampling_rate), 0)
-        t_max_idx = max(min(floor((t + (window_size / 2)) * raw_signal.sampling_rate), len(raw_signal)), 0)
-        
-        # extract only this part of the sweep's signal
-        sig = raw_signal[t_min_idx : t_max_idx]
-        
-        # TODO: theoretically, we could "wrap around" the end of beginning and end of the sweeps here.
-        # But I'd argue that if the track crosses the border between the sweeps, i.e., the electrical stimulus itself, it might not be a track in the first place
-        # Therefore, what we do for now is that we restrict t_min and t_max to [0, len(sweep)] and see what happens.
-        
-        # add the calculated RMS to the list of RMSes in the R-environment
-        rms.append(root_mean_square_power(sig))
-    
-    return median(rms)
+    stimulus_times = _stimulus_times(el_stimuli, center_stim_idx - radius, center_stim_idx + radius)
+    shifts = np.arange(-radius, -radius + len(stimulus_times))
+    slopes = np.asarray(kernels.magnitude(latency_slopes, "s"))
+    latencies = np.asarray(kernels.magnitude(latencies, "s"))
+    window_size = float(kernels.magnitude(window_size, "s"))
+
+    # calculate the latency shift in each direction, the sweeps are on the last axis
+    centers = stimulus_times + np.expand_dims(latencies, -1) + np.expand_dims(slopes, -1) * shifts
+
+    # TODO: theoretically, we could "wrap around" the end of beginning and end of the sweeps here.
+    # But I'd argue that if the track crosses the border between the sweeps, i.e., the electrical stimulus itself, it might not be a track in the first place
+    # Therefore, what we do for now is that we restrict t_min and t_max to [0, len(sweep)] and see what happens.
+    if isinstance(raw_signal, SegmentedSignal):
+        # the segmented signal finds the block containing each window by itself
+        rms = np.array([kernels.rms(raw_signal.window((center - window_size / 2) * Quantity(1.0, "s"), (center + window_size / 2) * Quantity(1.0, "s")).magnitude) \
+            for center in centers.ravel()]).reshape(centers.shape)
+        result = np.median(rms, axis = -1)
+    else:
+        result = kernels.median_rms(kernels.first_channel(raw_signal.magnitude), float(kernels.magnitude(raw_signal.t_start, "s")), \
+            float(kernels.magnitude(raw_signal.sampling_rate, "Hz")), centers, window_size)
+
+    return Quantity(result, raw_signal.dimensionality**2)
 
 ## This function calculates the root mean square for a time series of signal values. See also: https://en.wikipedia.org/wiki/Root_mean_square
 # @param signal The time series of input signal values
@@ -53,8 +73,5 @@ def root_mean_square_power(signal):
     if len(signal) == 0:
         return 0
         #raise ValueError("Tried to calculate RMS for empty signal, something probably went wrong")
-    
-    n = len(signal)    
-    squared_signal = signal**2
-    
-    return sqrt(sum(squared_signal.magnitude) / n) * signal.units * signal.units
\ No newline at end of file
+
+    return Quantity(kernels.rms(signal.magnitude), signal.dimensionality**2)
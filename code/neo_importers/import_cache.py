@@ -0,0 +1,123 @@
+import os
+import hashlib
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple, Optional
+
+import numpy as np
+import yaml
+from quantities import Quantity
+from neo.core import Block, AnalogSignal
+
+from fibre_tracking import APTrack, ActionPotentialTemplate
+from neo_importers.neo_wrapper import TypeID
+from neo_importers.recording_io import store_block, load_block
+
+## Version of the cache layout, increase this whenever the stored content changes s.t. old caches are rebuilt
+CACHE_VERSION = 2
+
+## File names within the cache directory
+_BLOCK_FILE = "block.nix"
+_TRACKS_FILE = "tracks.npz"
+_META_FILE = "cache.yml"
+
+## Computes a fingerprint of the input files and the import arguments.
+#  The files are identified by their names, sizes and modification times, so the contents are never read.
+#  @param filepaths paths of the files that are imported
+#  @param arguments import arguments which influence the result, they are compared by their string representation
+#  @returns a hex digest that changes whenever one of the files or arguments changes
+def fingerprint(filepaths: Iterable[str], **arguments) -> str:
+    files = []
+    for filepath in sorted(filepaths):
+        stat = os.stat(filepath)
+        files.append((os.path.basename(filepath), stat.st_size, stat.st_mtime_ns))
+    args = sorted((name, str(value)) for name, value in arguments.items())
+    return hashlib.sha1(repr((CACHE_VERSION, files, args)).encode("utf-8")).hexdigest()
+
+## Reads the fingerprint stored in a cache directory
+#  @param cache_dir the cache directory
+#  @returns the stored fingerprint, or None if there is no (complete) cache
+def _stored_fingerprint(cache_dir: Path) -> Optional[str]:
+    meta_file = cache_dir/_META_FILE
+    if not meta_file.is_file():
+        return None
+    with open(meta_file, "r") as fl:
+        meta = yaml.load(fl, Loader=yaml.FullLoader)
+    return meta.get("fingerprint") if isinstance(meta, dict) else None
+
+## Checks if the cache directory contains a cache for the given fingerprint
+#  @param cache_dir the cache directory
+#  @param key fingerprint of the import, see fingerprint
+def is_cache_valid(cache_dir: Path, key: str) -> bool:
+    return _stored_fingerprint(cache_dir) == key
+
+## Stores the result of a dapsys import in the cache directory.
+#  The Block is stored as NIX file and the AP tracks as numpy arrays. The meta file, containing the fingerprint,
+#  is written last, so an interrupted write never results in a valid cache.
+#  @param cache_dir the cache directory, will be created on demand
+#  @param key fingerprint of the import, see fingerprint
+#  @param block the imported Neo Block
+#  @param channel_id_map the dict mapping type ids to channel names and their unified ids
+#  @param ap_tracks the imported AP tracks
+def store_dapsys_import(cache_dir: Path, key: str, block: Block, channel_id_map: Dict[TypeID, Dict[str, str]], ap_tracks: List[APTrack]) -> None:
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    # invalidate the old cache first
+    if (cache_dir/_META_FILE).exists():
+        os.remove(cache_dir/_META_FILE)
+
+    tmp_block_file = cache_dir/f"tmp_{_BLOCK_FILE}"
+    store_block(tmp_block_file, block)
+    os.replace(tmp_block_file, cache_dir/_BLOCK_FILE)
+
+    arrays = {}
+    tracks_meta = []
+    for track_idx, ap_track in enumerate(ap_tracks):
+        arrays[f"sweep_idcs_{track_idx}"] = np.array(ap_track.sweep_idcs, dtype=np.int64)
+        arrays[f"latencies_{track_idx}"] = np.array([Quantity(latency, "s").rescale("s").magnitude for latency in ap_track.latencies], dtype=np.float64)
+        track_meta = {"color": ap_track.color}
+        if ap_track.ap_template is not None:
+            template: AnalogSignal = ap_track.ap_template.signal_template
+            arrays[f"template_{track_idx}"] = template.magnitude.ravel()
+            track_meta["template_units"] = template.dimensionality.string
+            track_meta["template_sampling_rate"] = float(template.sampling_rate.rescale("Hz").magnitude)
+        tracks_meta.append(track_meta)
+    tmp_tracks_file = cache_dir/f"tmp_{_TRACKS_FILE}"
+    with open(tmp_tracks_file, "wb") as fl:
+        np.savez(fl, **arrays)
+    os.replace(tmp_tracks_file, cache_dir/_TRACKS_FILE)
+
+    meta = {
+        "fingerprint": key,
+        "channel_id_map": {type_id.value: dict(channels) for type_id, channels in channel_id_map.items()},
+        "tracks": tracks_meta
+    }
+    with open(cache_dir/_META_FILE, "w") as fl:
+        yaml.dump(meta, fl)
+
+## Loads the result of a dapsys import from the cache directory
+#  @param cache_dir the cache directory
+#  @param key fingerprint of the import, see fingerprint
+#  @returns the Neo Block, the dict mapping type ids to channel names and their unified ids and the AP tracks,
+#           or None if there is no valid cache for the fingerprint
+def load_dapsys_import(cache_dir: Path, key: str) -> Optional[Tuple[Block, Dict[TypeID, Dict[str, str]], List[APTrack]]]:
+    if not is_cache_valid(cache_dir, key):
+        return None
+    with open(cache_dir/_META_FILE, "r") as fl:
+        meta = yaml.load(fl, Loader=yaml.FullLoader)
+
+    block, _ = load_block(cache_dir/_BLOCK_FILE)
+    channel_id_map = {type_id: {} for type_id in TypeID}
+    for type_id, channels in meta["channel_id_map"].items():
+        channel_id_map[TypeID(type_id)].update(channels)
+
+    ap_tracks = []
+    with np.load(cache_dir/_TRACKS_FILE) as arrays:
+        for track_idx, track_meta in enumerate(meta["tracks"]):
+            ap_track = APTrack.from_arrays(sweep_idcs=arrays[f"sweep_idcs_{track_idx}"], latencies=Quantity(arrays[f"latencies_{track_idx}"], "s"))
+            ap_track.color = track_meta["color"]
+            if "template_units" in track_meta:
+                signal_template = AnalogSignal(signal=arrays[f"template_{track_idx}"], units=track_meta["template_units"],
+                                               sampling_rate=Quantity(track_meta["template_sampling_rate"], "Hz"))
+                ap_track.ap_template = ActionPotentialTemplate(signal_template=signal_template)
+            ap_tracks.append(ap_track)
+
+    return block, channel_id_map, ap_tracks
@@ -1,12 +1,17 @@
 from scipy import signal
 from fibre_tracking import ap_template
 import os
+import io
 import csv
+import shutil
 import pandas as pd
 import numpy as np
 from pathlib import Path
 from math import floor
-from typing import List, Iterable, Tuple, Union, Dict
+from typing import List, Iterable, Tuple, Union, Dict, Optional, Callable, TextIO
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from contextlib import ExitStack
+from multiprocessing import shared_memory
 
 from tqdm import tqdm
 from quantities import Quantity, second
@@ -14,23 +19,130 @@ from neo.core import Block, Event, IrregularlySampledSignal, AnalogSignal, Spike
 
 import warnings
 import traceback
-import bisect
 
 # these are imports from our own packages
 from fibre_tracking import ActionPotentialTemplate, APTrack
-from metrics.normalized_cross_correlation import sliding_window_normalized_cross_correlation
+from metrics.normalized_cross_correlation import sliding_window_normalized_cross_correlation, batched_template_match
 from neo_importers.neo_wrapper import TypeID
-from neo_importers.neo_utils import quantity_concat, convert_irregularly_sampled_signal_to_analog_signal
+from neo_importers.neo_utils import quantity_concat, convert_irregularly_sampled_signal_to_analog_signal, convert_irregularly_sampled_signal_to_analog_signal_blocks, \
+    stimulus_indices
+from neo_importers import import_cache
+
+## Name of the directory, within the directory of the csv files, where imports are cached by default
+CACHE_DIR_NAME = ".openmnglab_cache"
 
 def _get_files_with_extension(path: str, extension: str) -> List[str]:
     return [filepath for filepath in [os.path.join(path, fname) for fname in os.listdir(path)] \
         if os.path.isfile(filepath) and os.path.splitext(filepath)[1].lower() == extension]
 
+## Repairs a single row of a dapsys csv export that uses the comma not only as csv-separator but also for decimal numbers
+# Every two fields are joined by a decimal point. For some files, there is something like a comment at the end of the row, which is quoted.
+# @param row List of fields as they were read by the csv reader
+# @returns The repaired row as a line of valid csv, without line ending
+def _fix_decimal_comma_row(row: List[str]) -> str:
+    # for every second value, append the next using a decimal point
+    out_row = [f"{row[idx]}.{row[idx + 1]}" for idx in range(0, len(row) - 1, 2)]
+    # for some files, there is something like a comment that we need to append as well
+    if len(row) % 2 != 0:
+        out_row.append('"' + row[-1].replace('"', '""') + '"')
+    return ",".join(out_row)
+
+## Text stream that repairs a dapsys csv export with comma decimals on the fly.
+# The rows of the wrapped file are read in chunks of roughly chunk_size characters and only the current chunk is held in memory.
+# Therefore, it can directly be passed to pandas or the csv reader instead of writing a fixed copy of the file to disk.
+class DecimalCommaFixingStream(io.TextIOBase):
+
+    ## Wrap an opened dapsys csv file
+    # @param csv_file The text file that contains the original (broken) csv export
+    # @param chunk_size Approximate number of characters that are read from the original file at once
+    def __init__(self, csv_file: TextIO, chunk_size: int = 1 << 20):
+        self._csv_file = csv_file
+        self._chunk_size = chunk_size
+        # the repaired text of the current chunk and our read position within it
+        self._buffer = ""
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def close(self):
+        self._csv_file.close()
+        super().close()
+
+    ## Reads the next chunk of rows from the original file and returns the repaired text, or an empty string at the end of the file
+    def _next_chunk(self) -> str:
+        lines = self._csv_file.readlines(self._chunk_size)
+        if len(lines) == 0:
+            return ""
+        return "".join([_fix_decimal_comma_row(row) + "\n" for row in csv.reader(lines, delimiter = ",")])
+
+    ## Refills the buffer with the next chunk, keeping the part that was not read yet
+    # @returns False if the end of the original file was reached
+    def _fill_buffer(self) -> bool:
+        chunk = self._next_chunk()
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return len(chunk) > 0
+
+    def read(self, size: int = -1) -> str:
+        if size is None or size < 0:
+            while self._fill_buffer():
+                pass
+        else:
+            while len(self._buffer) - self._pos < size and self._fill_buffer():
+                pass
+        stop = len(self._buffer) if size is None or size < 0 else min(self._pos + size, len(self._buffer))
+        result = self._buffer[self._pos : stop]
+        self._pos = stop
+        return result
+
+    def readline(self, size: int = -1) -> str:
+        newline_idx = self._buffer.find("\n", self._pos)
+        while newline_idx < 0:
+            search_from = len(self._buffer) - self._pos
+            if not self._fill_buffer():
+                break
+            newline_idx = self._buffer.find("\n", search_from)
+        stop = len(self._buffer) if newline_idx < 0 else newline_idx + 1
+        if size is not None and size >= 0:
+            stop = min(stop, self._pos + size)
+        result = self._buffer[self._pos : stop]
+        self._pos = stop
+        return result
+
+## Opens a dapsys csv file for reading, repairing comma decimals on the fly if necessary
+# @param filepath Path of the csv file
+# @param fix_decimal_comma If True, the file is wrapped in a DecimalCommaFixingStream
+def _open_dapsys_csv(filepath: str, fix_decimal_comma: bool = False) -> TextIO:
+    csv_file = open(filepath, "r", newline = "\n")
+    if fix_decimal_comma:
+        return DecimalCommaFixingStream(csv_file)
+    return csv_file
+
+## Reads a (small) dapsys csv file into a pandas dataframe
+# @param filepath Path of the csv file
+# @param names Column names of the csv file
+# @param fix_decimal_comma If True, comma decimals are repaired while reading
+def _read_csv_table(filepath: str, names: List[str], fix_decimal_comma: bool = False) -> pd.DataFrame:
+    with _open_dapsys_csv(filepath, fix_decimal_comma) as csv_file:
+        return pd.read_csv(filepath_or_buffer = csv_file, header = None, names = names)
+
+## Runs the function in the executor, or directly if there is no executor
+# @returns A future for the result of the function
+def _submit(executor: Optional[Executor], function: Callable, *args) -> Future:
+    if executor is not None:
+        return executor.submit(function, *args)
+    future = Future()
+    try:
+        future.set_result(function(*args))
+    except Exception as ex:
+        future.set_exception(ex)
+    return future
+
 ## this function fixes the problem with dapsys csv files that use the comma not only as csv-separator but also for decimal numbers
 # @param in_path Path where the original files are placed
 # @param out_path Path where the fixed files should be written (filenames are preserved), will be created on demand
-# @param new_separator New separator character for the CSV file
-def _fix_separator_decimal_matching(in_path: str, out_path: str, new_separator = ","):
+def _fix_separator_decimal_matching(in_path: str, out_path: str):
     # create the output directory if necessary
     Path(out_path).mkdir(parents = True, exist_ok = True)
 
@@ -39,28 +151,10 @@ def _fix_separator_decimal_matching(in_path: str, out_path: str, new_separator =
         
         out_filepath = os.path.join(out_path, os.path.split(in_filepath)[1])
 
-        # open the input and output csv files
-        with open(in_filepath, 'r', newline = '\n') as in_csv_file, \
+        # stream the repaired rows into the output file
+        with _open_dapsys_csv(in_filepath, fix_decimal_comma = True) as in_csv_file, \
              open(out_filepath, 'w', newline = '\n') as out_csv_file:
-            csv_reader = csv.reader(in_csv_file, delimiter = ',')
-            csv_writer = csv.writer(out_csv_file, delimiter = new_separator, \
-                quoting = csv.QUOTE_NONNUMERIC, escapechar = "\\")
-
-            # enumerate over the rows to replace every second "," with a decimal point
-            for i, row in enumerate(csv_reader):
-                out_row = []
-                # for every second value, append the next using a decimal point
-                for idx in range(0, len(row) - 1, 2):
-                    num = float(f"{row[idx]}.{row[idx + 1]}")
-                    out_row.append(num)
-                # for some files, there is something like a comment that we need to append as well
-                if len(row) % 2 != 0:
-                    if isinstance(row[-1], float):
-                        out_row.append(row[-1])
-                    else:
-                        out_row.append(f"{row[len(row) - 1]}")
-                # then, write the new row into the output csv file
-                csv_writer.writerow(out_row)
+            shutil.copyfileobj(in_csv_file, out_csv_file)
 
 def _do_files_need_fixing(in_path: str) -> bool:
     files = _get_files_with_extension(in_path, ".csv")
@@ -77,71 +171,210 @@ def _do_files_need_fixing(in_path: str) -> bool:
 
 ## This function corrects dapsys files which suffer from the comma-separator
 # issue on german systems.
+# Note that import_dapsys_csv_files can also repair the files while reading, without writing fixed copies.
 def check_and_fix_dapsys_files(in_path: str, out_path: str):
     if _do_files_need_fixing(in_path):
         _fix_separator_decimal_matching(in_path, out_path)
         assert _do_files_need_fixing(out_path) == False
 
+## Checks which times are within a time window
+# @param times Array of times in seconds
+# @param time_window Tuple of the start and stop time in seconds, each of them can be None
+# @returns Boolean mask of the times within the window, including its borders
+def _in_time_window(times: np.ndarray, time_window: Tuple[Optional[float], Optional[float]]) -> np.ndarray:
+    t_start, t_stop = time_window
+    in_window = np.ones(len(times), dtype = bool)
+    if t_start is not None:
+        in_window &= times >= t_start
+    if t_stop is not None:
+        in_window &= times <= t_stop
+    return in_window
+
 ## Read the main pulse file which has "pulses" in its name
-def _read_main_pulse_file(filepaths: List[str]) -> Event:
+# @param fix_decimal_comma If True, comma decimals are repaired while reading
+# @param time_window If given, tuple of the start and stop time in seconds (each of them can be None). Only the pulses within the window are returned,
+#        but their intervals are still the ones to the next pulse in the whole recording
+def _read_main_pulse_file(filepaths: List[str], fix_decimal_comma: bool = False, time_window: Tuple[Optional[float], Optional[float]] = None) -> Event:
     try: 
         # read pulse file
         pulse_file = [file for file in filepaths if "pulses" in os.path.basename(file).lower()][0]
-        pulses_df = pd.read_csv(filepath_or_buffer = pulse_file, header = None, names = ["timestamp", "comment"])
+        pulses_df = _read_csv_table(pulse_file, names = ["timestamp", "comment"], fix_decimal_comma = fix_decimal_comma)
         times = Quantity(pulses_df["timestamp"], "s")
-
-        pulses = Event(times =  times, labels = pulses_df["comment"], name = "Dapsys Main Pulse", file_origin = pulse_file)
-        channel_id = f"{TypeID.ELECTRICAL_STIMULUS.value}.0"
-        pulses.annotate(id = channel_id, type_id = TypeID.ELECTRICAL_STIMULUS.value)
+        labels = pulses_df["comment"]
 
         intervals: Quantity = np.diff(times)
         intervals = quantity_concat(intervals, np.array([float("inf")]) * second)
+
+        if time_window is not None:
+            in_window = _in_time_window(times.magnitude, time_window)
+            times, labels, intervals = times[in_window], labels.values[in_window], intervals[in_window]
+
+        pulses = Event(times =  times, labels = labels, name = "Dapsys Main Pulse", file_origin = pulse_file)
+        channel_id = f"{TypeID.ELECTRICAL_STIMULUS.value}.0"
+        pulses.annotate(id = channel_id, type_id = TypeID.ELECTRICAL_STIMULUS.value)
         pulses.array_annotate(intervals = intervals)
 
         return pulses
     except Exception as ex:
         traceback.print_exc()
 
+## ASCII codes of the characters that we need for parsing the signal file
+_NEWLINE, _COMMA, _DOT = ord("\n"), ord(","), ord(".")
+
+## Parses only the first value of a row of the signal file
+# @param row The row as read from the file
+# @param fix_decimal_comma If True, the first two fields make the first value
+# @returns The first value of the row
+def _first_value(row: bytes, fix_decimal_comma: bool) -> float:
+    fields = row.split(b",", 2)
+    if fix_decimal_comma and len(fields) > 1:
+        return float(fields[0] + b"." + fields[1])
+    return float(fields[0])
+
+## Selects the (time row, signal row) pairs of the signal file that may contain times within a time window.
+# The times of a pair lie between its first time and the first time of the next pair, so only the first value of each time row needs to be parsed.
+# The last pair is always kept if it starts before the end of the window, as the next pair is not known.
+# @param lines The rows of complete pairs
+# @param fix_decimal_comma If True, the comma is also used as decimal point
+# @param time_window Tuple of the start and stop time of the window in seconds, each of them can be None
+# @returns Tuple of the rows of the selected pairs and whether all following pairs start behind the window
+def _select_signal_pairs(lines: List[bytes], fix_decimal_comma: bool, time_window: Tuple[Optional[float], Optional[float]]) -> Tuple[List[bytes], bool]:
+    t_start, t_stop = time_window
+    first_times = np.array([_first_value(line, fix_decimal_comma) for line in lines[0::2]], dtype = np.float64)
+    next_first_times = np.append(first_times[1:], np.inf)
+    selected = np.ones(len(first_times), dtype = bool)
+    if t_start is not None:
+        selected &= next_first_times > t_start
+    if t_stop is not None:
+        selected &= first_times <= t_stop
+    behind_window = t_stop is not None and len(first_times) > 0 and first_times[-1] > t_stop
+    return [line for pair_idx in np.flatnonzero(selected) for line in lines[2 * pair_idx : 2 * pair_idx + 2]], behind_window
+
+## Reads the signal file in chunks of complete (time row, signal row) pairs.
+# Empty lines are skipped, and a pair that is cut by the chunk border is moved to the next chunk.
+# @param signal_file Path of the signal file
+# @param chunk_size Approximate size of the chunks in bytes
+# @param fix_decimal_comma If True, the comma is also used as decimal point, only needed for the time window
+# @param time_window If given, tuple of the start and stop time in seconds (each of them can be None). Pairs that only contain times outside of the window are skipped without parsing,
+#        and the rest of the file is not read once a pair starts behind the window
+# @returns A generator of the text of the chunks, as uint8 arrays where every row ends with a newline, and the number of bytes read from the file for the chunk
+def _iter_signal_chunks(signal_file: str, chunk_size: int, fix_decimal_comma: bool = False, \
+                        time_window: Tuple[Optional[float], Optional[float]] = None) -> Iterable[Tuple[np.ndarray, int]]:
+    with open(signal_file, "rb") as file:
+        carry: List[bytes] = []
+        while True:
+            lines = file.readlines(chunk_size)
+            if len(lines) == 0:
+                break
+            num_bytes = sum([len(line) for line in lines])
+            lines = carry + [line if line.endswith(b"\n") else line + b"\n" for line in lines if line.strip()]
+            # keep the time row of an incomplete pair for the next chunk
+            carry = lines[-1:] if len(lines) % 2 != 0 else []
+            lines = lines[: len(lines) - len(carry)]
+            behind_window = False
+            if time_window is not None and len(lines) > 0:
+                lines, behind_window = _select_signal_pairs(lines, fix_decimal_comma, time_window)
+            if len(lines) > 0:
+                yield np.frombuffer(b"".join(lines), dtype = np.uint8), num_bytes
+            if behind_window:
+                return
+        if len(carry) > 0:
+            raise ValueError(f"The signal file {signal_file} ends with a time row that has no signal row.")
+
+## Finds the row borders of a chunk and counts the values in each row
+# @param text Text of the chunk as returned by _iter_signal_chunks
+# @param fix_decimal_comma If True, the comma is also used as decimal point, so two fields make one value
+# @returns Tuple of the positions of the newlines, the positions of the commas and the number of values per row
+def _signal_chunk_layout(text: np.ndarray, fix_decimal_comma: bool) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    newlines = np.flatnonzero(text == _NEWLINE)
+    commas = np.flatnonzero(text == _COMMA)
+    commas_per_row = np.bincount(np.searchsorted(newlines, commas), minlength = len(newlines))
+    row_lengths = (commas_per_row + 1) // 2 if fix_decimal_comma else commas_per_row + 1
+    if np.any(row_lengths[0::2] != row_lengths[1::2]):
+        raise ValueError("The time and signal rows of the signal file differ in length.")
+    return newlines, commas, row_lengths
+
+## Parses a chunk of the signal file into its time and signal values
+# @param text Text of the chunk as returned by _iter_signal_chunks
+# @param fix_decimal_comma If True, every first comma of a pair of fields is read as decimal point
+# @returns Tuple of the time values and the signal values in the chunk
+def _parse_signal_chunk(text: np.ndarray, fix_decimal_comma: bool) -> Tuple[np.ndarray, np.ndarray]:
+    newlines, commas, row_lengths = _signal_chunk_layout(text, fix_decimal_comma)
+    text = text.copy()
+    if fix_decimal_comma:
+        # the rank of each comma within its row decides whether it is a decimal point or a separator
+        row_of_comma = np.searchsorted(newlines, commas)
+        first_comma_of_row = np.cumsum(np.bincount(row_of_comma, minlength = len(newlines))) - np.bincount(row_of_comma, minlength = len(newlines))
+        comma_rank = np.arange(len(commas)) - first_comma_of_row[row_of_comma]
+        text[commas[comma_rank % 2 == 0]] = _DOT
+    # now, the whole chunk is one long list of comma separated values
+    text[newlines] = _COMMA
+    values = np.fromstring(text[:-1].tobytes(), dtype = np.float64, sep = ",")
+    if len(values) != np.sum(row_lengths):
+        raise ValueError("Could not parse all the values in the signal file.")
+    # rows alternate between times and signal values
+    is_time = np.repeat(np.arange(len(row_lengths)) % 2 == 0, row_lengths)
+    return values[is_time], values[~is_time]
+
+## Reads the times and values of the signal file, which alternates between a row of times and a row with the corresponding signal values.
+# The file is read once in chunks, which are parsed directly into growable output buffers. The capacity of the buffers is estimated from the number of values per byte
+# in the chunks read so far, so they are usually only grown a few times, in place if possible. At the end, they are shrunk to the number of values.
+# This way, the peak memory stays close to the size of the result.
+# @param signal_file Path of the signal file
+# @param fix_decimal_comma If True, the comma is also used as decimal point in this file
+# @param chunk_size Approximate size of the chunks in bytes
+# @param time_window If given, tuple of the start and stop time in seconds (each of them can be None). Only the values within the window are returned
+# @returns Tuple of the time values and the signal values
+def _read_signal_arrays(signal_file: str, fix_decimal_comma: bool = False, chunk_size: int = 1 << 24, \
+                        time_window: Tuple[Optional[float], Optional[float]] = None) -> Tuple[np.ndarray, np.ndarray]:
+    file_size = os.path.getsize(signal_file)
+    times = np.empty(0, dtype = np.float64)
+    signal = np.empty(0, dtype = np.float64)
+
+    # parse the values into the buffers, reporting the throughput in MB/s
+    pos = 0
+    bytes_read = 0
+    with tqdm(total = file_size, unit = "B", unit_scale = True, desc = "Reading dapsys signal file") as progress:
+        for text, num_bytes in _iter_signal_chunks(signal_file, chunk_size, fix_decimal_comma, time_window):
+            chunk_times, chunk_signal = _parse_signal_chunk(text, fix_decimal_comma)
+            bytes_read += num_bytes
+            if time_window is not None:
+                in_window = _in_time_window(chunk_times, time_window)
+                chunk_times, chunk_signal = chunk_times[in_window], chunk_signal[in_window]
+            if pos + len(chunk_times) > len(times):
+                # extrapolate the number of values to the rest of the file, with some slack
+                capacity = max(int((pos + len(chunk_times)) / max(bytes_read, 1) * file_size * 1.05) + 1, int(1.25 * len(times)))
+                times.resize(capacity, refcheck = False)
+                signal.resize(capacity, refcheck = False)
+            times[pos : pos + len(chunk_times)] = chunk_times
+            signal[pos : pos + len(chunk_signal)] = chunk_signal
+            pos += len(chunk_times)
+            progress.update(num_bytes)
+
+    times.resize(pos, refcheck = False)
+    signal.resize(pos, refcheck = False)
+    return times, signal
+
 ## Read signal file
 # @param signal_unit You can provide a unit for the signal, else it will be dimensionless
-def _read_signal_file(filepaths: List[str], signal_unit: Quantity = None) -> IrregularlySampledSignal:
+# @param fix_decimal_comma If True, comma decimals are repaired while reading
+# @param time_window If given, tuple of the start and stop time in seconds (each of them can be None). Only the samples within the window are read
+def _read_signal_file(filepaths: List[str], signal_unit: Quantity = None, fix_decimal_comma: bool = False, \
+                      time_window: Tuple[Optional[float], Optional[float]] = None) -> IrregularlySampledSignal:
     # things are a bit complicated here as the signal is not necessarily covering the whole experiment!
     try:
         # get the continous signal file
         signal_file = [file for file in filepaths if "continuous" in os.path.basename(file).lower()][0]
 
-        times = []
-        signal = []
-
-        # open the file for reading
-        with open(signal_file, "r") as file:
-            
-            # and create a reader
-            reader = csv.reader(file, delimiter = ",")
-            # this try/catch handles the exception that is raised by "next" if the reader reached the file ending
-            try:
-                while True:
-                    # read time and signal rows
-                    time_row = np.array([float(val) for val in next(reader)])
-                    signal_row = np.array([float(val) for val in next(reader)])
-                    assert len(time_row) == len(signal_row)
-
-                    times.append(time_row)
-                    signal.append(signal_row)
-            except StopIteration:
-                pass
-
-        # concatenate our list of arrays
-        times = np.concatenate(times) * second
-        signal = np.concatenate(signal)
+        times, signal = _read_signal_arrays(signal_file, fix_decimal_comma, time_window = time_window)
         assert len(times) == len(signal)
-        
-        if not signal_unit is None:
-            signal = Quantity(signal, signal_unit)
-        else:
-            signal = Quantity(signal, "dimensionless")
 
-        result = IrregularlySampledSignal(times = times, signal = signal, name = "Irregularly Sampled Signal", file_origin = signal_file)
+        if signal_unit is None:
+            signal_unit = "dimensionless"
+
+        # don't copy the arrays again, they can be huge
+        result = IrregularlySampledSignal(times = Quantity(times, "s", copy = False), signal = signal, units = signal_unit, copy = False, \
+                                          name = "Irregularly Sampled Signal", file_origin = signal_file)
         channel_id = f"{TypeID.RAW_DATA.value}.0"
         result.annotate(id = channel_id, type_id = TypeID.RAW_DATA.value)
         return result
@@ -150,56 +383,77 @@ def _read_signal_file(filepaths: List[str], signal_unit: Quantity = None) -> Irr
     except Exception as ex:
         traceback.print_exc()
 
+## finds the template file with the given index
+def _find_template_file(filepaths: List[str], track_idx: int) -> str:
+    template_files = [file for file in filepaths if "template" in os.path.basename(file).lower() and "track" in os.path.basename(file).lower()]
+    return [file for file in template_files if "track" + str(track_idx) + ".csv" in file.lower()][0]
+
 ## reads the template file with the given index
-def _read_template_file(filepaths: List[str], track_idx: int, sampling_rate: Quantity) -> ActionPotentialTemplate:
+# @param template_df Optionally, the already parsed contents of the template file
+def _read_template_file(filepaths: List[str], track_idx: int, sampling_rate: Quantity, fix_decimal_comma: bool = False, \
+                        template_df: pd.DataFrame = None) -> ActionPotentialTemplate:
     try:
-        # find the right file
-        template_files = [file for file in filepaths if "template" in os.path.basename(file).lower() and "track" in os.path.basename(file).lower()]
-        template_file = [file for file in template_files if "track" + str(track_idx) + ".csv" in file.lower()][0]
         # read and return the AP template
-        template_df = pd.read_csv(filepath_or_buffer = template_file, header = None, names = ["signal_value"])
+        if template_df is None:
+            template_df = _read_csv_table(_find_template_file(filepaths, track_idx), names = ["signal_value"], fix_decimal_comma = fix_decimal_comma)
         signal_template = AnalogSignal(signal = template_df["signal_value"].values, units = "uV", sampling_rate = sampling_rate)
         return ActionPotentialTemplate(signal_template = signal_template)
     except Exception as ex:
         warnings.warn(f"""Cannot load AP template for track no. {track_idx}!""")
         # traceback.print_exc()
 
+## gets the track index from the name of a track or template file, like "F3B_AF_Track2.CSV"
+def _get_track_idx(track_file: str) -> int:
+    # get the lowercase filename once because we'll operate on it multiple times now
+    lower_fname = os.path.basename(track_file).lower()
+    track_idx_start = lower_fname.index("track") + len("track")
+    track_idx_stop = lower_fname.index(".csv")
+    # this could fail if somebody puts non-numeric characters between "track" and ".csv" in the filename
+    return int(lower_fname[track_idx_start : track_idx_stop])
+
 ## reads the tracks from files which have track but not template in their name
-def _read_track_files(filepaths: List[str], el_stimuli: Event, sampling_rate: Quantity) -> List[APTrack]:
+# @param fix_decimal_comma If True, comma decimals are repaired while reading
+# @param executor If given, the track and template files are read in parallel by this executor
+# @param time_window If given, tuple of the start and stop time in seconds (each of them can be None). Only the latencies with timestamps within the window are kept
+def _read_track_files(filepaths: List[str], el_stimuli: Event, sampling_rate: Quantity, fix_decimal_comma: bool = False, \
+                      executor: Executor = None, time_window: Tuple[Optional[float], Optional[float]] = None) -> List[APTrack]:
     # then, we want to add the AP tracks as they are produced by Dapsys (if there are any)
     # here, we need the main pulses / electric stimuli already which is why we extract them from the recording first
     # get the track and template files
     track_files = [file for file in filepaths if "track" in os.path.basename(file).lower() and not "template" in os.path.basename(file).lower()]
-    
-    ap_tracks = []
+
+    # first, submit all the files for reading s.t. they can be parsed in parallel
+    track_dfs: Dict[str, Future] = {}
+    template_dfs: Dict[str, Future] = {}
     for track_file in track_files:
-        # get the lowercase filename once because we'll operate on it multiple times now
-        lower_fname = os.path.basename(track_file).lower()
+        track_dfs[track_file] = _submit(executor, _read_csv_table, track_file, ["timestamp", "latency", "comments"], fix_decimal_comma)
+        try:
+            template_file = _find_template_file(filepaths, _get_track_idx(track_file))
+            template_dfs[track_file] = _submit(executor, _read_csv_table, template_file, ["signal_value"], fix_decimal_comma)
+        except Exception:
+            pass
 
-        # let's get the index of this track s.t. we can look for the corresponding template
-        track_idx_start = lower_fname.index("track") + len("track")
-        track_idx_stop = lower_fname.index(".csv")
-        # this could fail if somebody puts non-numeric characters between "track" and ".csv" in the filename
+    ap_tracks = []
+    for track_file in track_files:
         try:
-            track_idx = int(lower_fname[track_idx_start : track_idx_stop])
-            track_df = pd.read_csv(filepath_or_buffer = track_file, header = None, names = ["timestamp", "latency", "comments"])
-
-            # into this list, we write the latencies as tuples (sweep index, latency)
-            latencies = []
-            sweep_idx = 0
-            for timestamp, latency in zip(track_df["timestamp"].values, track_df["latency"].values):
-                # increase the sweep index, until the main pulse time is larger than the timestamp
-                while (timestamp > el_stimuli.times[sweep_idx] and sweep_idx < len(el_stimuli) - 1):
-                    sweep_idx += 1
-                # then append the latency for this sweep index
-                latencies.append((sweep_idx, latency * second))
+            # let's get the index of this track s.t. we can look for the corresponding template
+            track_idx = _get_track_idx(track_file)
+            track_df = track_dfs[track_file].result()
+            if time_window is not None:
+                track_df = track_df[_in_time_window(track_df["timestamp"].values, time_window)]
+
+            # the sweep of each latency is the one of the first main pulse which is not before the timestamp (or the last one)
+            sweep_idcs = stimulus_indices(el_stimuli.times, Quantity(track_df["timestamp"].values, "s"), following = True)
+            sweep_idcs = np.minimum(sweep_idcs, len(el_stimuli) - 1)
 
             # now, we can make a track out of this
-            ap_track = APTrack(latencies = latencies)
+            ap_track = APTrack.from_arrays(sweep_idcs = sweep_idcs, latencies = Quantity(track_df["latency"].values, "s"))
 
             # now, get the template
             try:
-                ap_track.ap_template = _read_template_file(filepaths = filepaths, track_idx = track_idx, sampling_rate = sampling_rate)
+                template_df = template_dfs[track_file].result() if track_file in template_dfs else None
+                ap_track.ap_template = _read_template_file(filepaths = filepaths, track_idx = track_idx, sampling_rate = sampling_rate, \
+                                                           fix_decimal_comma = fix_decimal_comma, template_df = template_df)
             except Exception as ex:
                 traceback.print_exc()
 
@@ -227,72 +481,186 @@ def _imply_sampling_rate_from_irregular_signal(signal: IrregularlySampledSignal,
     t_diff = signal.times[sample_at_idx + 1] - signal.times[sample_at_idx]
     return Quantity(1.0 / t_diff, "Hz")
 
-# TODO add doxygen comment
+## Finds the best match of an AP template in the signal around each of the given times.
+# This works on plain arrays (times in seconds) s.t. no quantities need to be handled in the inner loop.
+# The search windows are cut from the signal into one 2-D array and all of them are matched at once, batch_size windows at a time.
+# @param signal_values 1-D array of the signal values
+# @param signal_times 1-D array of the sample times for irregularly sampled signals, or None for regularly sampled signals
+# @param t_start Time of the first sample of a regularly sampled signal
+# @param sampling_rate Sampling rate of a regularly sampled signal in Hz
+# @param window_centers Times around which the template is searched
+# @param search_radius Maximum distance of the searched samples to the window centers
+# @param template 1-D array of the template values
+# @param batch_size Number of windows that are matched at once
+# @returns Array of the signal indices where the best match of the template starts, or -1 if the window was shorter than the template
+def _find_template_matches(signal_values: np.ndarray, signal_times: Optional[np.ndarray], t_start: float, sampling_rate: float, \
+                           window_centers: np.ndarray, search_radius: float, template: np.ndarray, batch_size: int = 4096) -> np.ndarray:
+    # define the indices of the first and last data points that we consider for our windowing
+    if signal_times is not None:
+        first_signal_idcs = np.searchsorted(signal_times, window_centers - search_radius, side = "left")
+        last_signal_idcs = np.searchsorted(signal_times, window_centers + search_radius, side = "left")
+    else:
+        first_signal_idcs = np.floor((window_centers - search_radius - t_start) * sampling_rate).astype(np.int64)
+        last_signal_idcs = np.floor((window_centers + search_radius - t_start) * sampling_rate).astype(np.int64)
+    first_signal_idcs = np.clip(first_signal_idcs, 0, len(signal_values))
+    last_signal_idcs = np.clip(last_signal_idcs, 0, len(signal_values))
+    window_lengths = last_signal_idcs - first_signal_idcs
+
+    result = np.full(len(window_centers), -1, dtype = np.int64)
+    # we can only search in windows that fit the template
+    fitting = np.flatnonzero(window_lengths >= len(template))
+    for batch_start in range(0, len(fitting), batch_size):
+        batch = fitting[batch_start : batch_start + batch_size]
+        # cut all the windows of this batch from the signal, padded to the same length
+        window_idcs = first_signal_idcs[batch, np.newaxis] + np.arange(np.max(window_lengths[batch]))[np.newaxis, :]
+        windows = signal_values[np.minimum(window_idcs, len(signal_values) - 1)]
+        # slide the template over the windows and retrieve the index with the maximum correlation
+        peak_idcs, _ = batched_template_match(windows, template, window_lengths[batch])
+        result[batch] = first_signal_idcs[batch] + peak_idcs
+
+    return result
+
+## Copies arrays into shared memory once, s.t. worker processes can access them without pickling.
+# Use this as a context manager, the shared memory is released on exit.
+class _SharedArrays:
+
+    ## @param arrays Dict of the arrays to share by their names
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        self._arrays = arrays
+        self._memory: List[shared_memory.SharedMemory] = []
+        ## descriptions (shared memory name, shape, dtype) of the shared arrays, which can be passed to the workers
+        self.descriptions: Dict[str, Tuple[str, Tuple[int, ...], str]] = {}
+
+    def __enter__(self):
+        for name, array in self._arrays.items():
+            memory = shared_memory.SharedMemory(create = True, size = max(array.nbytes, 1))
+            self._memory.append(memory)
+            np.ndarray(array.shape, dtype = array.dtype, buffer = memory.buf)[...] = array
+            self.descriptions[name] = (memory.name, array.shape, array.dtype.str)
+        return self
+
+    def __exit__(self, *args):
+        for memory in self._memory:
+            memory.close()
+            memory.unlink()
+        self._memory = []
+
+## Runs _find_template_matches in a worker process on a signal that is shared by _SharedArrays.
+# @param shared The descriptions of the shared arrays "values" and optionally "times"
+# @param args The remaining arguments of _find_template_matches
+def _find_template_matches_in_shared_memory(shared: Dict[str, Tuple[str, Tuple[int, ...], str]], *args) -> np.ndarray:
+    memory = {name: shared_memory.SharedMemory(name = memory_name) for name, (memory_name, _, _) in shared.items()}
+    try:
+        arrays = {name: np.ndarray(shape, dtype = np.dtype(dtype), buffer = memory[name].buf) for name, (_, shape, dtype) in shared.items()}
+        result = _find_template_matches(arrays["values"], arrays.get("times"), *args)
+        # the views need to be gone before the shared memory can be closed
+        del arrays
+        return result
+    finally:
+        for mem in memory.values():
+            mem.close()
+
+## Extracts the APs for the given AP tracks from the signal.
+# For each latency of a track, the track's AP template is searched in a window around the latency behind the corresponding electrical stimulus.
+# The AP is placed where the template has the highest normalized cross correlation with the signal.
+# @param ap_tracks The AP tracks, tracks without template are skipped
+# @param el_stimuli The electrical stimuli that the sweep indices of the tracks refer to
+# @param signal The raw signal
+# @param window_size Size of the search window in each direction around the latency (additionally to half of the template duration)
+# @param sampling_rate Sampling rate that is stored in the resulting spiketrain, required for irregularly sampled signals
+# @param workers Number of worker processes that search the APs. The tracks are split into chunks of at most chunk_size latencies, which are processed in parallel.
+#        The signal is shared with the workers through shared memory. Pass None to use one worker per CPU, or 0 (default) to search in this process.
+# @param chunk_size Maximum number of latencies that are searched by one task of a worker
+# @returns A spiketrain with all the found APs, sorted by time, with the signal from the start of the AP over the length of the template as waveform
 def _find_action_potentials_on_tracks(ap_tracks: Iterable[APTrack], 
                                       el_stimuli: Event,
                                       signal: Union[IrregularlySampledSignal, AnalogSignal],
                                       window_size: Quantity = Quantity(0.003, "s"), 
-                                      sampling_rate = None) -> SpikeTrain:
+                                      sampling_rate = None,
+                                      workers: int = 0,
+                                      chunk_size: int = 4096) -> SpikeTrain:
     
-    # TODO implement this function for analog signals and make it reusable
     if isinstance(signal, IrregularlySampledSignal) and sampling_rate is None:
             raise ValueError("If an irregularly sampled signal is passed, you need to set the sampling rate!")
     elif isinstance(signal, AnalogSignal):
         sampling_rate = signal.sampling_rate
 
-    # initialize our list of action_potentials
-    ap_times = []
-    ap_waveforms = []
-    
-    # iterate over all the tracks
-    for track_idx, ap_track in enumerate(ap_tracks):
-        # first, get the template of our current AP track
-        if ap_track.ap_template == None:
-            warnings.warn(f"""No AP template for AP track no. {track_idx}! Cannot extract APs for this track.""")
-            continue
-        else:
-            ap_template = ap_track.ap_template
+    # get plain arrays of our signal, s.t. we don't have to deal with quantities for every window
+    signal_values: np.ndarray = signal.magnitude.ravel()
+    if isinstance(signal, IrregularlySampledSignal):
+        signal_times, t_start, regular_sampling_rate = signal.times.rescale(second).magnitude, None, None
+    else:
+        signal_times, t_start, regular_sampling_rate = None, float(signal.t_start.rescale(second)), float(signal.sampling_rate.rescale("Hz"))
+    stimulus_times: np.ndarray = el_stimuli.times.rescale(second).magnitude
+    window_size = float(Quantity(window_size).rescale(second))
+
+    # initialize our list of action_potentials, as signal indices of their starts and length of their waveforms
+    ap_start_idcs = []
+    ap_lengths = []
+
+    # the executor is shut down before the shared memory is released, s.t. no worker accesses it anymore
+    with ExitStack() as stack:
+        executor = None
+        if workers != 0:
+            shared_signal = stack.enter_context(_SharedArrays({"values": signal_values} if signal_times is None else {"values": signal_values, "times": signal_times}))
+            executor = stack.enter_context(ProcessPoolExecutor(max_workers = workers))
+
+        # first, submit the chunks of all the tracks
+        track_chunks: List[Tuple[int, List[Future], int]] = []
+        for track_idx, ap_track in enumerate(ap_tracks):
+            # first, get the template of our current AP track
+            if ap_track.ap_template == None:
+                warnings.warn(f"""No AP template for AP track no. {track_idx}! Cannot extract APs for this track.""")
+                continue
+            else:
+                ap_template = ap_track.ap_template
 
-        try:
-            # then, slide the template over the window, calculating cross correlation for all the datapoints
-            for sweep_idx, ap_latency in tqdm(zip(ap_track.sweep_idcs, ap_track.latencies), total = len(ap_track), \
-                desc = f"""Processing AP Track {track_idx} with {len(ap_track)} latencies."""):
+            try:
+                template: np.ndarray = ap_template.signal_template.magnitude.ravel()
                 # we need the time of the main pulse and add the latency to define the point around which we want to search
-                window_center_time = el_stimuli.times[sweep_idx] + ap_latency
-
-                # now, we define the indices of the first and last data points that we consider for our windowing
-                if isinstance(signal, IrregularlySampledSignal):
-                    signal: IrregularlySampledSignal
-                    # find first signal index
-                    first_signal_idx = bisect.bisect_left(signal.times, (window_center_time - window_size - ap_template.duration / 2))
-                    # find last signal index
-                    last_signal_idx = bisect.bisect_left(signal.times, (window_center_time + window_size + ap_template.duration / 2))
-                elif isinstance(signal, AnalogSignal):
-                    # TODO Check why this function is much slower for analog signals
-                    first_signal_idx = floor((window_center_time - window_size - (ap_template.duration / 2.0)) * signal.sampling_rate) 
-                    last_signal_idx = floor((window_center_time + window_size + (ap_template.duration / 2.0)) * signal.sampling_rate)
-
-                # slide the template over the window
-                correlations = sliding_window_normalized_cross_correlation(signal[first_signal_idx : last_signal_idx], ap_template.signal_template)
-                # then, retrieve the index for which we had the maximum correlation
-                max_correlation_idx = np.argmax(correlations) + first_signal_idx
-                # finally, append the starting time and 
-                ap_times.append(signal.times[max_correlation_idx])
-                ap_waveforms.append(signal[max_correlation_idx : max_correlation_idx + len(ap_template)])
-        except Exception as ex:
-            traceback.print_exc()
-                
-    # sort the APs and return spiketrain object
-    ap_times = sorted(ap_times)
+                latencies = np.array([float(Quantity(latency, "s").rescale(second)) for latency in ap_track.latencies])
+                window_centers = stimulus_times[np.array(ap_track.sweep_idcs, dtype = np.int64)] + latencies
+                search_radius = window_size + float(ap_template.duration.rescale(second)) / 2
+
+                futures = []
+                for chunk_start in range(0, len(window_centers), chunk_size):
+                    chunk_centers = window_centers[chunk_start : chunk_start + chunk_size]
+                    if executor is not None:
+                        futures.append(executor.submit(_find_template_matches_in_shared_memory, shared_signal.descriptions, \
+                                                       t_start, regular_sampling_rate, chunk_centers, search_radius, template))
+                    else:
+                        futures.append(_submit(None, _find_template_matches, signal_values, signal_times, \
+                                               t_start, regular_sampling_rate, chunk_centers, search_radius, template))
+                track_chunks.append((track_idx, futures, len(template)))
+            except Exception as ex:
+                traceback.print_exc()
+
+        # then, collect the results in the order of the tracks
+        for track_idx, futures, template_len in tqdm(track_chunks, desc = "Processing AP Tracks"):
+            try:
+                start_idcs = np.concatenate([future.result() for future in futures]) if len(futures) > 0 else np.zeros(0, dtype = np.int64)
+                start_idcs = start_idcs[start_idcs >= 0]
+                ap_start_idcs.append(start_idcs)
+                ap_lengths.append(np.full(len(start_idcs), template_len, dtype = np.int64))
+            except Exception as ex:
+                traceback.print_exc()
+
+    ap_start_idcs = np.concatenate(ap_start_idcs) if len(ap_start_idcs) > 0 else np.zeros(0, dtype = np.int64)
+    ap_lengths = np.concatenate(ap_lengths) if len(ap_lengths) > 0 else np.zeros(0, dtype = np.int64)
+
+    # sort the APs (together with their waveforms) and return spiketrain object
+    order = np.argsort(signal.times[ap_start_idcs].magnitude, kind = "stable")
+    ap_start_idcs, ap_lengths = ap_start_idcs[order], ap_lengths[order]
+    ap_times = signal.times[ap_start_idcs]
     
-    # build the waveforms array
-    num_aps = len(ap_waveforms)
-    max_len = max([len(ap) for ap in ap_waveforms])
-    waveforms = np.zeros(shape = (num_aps, 1, max_len), dtype = np.float64) * signal.units
-    for ap_idx, ap_waveform in enumerate(ap_waveforms):
-        waveforms[ap_idx, 0, 0 : len(ap_waveform)] = ap_waveform.ravel()
-
-    result = SpikeTrain(times = Quantity(ap_times, "s"), 
+    # build the waveforms array, the waveforms are cut at the end of the signal and padded with NaN like the ones of neo_utils.detect_threshold_spikes
+    max_len = np.max(ap_lengths) if len(ap_lengths) > 0 else 0
+    waveform_idcs = ap_start_idcs[:, np.newaxis] + np.arange(max_len)[np.newaxis, :]
+    in_waveform = (waveform_idcs < len(signal_values)) & (np.arange(max_len)[np.newaxis, :] < ap_lengths[:, np.newaxis])
+    waveforms = np.where(in_waveform, signal_values[np.minimum(waveform_idcs, len(signal_values) - 1)], np.nan)
+    waveforms = Quantity(waveforms[:, np.newaxis, :], signal.units)
+
+    result = SpikeTrain(times = ap_times.rescale(second), 
                         t_start = signal.t_start, t_stop = signal.t_stop,
                         name = "APs from tracks", 
                         waveforms = waveforms, 
@@ -374,34 +742,106 @@ def _find_action_potentials_per_threshold(raw_signal: IrregularlySampledSignal,
 # @param directory Path where the csv files are located
 # @param sampling_rate Sampling rate can either be implied (pass "imply") or passed explicitly
 # @param ap_correlation_window_size Window size for the sliding window cross correlation which is used to detect APs around the AP tracks given in the dapsys files
+# @param fix_decimal_comma Whether the files use the comma also for decimal numbers (german systems). These files are repaired in memory while reading, no fixed copies are written.
+#        Pass "auto" to detect this from the files
+# @param workers Number of worker processes that read the pulse, track and template files while the signal file is read, and that search the APs on the tracks.
+#        By default (0), all the work is done in this process. Pass None to use one worker per CPU.
+#        The workers get a copy of the signal in shared memory (/dev/shm), which needs as much memory as the signal itself,
+#        and on platforms that spawn the worker processes, the calling script needs an if __name__ == "__main__" guard.
+# @param cache Whether the result should be cached on disk. Pass True to use a directory named CACHE_DIR_NAME next to the csv files, or pass the path of a cache directory.
+#        The cache is rebuilt automatically whenever the names, sizes or modification times of the csv files or the import arguments change.
+# @param segmented If True, the analog signal only contains the recorded parts of the signal. It is stored as one analog signal per contiguous block, 
+#        which MNGRecording groups into a SegmentedSignal. Otherwise, the gaps are filled with zeros.
+# @param t_start If given, only the data from this time on is imported. The rows of the signal file before this time are skipped without being parsed.
+# @param t_stop If given, only the data up to this time is imported. The signal file is only read up to this time.
 def import_dapsys_csv_files(directory: str,
                             sampling_rate: Union[Quantity, str] = "imply",
-                            ap_correlation_window_size: Quantity = Quantity(0.003, "s")) \
+                            ap_correlation_window_size: Quantity = Quantity(0.003, "s"),
+                            fix_decimal_comma: Union[bool, str] = "auto",
+                            workers: int = 0,
+                            cache: Union[bool, str, Path] = False,
+                            segmented: bool = False,
+                            t_start: Quantity = None,
+                            t_stop: Quantity = None) \
                             -> Tuple[Block, Dict[TypeID, Dict[str, str]], List[APTrack]]:
 
+    if cache is None or cache is False:
+        return _import_dapsys_csv_files(directory = directory, sampling_rate = sampling_rate, ap_correlation_window_size = ap_correlation_window_size, \
+                                        fix_decimal_comma = fix_decimal_comma, workers = workers, segmented = segmented, \
+                                        t_start = t_start, t_stop = t_stop)
+
+    cache_dir = Path(directory)/CACHE_DIR_NAME if cache is True else Path(cache)
+    key = import_cache.fingerprint(_get_files_with_extension(directory, ".csv"), 
+                                   sampling_rate = sampling_rate, 
+                                   ap_correlation_window_size = ap_correlation_window_size,
+                                   segmented = segmented,
+                                   t_start = t_start,
+                                   t_stop = t_stop)
+    result = import_cache.load_dapsys_import(cache_dir, key)
+    if result is None:
+        result = _import_dapsys_csv_files(directory = directory, sampling_rate = sampling_rate, ap_correlation_window_size = ap_correlation_window_size, \
+                                          fix_decimal_comma = fix_decimal_comma, workers = workers, segmented = segmented, \
+                                          t_start = t_start, t_stop = t_stop)
+        import_cache.store_dapsys_import(cache_dir, key, *result)
+    return result
+
+## Imports a dapsys recording from csv files without using the cache, see import_dapsys_csv_files
+def _import_dapsys_csv_files(directory: str,
+                             sampling_rate: Union[Quantity, str],
+                             ap_correlation_window_size: Quantity,
+                             fix_decimal_comma: Union[bool, str],
+                             workers: int,
+                             segmented: bool,
+                             t_start: Quantity = None,
+                             t_stop: Quantity = None) \
+                             -> Tuple[Block, Dict[TypeID, Dict[str, str]], List[APTrack]]:
+
     csv_files = _get_files_with_extension(directory, ".csv")
 
-    main_pulses: Event = _read_main_pulse_file(filepaths = csv_files)
-    irregular_sig: IrregularlySampledSignal = _read_signal_file(filepaths = csv_files, signal_unit = "uV")
-    
-    if isinstance(sampling_rate, str) and sampling_rate == "imply":
-        sampling_rate = _imply_sampling_rate_from_irregular_signal(irregular_sig)
+    if isinstance(fix_decimal_comma, str) and fix_decimal_comma == "auto":
+        fix_decimal_comma = _do_files_need_fixing(directory)
+
+    time_window = None
+    if t_start is not None or t_stop is not None:
+        time_window = tuple(None if t is None else float(Quantity(t).rescale(second)) for t in (t_start, t_stop))
 
-    analog_sig: AnalogSignal = convert_irregularly_sampled_signal_to_analog_signal(irregular_sig, sampling_rate = sampling_rate)
-    analog_sig.annotate(id = f"{TypeID.RAW_DATA.value}.1", type_id = TypeID.RAW_DATA.value)
+    executor = ProcessPoolExecutor(max_workers = workers) if workers != 0 else None
+    try:
+        # the small files are read by the workers, while we parse the large signal file here
+        main_pulses_future = _submit(executor, _read_main_pulse_file, csv_files, fix_decimal_comma, time_window)
+        irregular_sig: IrregularlySampledSignal = _read_signal_file(filepaths = csv_files, signal_unit = "uV", fix_decimal_comma = fix_decimal_comma, \
+                                                                    time_window = time_window)
+        main_pulses: Event = main_pulses_future.result()
+
+        if isinstance(sampling_rate, str) and sampling_rate == "imply":
+            sampling_rate = _imply_sampling_rate_from_irregular_signal(irregular_sig)
+
+        ap_tracks: List[APTrack] = _read_track_files(filepaths = csv_files, el_stimuli = main_pulses, sampling_rate = sampling_rate, \
+                                                     fix_decimal_comma = fix_decimal_comma, executor = executor, time_window = time_window)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    if segmented:
+        analog_sigs: List[AnalogSignal] = convert_irregularly_sampled_signal_to_analog_signal_blocks(irregular_sig, sampling_rate = sampling_rate)
+    else:
+        analog_sigs: List[AnalogSignal] = [convert_irregularly_sampled_signal_to_analog_signal(irregular_sig, sampling_rate = sampling_rate)]
+    # the blocks of a segmented signal all share the same id
+    for analog_sig in analog_sigs:
+        analog_sig.annotate(id = f"{TypeID.RAW_DATA.value}.1", type_id = TypeID.RAW_DATA.value)
     
-    ap_tracks: List[APTrack] = _read_track_files(filepaths = csv_files, el_stimuli = main_pulses, sampling_rate = sampling_rate)
     track_aps: SpikeTrain = _find_action_potentials_on_tracks(ap_tracks = ap_tracks, 
                                                               el_stimuli = main_pulses,
                                                               signal = irregular_sig, 
                                                               window_size = ap_correlation_window_size, 
-                                                              sampling_rate = sampling_rate)
+                                                              sampling_rate = sampling_rate,
+                                                              workers = workers)
     
     # create mapping from names to channel ids
     channel_id_map = { type_id: {} for type_id in TypeID }
     channel_id_map[TypeID.ELECTRICAL_STIMULUS].update({"Main Pulse": main_pulses.annotations["id"]})
     channel_id_map[TypeID.RAW_DATA].update(
-        {"Analog Signal": analog_sig.annotations["id"],
+        {"Analog Signal": analog_sigs[0].annotations["id"],
          "Irregular Signal": irregular_sig.annotations["id"]
         })
     channel_id_map[TypeID.ACTION_POTENTIAL].update({"Track APs": track_aps.annotations["id"]})
@@ -412,7 +852,7 @@ def import_dapsys_csv_files(directory: str,
 
     segment.events.append(main_pulses)
     segment.irregularlysampledsignals.append(irregular_sig)
-    segment.analogsignals.append(analog_sig)
+    segment.analogsignals.extend(analog_sigs)
     segment.spiketrains.append(track_aps)
 
     block.segments.append(segment)
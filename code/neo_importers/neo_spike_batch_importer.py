@@ -0,0 +1,203 @@
+import os
+import time
+from multiprocessing import Pool
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+import yaml
+from neo.core import Block
+
+from neo_importers import import_cache
+from neo_importers.neo_spike_importer import import_spike_file
+from neo_importers.recording_io import store_block
+
+try:
+    import resource
+except ImportError:
+    # not available on windows, the peak memory is not reported there
+    resource = None
+
+## File name of the manifest within the output directory
+MANIFEST_FILE = "manifest.yml"
+## Extension of the spike2 files that are imported when a directory is given
+SPIKE2_EXTENSION = ".smr"
+
+## Collects the spike2 files to import
+#  @param files a directory (all spike2 files in it are imported), a glob pattern, or a list of file paths
+#  @param root the directory the names of the files are relative to, or None for the default, see import_spike_files
+#  @returns the sorted list of the files, and the root directory
+def _collect_files(files: Union[str, Path, Iterable[Union[str, Path]]], root: Optional[Union[str, Path]]) -> Tuple[List[Path], Path]:
+    if isinstance(files, (str, Path)):
+        path = Path(files)
+        if path.is_dir():
+            return sorted(path.glob(f"*{SPIKE2_EXTENSION}")), Path(root if root is not None else path)
+        if path.is_file():
+            return [path], Path(root if root is not None else ".")
+        # interpret it as glob pattern, relative to its first part without wildcards
+        anchor = Path(path.anchor) if path.is_absolute() else Path(".")
+        return sorted(anchor.glob(str(path.relative_to(anchor)))), Path(root if root is not None else ".")
+    return sorted(Path(fl) for fl in files), Path(root if root is not None else ".")
+
+## Converts import arguments into a representation that does not depend on the iteration order of sets and dicts
+#  @param value an import argument
+#  @returns the argument, with all sets converted into sorted lists and all dicts into dicts with sorted keys
+def _canonical_argument(value: Any) -> Any:
+    if isinstance(value, (set, frozenset)):
+        return sorted((_canonical_argument(item) for item in value), key = repr)
+    if isinstance(value, dict):
+        # dicts keep their insertion order, so their string representation is the same for the same items
+        return {key: _canonical_argument(value[key]) for key in sorted(value, key = repr)}
+    if isinstance(value, (list, tuple)):
+        return type(value)(_canonical_argument(item) for item in value)
+    return value
+
+## Reads the manifest of an output directory
+#  @param output_dir the output directory
+#  @returns a dict mapping the file names of the imported files to their manifest entries
+def load_manifest(output_dir: Path) -> Dict[str, Dict[str, Any]]:
+    manifest_file = Path(output_dir)/MANIFEST_FILE
+    if not manifest_file.is_file():
+        return {}
+    with open(manifest_file, "r") as fl:
+        manifest = yaml.load(fl, Loader=yaml.FullLoader)
+    if not isinstance(manifest, dict):
+        return {}
+    return {entry["file"]: entry for entry in manifest.get("files", [])}
+
+## Writes the manifest of an output directory. The file is replaced at once, so an interrupted write keeps the old manifest
+#  @param output_dir the output directory
+#  @param entries a dict mapping the file names of the imported files to their manifest entries
+def _store_manifest(output_dir: Path, entries: Dict[str, Dict[str, Any]]) -> None:
+    tmp_manifest_file = output_dir/f"tmp_{MANIFEST_FILE}"
+    with open(tmp_manifest_file, "w") as fl:
+        yaml.dump({"version": import_cache.CACHE_VERSION, "files": [entries[name] for name in sorted(entries)]}, fl)
+    os.replace(tmp_manifest_file, output_dir/MANIFEST_FILE)
+
+## Returns the peak memory usage of the current process. A forked worker process starts with the peak of its parent, see _import_file
+#  @returns the peak resident set size in MiB, or None if it is not available on this platform
+def _peak_memory() -> Optional[float]:
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports KiB, macOS reports bytes
+    return max_rss / (1 << 20) if os.uname().sysname == "Darwin" else max_rss / (1 << 10)
+
+## Returns the duration of the recording in a block
+#  @param block the imported Neo Block
+#  @returns the time from the earliest start to the latest stop of all segments, in seconds
+def _recording_duration(block: Block) -> float:
+    t_starts = [segment.t_start.rescale("s").magnitude for segment in block.segments if segment.t_start is not None]
+    t_stops = [segment.t_stop.rescale("s").magnitude for segment in block.segments if segment.t_stop is not None]
+    if len(t_starts) == 0 or len(t_stops) == 0:
+        return 0.0
+    return float(max(t_stops) - min(t_starts))
+
+## Computes the names of the files relative to the root directory, so files with the same name in different directories are distinguished
+#  @param file_names the spike2 files
+#  @param root the directory that contains all files
+#  @returns the relative paths of the files, in the same order
+def _relative_names(file_names: List[Path], root: Path) -> List[Path]:
+    root = Path(os.path.abspath(root))
+    names = []
+    for file_name in file_names:
+        file_name = Path(os.path.abspath(file_name))
+        if root not in file_name.parents:
+            raise ValueError(f"The file {file_name} is not in the root directory {root}, pass the directory containing all files as root")
+        names.append(file_name.relative_to(root))
+    return names
+
+## Imports a single spike2 file and stores it as NIX file. This runs in the worker processes
+#  @param job tuple of the spike2 file, its name in the manifest, the output file, the name of the output file in the manifest, the fingerprint and the import arguments
+#  @returns the manifest entry of the file
+def _import_file(job: Tuple[Path, str, Path, str, str, Dict[str, Any]]) -> Dict[str, Any]:
+    file_name, name, output_file, output_name, key, import_args = job
+    entry = {"file": name, "path": str(file_name), "output": output_name, "fingerprint": key}
+    # the worker is forked from the main process and starts with its pages, so only the increase of the peak is caused by the import
+    start_memory = _peak_memory()
+    try:
+        import_start = time.perf_counter()
+        block, channel_id_map = import_spike_file(file_name, **import_args)
+        import_stop = time.perf_counter()
+        # write to a temporary file first, so an interrupted import never leaves a seemingly complete output
+        output_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_output_file = output_file.with_name(f"tmp_{output_file.name}")
+        store_block(tmp_output_file, block)
+        os.replace(tmp_output_file, output_file)
+        store_stop = time.perf_counter()
+    except Exception as ex:
+        entry["error"] = f"{type(ex).__name__}: {ex}"
+        return entry
+
+    data_objects = [data_object for segment in block.segments for data_object in segment.data_children]
+    entry.update({
+        "duration": _recording_duration(block),
+        "channel_id_map": {type_id.value: dict(channels) for type_id, channels in channel_id_map.items()},
+        "counts": {
+            "segments": len(block.segments),
+            "channels": {type_id.value: len(channels) for type_id, channels in channel_id_map.items()},
+            "datapoints": sum(len(data_object) for data_object in data_objects)
+        },
+        "timing": {"import": import_stop - import_start, "store": store_stop - import_stop},
+        "peak_memory_mb": _peak_memory() - start_memory if start_memory is not None else None
+    })
+    return entry
+
+## Imports multiple spike2 files with the same channel references and stores each of them as NIX file in the output directory.
+#  The files are imported in parallel worker processes. Each worker imports only one file, so the memory of large recordings is freed after each file.
+#  The output directory contains a manifest, which lists for each file the recording duration, the dict mapping the channel names to the unified ids,
+#  the number of channels and datapoints, the time needed to import and store it, as well as the peak memory of the import (peak_memory_mb).
+#  The peak memory is the increase of the peak resident set size of the worker process during the import, in MiB, i.e. the memory the import needed
+#  in addition to what the worker inherited from the main process. It is None if the files are imported in the current process,
+#  whose peak memory includes everything it did before. If the import of a file fails, its entry contains the error instead.
+#  The files are named by their paths relative to the root directory, e.g. "subject1/file.smr" for the pattern "study/*/*.smr" with the root "study",
+#  and the NIX files are stored in the same subdirectories of the output directory, so files with the same name in different directories do not overwrite each other.
+#  The names only depend on the root, so importing a subset or a superset of the files later with the same root keeps the names of the files in the manifest.
+#  Files whose output is up to date, i.e. whose name, size and modification time as well as the import arguments did not change, are not imported again.
+#  @param files a directory (all .smr files in it are imported), a glob pattern, or a list of file paths
+#  @param output_dir the directory to store the NIX files and the manifest in, will be created on demand. The NIX files are named like the spike2 files, see above
+#  @param workers the number of worker processes. Pass None to use one per CPU, or 0 to import all files in the current process
+#  @param root the directory containing all files, which their names are relative to. Defaults to the directory if files is a directory,
+#         and to the current working directory otherwise. A ValueError is raised if a file is not in the root directory
+#  @param import_args the channel references and further arguments passed to import_spike_file for each file
+#  @returns a dict mapping the file names of the files given in this call to their manifest entries, including the ones that were up to date
+def import_spike_files(files: Union[str, Path, Iterable[Union[str, Path]]],
+                       output_dir: Union[str, Path],
+                       workers: int = None,
+                       root: Union[str, Path] = None,
+                       **import_args) -> Dict[str, Dict[str, Any]]:
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    entries = load_manifest(output_dir)
+    canonical_args = {name: _canonical_argument(value) for name, value in import_args.items()}
+
+    jobs = []
+    names = []
+    file_names, root = _collect_files(files, root)
+    for file_name, relative_name in zip(file_names, _relative_names(file_names, root)):
+        name = relative_name.as_posix()
+        names.append(name)
+        output_name = relative_name.with_suffix(".nix").as_posix()
+        output_file = output_dir/output_name
+        key = import_cache.fingerprint([str(file_name)], **canonical_args)
+        entry = entries.get(name, None)
+        if entry is not None and entry["fingerprint"] == key and "error" not in entry and output_file.is_file():
+            continue
+        jobs.append((file_name, name, output_file, output_name, key, import_args))
+
+    # store the manifest after each file, so an interrupted batch only needs to import the remaining files
+    _store_manifest(output_dir, entries)
+    if len(jobs) == 0:
+        return {name: entries[name] for name in names}
+    if workers == 0:
+        for entry in map(_import_file, jobs):
+            # the peak memory of this process is not the one of the file
+            if "error" not in entry:
+                entry["peak_memory_mb"] = None
+            entries[entry["file"]] = entry
+            _store_manifest(output_dir, entries)
+    else:
+        with Pool(processes=workers, maxtasksperchild=1) as pool:
+            for entry in pool.imap_unordered(_import_file, jobs):
+                entries[entry["file"]] = entry
+                _store_manifest(output_dir, entries)
+    return {name: entries[name] for name in names}
@@ -1,8 +1,9 @@
 from pathlib import Path
-from typing import Dict, List, Set, Iterable, Union, Tuple, Callable
+from typing import Dict, List, Set, Union, Tuple
 from neo.core import Block, Segment, SpikeTrain, Event, AnalogSignal, Group, Epoch
 from neo.core.dataobject import DataObject
 from neo.io import Spike2IO
+from neo.io.proxyobjects import BaseProxy, SpikeTrainProxy
 from numpy import ndarray as NPArray
 from quantities import s, Quantity, Hz
 import numpy as np
@@ -69,44 +70,83 @@ def _normalize_channel_refs(references: EventChannelReferences) -> Set[EventChan
         result.update([(ch_ref, item) for item in items])
     return result
 
-## Returns the channel that is referenced by either the spike2 channel ID or by the channel name
-#  @param channels Iterable container containing all channels
-#  @param ref channel reference, either the channel name (str) or the spike2 channel ID (int)
-#  @returns The first channel in the container matching the reference
-def _channel_by_reference(channels: Iterable[DataObject], ref: ChannelReference) -> DataObject:
-    for channel in channels:
-        if (isinstance(ref, str) and channel.name == ref) \
-            or (isinstance(ref, int) and channel.annotations.get("channel_id", None) == ref):
-            return channel
-    return None
-
-## Returns a spike train channel referenced by the channel name or spike2 channel ID, as well as the filter
-#  @param channels Iterable container containing all channels
-#  @param tuple of a channel reference, either the channel name (str) or the spike2 channel ID (int), and the filter index
-#  @returns The first channel in the container matching the reference
-def _spiketrain_by_reference(channels: Iterable[SpikeTrain], ref: SpikeChannelReference) -> SpikeTrain:
-    if isinstance(ref, str) or isinstance(ref, int):
-        return _channel_by_reference(channels, ref)
-    ch_ref, spike_filter = ref
-    for channel in channels:
-        if (isinstance(ch_ref, str) and channel.name == f"{ch_ref}#{spike_filter}") \
-            or (isinstance(ch_ref, int) and channel.annotations.get("channel_id", None) == ch_ref \
-                and channel.annotations.get("spike_filter", None) == spike_filter):
-            return channel
-
-## Returns a event channel referenced by the channel name or spike2 channel ID, and optionally also the marker
-#  @param channels Iterable container containing all channels
-#  @param channel reference, either the channel name (str) or the spike2 channel ID (int), or a tuple of the channel reference and the marker (str)
-#  @returns The first channel in the container matching the reference
-def _event_channel_by_reference(channels: Iterable[Event], ref: EventChannelReference) -> Event:
-    if isinstance(ref, str) or isinstance(ref, int):
-        return _channel_by_reference(channels, ref)
-    ch_ref, marker = ref
-    for channel in channels:
-        if (isinstance(ch_ref, str) and channel.name == f"{ch_ref}#{marker}") \
-            or (isinstance(ch_ref, int) and channel.annotations.get("channel_id", None) == ch_ref \
-                and channel.annotations.get("marker", None) == marker):
-            return channel
+## Index to resolve channel references of a segment without searching through all channels for each reference.
+#  For each kind of channel (the name of the list in the segment, e.g. "events"), it maps the channel names, the spike2 channel IDs
+#  and the tuples of spike2 channel ID and spike filter or marker to the channel objects.
+#  If multiple channels match a reference, the first one in the segment is returned, the same as when searching the channels in order.
+#  The index is built after the names and channel ids were made unique, see _prepare_segment.
+#  Channels that are created afterwards, e.g. by forking a channel, need to be added with add.
+class _ReferenceIndex:
+    ## Kinds of channels that are indexed
+    KINDS = ("analogsignals", "irregularlysampledsignals", "spiketrains", "events", "epochs")
+
+    ## Builds the index for all channels of a segment
+    #  @param segment the Neo segment containing the channels
+    def __init__(self, segment: Segment):
+        self._names: Dict[str, Dict[str, DataObject]] = {kind: {} for kind in self.KINDS}
+        self._channel_ids: Dict[str, Dict[int, DataObject]] = {kind: {} for kind in self.KINDS}
+        self._filters: Dict[str, Dict[Tuple[int, Union[SpikeFilterReference, EventMarker]], DataObject]] = {kind: {} for kind in self.KINDS}
+        ## event channels split by their labels, by the name of the source channel, see _marker_channel
+        self.event_channel_splits: Dict[str, Dict[str, Event]] = {}
+        ## event channels of a single marker that were added to the segment, by the name of the source channel and the marker
+        self.marker_channels: Dict[Tuple[str, EventMarker], Event] = {}
+        for kind in self.KINDS:
+            for channel in getattr(segment, kind):
+                self.add(kind, channel)
+
+    ## Adds a channel to the index. The channel must already be appended to the corresponding list of the segment, so earlier channels take precedence
+    #  @param kind the kind of the channel, i.e. the name of the list in the segment
+    #  @param channel the channel to add
+    def add(self, kind: str, channel: DataObject) -> None:
+        self._names[kind].setdefault(channel.name, channel)
+        channel_id = channel.annotations.get("channel_id", None)
+        if channel_id is None:
+            return
+        self._channel_ids[kind].setdefault(channel_id, channel)
+        for filter_annotation in ("spike_filter", "marker"):
+            if filter_annotation in channel.annotations:
+                self._filters[kind].setdefault((channel_id, channel.annotations[filter_annotation]), channel)
+
+    ## Returns the channel that is referenced by either the spike2 channel ID or by the channel name
+    #  @param kind the kind of the channel, i.e. the name of the list in the segment
+    #  @param ref channel reference, either the channel name (str) or the spike2 channel ID (int)
+    #  @returns The first channel in the segment matching the reference, or None
+    def channel(self, kind: str, ref: ChannelReference) -> DataObject:
+        if isinstance(ref, str):
+            return self._names[kind].get(ref)
+        if isinstance(ref, int):
+            return self._channel_ids[kind].get(ref)
+        return None
+
+    ## Returns a channel that is referenced by a channel reference and a spike filter or marker
+    #  @param kind the kind of the channel, i.e. the name of the list in the segment
+    #  @param ch_ref channel reference, either the channel name (str) or the spike2 channel ID (int)
+    #  @param item the spike filter or marker
+    #  @returns The first channel in the segment matching the reference, or None
+    def _filtered_channel(self, kind: str, ch_ref: ChannelReference, item: Union[SpikeFilterReference, EventMarker]) -> DataObject:
+        if isinstance(ch_ref, str):
+            return self._names[kind].get(f"{ch_ref}#{item}")
+        if isinstance(ch_ref, int):
+            return self._filters[kind].get((ch_ref, item))
+        return None
+
+    ## Returns a spike train channel referenced by the channel name or spike2 channel ID, as well as the filter
+    #  @param ref a channel reference, either the channel name (str) or the spike2 channel ID (int), or a tuple of a channel reference and the filter index
+    #  @returns The first spiketrain in the segment matching the reference, or None
+    def spiketrain(self, ref: SpikeChannelReference) -> SpikeTrain:
+        if isinstance(ref, str) or isinstance(ref, int):
+            return self.channel("spiketrains", ref)
+        ch_ref, spike_filter = ref
+        return self._filtered_channel("spiketrains", ch_ref, spike_filter)
+
+    ## Returns a event channel referenced by the channel name or spike2 channel ID, and optionally also the marker
+    #  @param ref channel reference, either the channel name (str) or the spike2 channel ID (int), or a tuple of the channel reference and the marker (str)
+    #  @returns The first event channel in the segment matching the reference, or None
+    def event_channel(self, ref: EventChannelReference) -> Event:
+        if isinstance(ref, str) or isinstance(ref, int):
+            return self.channel("events", ref)
+        ch_ref, marker = ref
+        return self._filtered_channel("events", ch_ref, marker)
 
 ############################# Spiketrains #############################
 
@@ -152,7 +192,9 @@ def _make_spiketrain_names_unique_per_marker(spiketrains: List[SpikeTrain]) -> N
 # @param segment the Neo segment of which the spiketrains shall be prepared
 def _prepare_spiketrains(segment: Segment) -> None:
     # lists of all spiketrains with the same name
-    channels: Dict[str, List[SpikeTrain]] = {st.name: [s for s in segment.spiketrains if s.name == st.name] for st in segment.spiketrains}
+    channels: Dict[str, List[SpikeTrain]] = {}
+    for spiketrain in segment.spiketrains:
+        channels.setdefault(spiketrain.name, []).append(spiketrain)
     for spiketrains in channels.values():
         channel_refs = _group_spiketrains_by_channel_ref(spiketrains)
         _make_spiketrain_names_unique_per_channel(channel_refs.values())
@@ -178,41 +220,58 @@ def _prepare_events(segment: Segment) -> None:
 
 ############################# Electrical stimuli #############################
 
-## Creates a new event channel from an existing one, containing only labels that satisfy a condition
-#  @param event_channel Event channel to be forked from
-#  @param label_filter function that evaluates if a datapoint should be included in the result
-#  @result Event channel without a name, that only contains datapoints for which label_filter evaluated to true
-def _filter_event_channel(event_channel: Event, label_filter: Callable[[str], bool]) -> Event:
-    # list or ndarray
-    labels = event_channel.labels
-    # always an ndarray
-    times: NPArray = event_channel.times
-    matches = label_filter(labels) if isinstance(labels, NPArray) \
-         else [label_filter(l) for l in labels]
-    
-    new_times = times[matches]
-    new_labels = labels[matches] if isinstance(labels, NPArray) \
-        else [l for l in labels if label_filter(l)]
-    return Event(times=new_times, labels=new_labels, units=event_channel.units)
-
-## Creates a new event channel from another channel only containing datapoints where the marker matches a predefined value
+## Converts a marker to the label that Spike2IO uses for the events of that marker
+#  Spike2IO labels the events of marker channels with the character code of the marker as decimal string
+#  @param marker the marker character
+#  @returns the label of the events with that marker
+def _marker_label(marker: EventMarker) -> str:
+    return str(ord(marker))
+
+## Splits an event channel by the labels of its events, with a single pass over the labels.
+#  The events are grouped by their labels with one stable sort, so the events of each label stay in temporal order.
+#  @param channel the event channel to split
+#  @returns a dict mapping each label to an event channel without name, that contains all datapoints with that label
+def _split_event_channel(channel: Event) -> Dict[str, Event]:
+    labels: NPArray = np.asarray(channel.labels)
+    if len(labels) == 0:
+        return {}
+    unique_labels, label_idcs = np.unique(labels, return_inverse=True)
+    order = np.argsort(label_idcs, kind="stable")
+    group_stops = np.cumsum(np.bincount(label_idcs, minlength=len(unique_labels)))
+    return {
+        str(label): Event(times=channel.times[idcs], labels=labels[idcs], units=channel.units)
+            for label, idcs in zip(unique_labels, np.split(order, group_stops[:-1]))
+    }
+
+## Returns the event channel that contains only the datapoints of another channel where the marker matches a predefined value.
+#  All markers of the referenced channel are split at once, the first time one of them is requested, and the result is cached in the reference index.
+#  So all stimuli and extra stimuli that reference markers of the same channel share this work, and also share the channel of each marker.
 #  @param segment the segment to add the channel to
+#  @param index the reference index of the segment, the new channel is added to it
 #  @param channel_ref the reference to the channel that should be forked
 #  @param marker the marker for which to filter the channel
-#  @returns a newly created event channel with a unique name that contains all datapoints from the referenced channel that have the given marker label 
-def _create_filter_channel(segment: Segment, channel_ref: ChannelReference, marker: EventMarker) -> Event:
-    channel = _channel_by_reference(segment.events, channel_ref)
+#  @returns an event channel with a unique name that contains all datapoints from the referenced channel that have the given marker label
+def _marker_channel(segment: Segment, index: _ReferenceIndex, channel_ref: ChannelReference, marker: EventMarker) -> Event:
+    channel = index.channel("events", channel_ref)
     assert channel is not None
-    # very dirty hack
-    search_marker = str(ord(marker))
-    # Create new channel by filtering all where the label is the marker
-    new_channel = _filter_event_channel(channel, lambda label: label==search_marker)
+    new_channel = index.marker_channels.get((channel.name, marker), None)
+    if new_channel is not None:
+        return new_channel
+
+    if channel.name not in index.event_channel_splits:
+        index.event_channel_splits[channel.name] = _split_event_channel(channel)
+    new_channel = index.event_channel_splits[channel.name].get(_marker_label(marker), None)
+    if new_channel is None:
+        # no event has this marker
+        new_channel = Event(times=channel.times[:0], labels=np.asarray(channel.labels)[:0], units=channel.units)
     # add the marker to the name to make it unique
     new_channel.name = f"{channel.name}#{marker}"
     # add information about the fork to the newly created channel
     new_channel.annotate(forked_from=channel.name, marker=marker, channel_id=channel.annotations["channel_id"])
     # Add the channel to the segment
     segment.events.append(new_channel)
+    index.add("events", new_channel)
+    index.marker_channels[(channel.name, marker)] = new_channel
     return new_channel
 
 ## Converts stimuli event channels into the unified format for later use.
@@ -223,9 +282,10 @@ def _create_filter_channel(segment: Segment, channel_ref: ChannelReference, mark
 #  * type_id: the id of the type of channel (ELECTRICAL_STIMULUS)
 #  * intervals: array of intervals from each event to the next, last one is infinite (as there is no next event)
 #  @param segment the Neo segment containing the event channels
+#  @param index the reference index of the segment
 #  @param stimuli_channels references (either channel name or name - marker pairs) of the event channels of interest
 #  @returns a dict mapping channel names to our unified id format
-def _prepare_stimuli(segment: Segment, stimuli_channels: EventChannelReferences) -> Dict[str, str]:
+def _prepare_stimuli(segment: Segment, index: _ReferenceIndex, stimuli_channels: EventChannelReferences) -> Dict[str, str]:
     if stimuli_channels is None:
         return {}
     channels = _normalize_channel_refs(stimuli_channels)
@@ -235,11 +295,11 @@ def _prepare_stimuli(segment: Segment, stimuli_channels: EventChannelReferences)
         # Get the referenced channel
         channel: Event = None
         if isinstance(ev_ref, tuple):
-            # and if it is a "part" channel, create it first
+            # and if it is a "part" channel, get it from the split of the source channel
             ch_ref, marker = ev_ref
-            channel = _create_filter_channel(segment, ch_ref, marker)
+            channel = _marker_channel(segment, index, ch_ref, marker)
         else:
-            channel = _channel_by_reference(segment.events, ev_ref)
+            channel = index.channel("events", ev_ref)
         assert channel is not None
         # generate id
         type_id = TypeID.ELECTRICAL_STIMULUS.value
@@ -265,18 +325,19 @@ def _prepare_stimuli(segment: Segment, stimuli_channels: EventChannelReferences)
 #  * id: the unified channel id of our format
 #  * type_id: the id of the type of channel (RAW_DATA)
 #  @param segment the Neo segment containing the signal channels
+#  @param index the reference index of the segment
 #  @param raw_channels references (name or id) of the signal channels of interest
 #  @returns a dict mapping channel names to our unified id format
-def _prepare_raw_data(segment: Segment, raw_channels: Set[ChannelReference]) -> Dict[str, str]:
+def _prepare_raw_data(segment: Segment, index: _ReferenceIndex, raw_channels: Set[ChannelReference]) -> Dict[str, str]:
     if raw_channels is None:
         raw_channels = {a.name for a in segment.analogsignals}
     result = {}
-    index = 0
+    raw_index = 0
     type_id = TypeID.RAW_DATA.value
     for channel_ref in raw_channels:
-        channel = _channel_by_reference(segment.analogsignals, channel_ref)
-        channel_id = f"{type_id}.{index}"
-        index += 1
+        channel = index.channel("analogsignals", channel_ref)
+        channel_id = f"{type_id}.{raw_index}"
+        raw_index += 1
         channel.annotate(id=channel_id, type_id=type_id)
         result[channel.name] = channel_id
     return result
@@ -286,46 +347,42 @@ def _prepare_raw_data(segment: Segment, raw_channels: Set[ChannelReference]) ->
 ## Groups stimuli that are at most a certain interval apart together
 #  @param channel event channel containing the stimuli
 #  @param time_threshold maximum time between stimuli (as quantity convertable to time)
-#  @returns a List [start:stop] of the stimuli indices per group
-def _group_stimuli(channel: Event, time_threshold: Quantity) -> List[Tuple[int, int]]:
-    result: List[Tuple(int, int)] = []
-    last_ev: Quantity = None
-    start_index: int = 0
-    for i, ev in enumerate(channel.times):
-        if last_ev is not None and ev - last_ev > time_threshold:
-            result.append((start_index, i))
-            start_index = i
-        last_ev = ev
-    # add the last one
-    if start_index < len(channel.times):
-        result.append((start_index, len(channel.times)))
-    return result
+#  @returns the start and stop indices [start:stop] of the stimuli per group
+def _group_stimuli(channel: Event, time_threshold: Quantity) -> Tuple[NPArray, NPArray]:
+    times: NPArray = channel.times.magnitude
+    if len(times) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    threshold = float(Quantity(time_threshold).rescale(channel.times.units).magnitude)
+    # a new group starts behind every gap that is larger than the threshold
+    group_starts = np.flatnonzero(np.diff(times) > threshold) + 1
+    starts = np.concatenate([[0], group_starts])
+    stops = np.concatenate([group_starts, [len(times)]])
+    return starts, stops
 
 ## Creates new extra stimuli channel from event channelm where each extra stimuli is the time interval of stimuli groups
 #  @param from_channel the event channel containing the extra stimuli groups
 #  @param time_threshold maximum time between stimuli (as quantity convertable to time) so they are part of the same interval
 #  @returns an epoch channel containing the intervals of each extra stimulus
 def _create_extra_stimuli_channel(from_channel: Event, time_threshold: Quantity) -> Epoch:
-    stimuli: List[Tuple[int, int]] = _group_stimuli(from_channel, time_threshold)
-    #data_points: List[Quantity] = [from_channel.times[start:stop] for start, stop in stimuli]
+    starts, stops = _group_stimuli(from_channel, time_threshold)
+    event_times: NPArray = from_channel.times.magnitude
     # the label of each timespan is the label of the first event
-    labels = np.array([from_channel.labels[start] for start, _ in stimuli])
+    labels = np.asarray(from_channel.labels)[starts]
     # the timestamp of each timespan is the timestamp of the first event
-    times: Quantity = np.array([from_channel.times[start] for start, _ in stimuli]) * from_channel.units
+    times: Quantity = event_times[starts] * from_channel.units
     # the duration is the time difference between the first and last event
-    durations: Quantity = np.array([from_channel.times[stop-1] - from_channel.times[start] for start, stop in stimuli]) * from_channel.units
+    durations: Quantity = (event_times[stops - 1] - event_times[starts]) * from_channel.units
     frequencies: Quantity = None
     # with this deactivate the divide by 0 warning from NP
     # it just returns infinity
     with np.errstate(divide="ignore"):
         # the frequency is the number of pulses by the duration.
         # FIXME: shouldn't it be the number -1 as the last one marks exactly the end, so we only count the ones in the middle?
-        frequencies = np.array([(stop - start) / durations[i] for i, (start, stop) in enumerate(stimuli)]) / from_channel.units
-    frequencies.units = Hz
+        frequencies = ((stops - starts) / durations.magnitude) / from_channel.units
+    frequencies = frequencies.rescale(Hz)
     epoch = Epoch(times=times, durations=durations, labels=labels, units=from_channel.units)
     epoch.array_annotate(frequencies=frequencies)
     return epoch
-    
 
 ## Creates extra stimulus epoch channels in the unified format for later use.
 #  This creates new epoch channels from event channels in a given time threshold and annotates them with meta information
@@ -334,9 +391,10 @@ def _create_extra_stimuli_channel(from_channel: Event, time_threshold: Quantity)
 #  * type_id: the id of the type of channel (ELECTRICAL_EXTRA_STIMULUS)
 #  * frequencies: array of the extra stimulus frequency for each of the stimulus intervals
 #  @param segment the Neo segment containing the event channels
+#  @param index the reference index of the segment
 #  @param stimuli_channels references (either channel name or name - marker pairs) of the event channels of interest
 #  @returns a dict mapping channel names to our unified id format
-def _prepare_extra_stimuli(segment: Segment, stimuli_channels: EventChannelReferences, time_threshold: Quantity = 1*s) -> Dict[str, str]:
+def _prepare_extra_stimuli(segment: Segment, index: _ReferenceIndex, stimuli_channels: EventChannelReferences, time_threshold: Quantity = 1*s) -> Dict[str, str]:
     # basically the same as _prepare_stimuli
     if stimuli_channels is None:
         return {}
@@ -347,11 +405,11 @@ def _prepare_extra_stimuli(segment: Segment, stimuli_channels: EventChannelRefer
         # Get the referenced channel
         channel: Event = None
         if isinstance(ev_ref, tuple):
-            # and if it is a "part" channel, create it first
+            # and if it is a "part" channel, get it from the split of the source channel, which is shared with the stimuli
             ch_ref, marker = ev_ref
-            channel = _create_filter_channel(segment, ch_ref, marker)
+            channel = _marker_channel(segment, index, ch_ref, marker)
         else:
-            channel = _channel_by_reference(segment.events, ev_ref)
+            channel = index.channel("events", ev_ref)
         assert channel is not None
         from_channel = channel.annotations.get("forked_from", channel.name)
         marker = channel.annotations.get("marker", None)
@@ -365,6 +423,7 @@ def _prepare_extra_stimuli(segment: Segment, stimuli_channels: EventChannelRefer
         if marker is not None:
             extra_stimuli_channel.annotate(marker=marker)
         segment.epochs.append(extra_stimuli_channel)
+        index.add("epochs", extra_stimuli_channel)
         result[channel.name] = channel_id
     return result
 
@@ -377,35 +436,36 @@ def _prepare_extra_stimuli(segment: Segment, stimuli_channels: EventChannelRefer
 #  * type_id: the id of the type of channel (ELECTRICAL_EXTRA_STIMULUS)
 #  * amplitudes: array of the maximum amplitude of each of the stimuli
 #  @param segment the Neo segment containing the spiketrain and signal channels
+#  @param index the reference index of the segment
 #  @param from_raw Set of tuples of raw channel references with thresholds to extract spikes from
 #  @param spike_channels references (channel reference - filter id) to spiketrains that should be prepared as mechanical stimuli
 #  @returns a dict mapping channel names to our unified id format
-def _prepare_mechanical_stimuli(segment: Segment, from_raw: MechanicalStimulusReferences, spike_channels: SpikeChannelReferences) -> Dict[str, str]:
+def _prepare_mechanical_stimuli(segment: Segment, index: _ReferenceIndex, from_raw: MechanicalStimulusReferences, spike_channels: SpikeChannelReferences) -> Dict[str, str]:
     type_id = TypeID.MECHANICAL_STIMULUS.value
     result = {}
     stimulus_index = 0
     if from_raw is not None:
         for channel_ref, threshold in from_raw:
-            # create a new spiketrain from the raw signal
-            raw_channel = _channel_by_reference(segment.analogsignals, channel_ref)
+            # create a new spiketrain from the raw signal, which is already annotated with the amplitudes
+            raw_channel = index.channel("analogsignals", channel_ref)
             new_channel = spiketrain_from_raw(raw_channel, threshold)
             # set id
             channel_id = f"{type_id}.{stimulus_index}"
             stimulus_index += 1
             new_channel.annotate(id=channel_id, type_id=type_id)
-            new_channel.array_annotate(amplitudes=spike_amplitudes(new_channel))
             # add channel to segment
             segment.spiketrains.append(new_channel)
+            index.add("spiketrains", new_channel)
             result[new_channel.name] = channel_id
     if spike_channels is not None:
         spike_channels = _normalize_channel_refs(spike_channels)
         for channel_ref in spike_channels:
             # for already prepared spike channels we have nothing to do but add the id and type_id
-            channel = _spiketrain_by_reference(segment.spiketrains, channel_ref)
+            channel = index.spiketrain(channel_ref)
             channel_id = f"{type_id}.{stimulus_index}"
             stimulus_index += 1
             channel.annotate(id=channel_id, type_id=type_id)
-            channel.array_annotate(amplitudes=_get_amplitudes(channel))
+            channel.array_annotate(amplitudes=spike_amplitudes(channel))
             result[channel.name] = channel_id
     return result
             
@@ -416,9 +476,10 @@ def _prepare_mechanical_stimuli(segment: Segment, from_raw: MechanicalStimulusRe
 #  * id: the unified channel id of our format
 #  * type_id: the id of the type of channel (RAW_DATA)
 #  @param segment the Neo segment containing the signal channels
+#  @param index the reference index of the segment
 #  @param channel_refs spiketrain channel references tuple of channel refrence (name or id) and filter id of the spiketrains of interest
 #  @returns a dict mapping channel names to our unified id format
-def _prepare_action_potentials(segment: Segment, channel_refs: SpikeChannelReferences) -> Dict[str, str]:
+def _prepare_action_potentials(segment: Segment, index: _ReferenceIndex, channel_refs: SpikeChannelReferences) -> Dict[str, str]:
     if channel_refs is None:
         return
     elif isinstance(channel_refs, str):
@@ -431,7 +492,7 @@ def _prepare_action_potentials(segment: Segment, channel_refs: SpikeChannelRefer
     result = {}
 
     for ap_ref in channel_refs:
-        ap_channel: SpikeTrain = _spiketrain_by_reference(segment.spiketrains, ap_ref)
+        ap_channel: SpikeTrain = index.spiketrain(ap_ref)
         assert ap_channel is not None
         # Set the id
         channel_id = f"{type_id}.{ap_index}"
@@ -440,11 +501,78 @@ def _prepare_action_potentials(segment: Segment, channel_refs: SpikeChannelRefer
         result[ap_channel.name] = channel_id
     return result
 
+############################# Lazy loading #############################
+
+## Collects the proxy objects of all channels that are referenced by the import arguments, see import_spike_file
+#  The references are resolved the same way as by the _prepare_* functions, so the segment must already be prepared by _prepare_segment
+#  @param segment the lazily loaded Neo segment containing the proxy objects
+#  @param index the reference index of the segment
+#  @returns a list of the referenced proxy objects, each proxy is contained only once
+def _referenced_proxies(segment: Segment,
+                        index: _ReferenceIndex,
+                        stimuli_event_channels: EventChannelReferences,
+                        extra_stimuli_event_channels: EventChannelReferences,
+                        mechanical_stimuli_from_raw: MechanicalStimulusReferences,
+                        mechanical_stimuli_channels: SpikeChannelReferences,
+                        action_potential_channels: SpikeChannelReferences,
+                        raw_channels: Set[ChannelReference]) -> List[BaseProxy]:
+    result: List[BaseProxy] = []
+    # raw signals, including those mechanical stimuli are extracted from
+    raw_refs = {a.name for a in segment.analogsignals} if raw_channels is None else set(raw_channels)
+    if mechanical_stimuli_from_raw is not None:
+        raw_refs.update(channel_ref for channel_ref, _ in mechanical_stimuli_from_raw)
+    result += [index.channel("analogsignals", channel_ref) for channel_ref in raw_refs]
+    # event channels, for marker references the whole channel is needed as it is split after loading
+    for event_refs in (stimuli_event_channels, extra_stimuli_event_channels):
+        if event_refs is None:
+            continue
+        for ev_ref in _normalize_channel_refs(event_refs):
+            channel_ref = ev_ref[0] if isinstance(ev_ref, tuple) else ev_ref
+            result.append(index.channel("events", channel_ref))
+    # spiketrains
+    if mechanical_stimuli_channels is not None:
+        result += [index.spiketrain(st_ref) for st_ref in _normalize_channel_refs(mechanical_stimuli_channels)]
+    if isinstance(action_potential_channels, str) and action_potential_channels.lower() == "all":
+        result += segment.spiketrains
+    elif action_potential_channels is not None:
+        result += [index.spiketrain(st_ref) for st_ref in action_potential_channels]
+    # unresolved references are reported later by the _prepare_* functions
+    return list({id(proxy): proxy for proxy in result if proxy is not None}.values())
+
+## Loads the data of a proxy object and reapplies the names and annotations that were prepared on the proxy
+#  @param proxy the proxy object of the channel
+#  @param time_slice tuple of start and stop time of the data to load, None for no limit
+#  @returns the loaded Neo object
+def _load_proxy(proxy: BaseProxy, time_slice: Tuple[Quantity, Quantity]) -> DataObject:
+    if isinstance(proxy, SpikeTrainProxy):
+        channel = proxy.load(time_slice = time_slice, strict_slicing = False, load_waveforms = True)
+    else:
+        channel = proxy.load(time_slice = time_slice, strict_slicing = False)
+    channel.name = proxy.name
+    channel.annotations.clear()
+    channel.annotations.update(proxy.annotations)
+    # same as in _prepare_segment, the array annotations would cause errors with the NIX exporter
+    channel.array_annotations.clear()
+    return channel
+
+## Replaces the referenced proxy objects of a segment by their loaded data and drops all other proxies
+#  @param segment the lazily loaded Neo segment
+#  @param proxies the proxy objects to load
+#  @param time_slice tuple of start and stop time of the data to load, None for no limit
+def _load_proxies(segment: Segment, proxies: List[BaseProxy], time_slice: Tuple[Quantity, Quantity]) -> None:
+    loaded: Dict[int, DataObject] = {id(proxy): _load_proxy(proxy, time_slice) for proxy in proxies}
+    segment.analogsignals = [loaded[id(a)] for a in segment.analogsignals if id(a) in loaded]
+    segment.irregularlysampledsignals = [loaded[id(i)] for i in segment.irregularlysampledsignals if id(i) in loaded]
+    segment.spiketrains = [loaded[id(st)] for st in segment.spiketrains if id(st) in loaded]
+    segment.events = [loaded[id(ev)] for ev in segment.events if id(ev) in loaded]
+    segment.epochs = [loaded[id(ep)] for ep in segment.epochs if id(ep) in loaded]
+
 ############################# Loading #############################
 
 ## Prepare the segment for data extraction. Mainly unify name format and make them unique
 #  @param segment the semgent to prepare
-def _prepare_segment(segment: Segment) -> None:
+#  @returns the reference index of the prepared segment
+def _prepare_segment(segment: Segment) -> _ReferenceIndex:
     # the neo spike importer creates some faulty array annotations
     # we need to remove them because they cause errors with the NIX exporter
     remove_array_annotations(segment.data_children)
@@ -452,6 +580,7 @@ def _prepare_segment(segment: Segment) -> None:
     store_original_names(segment.data_children)
     _prepare_spiketrains(segment)
     _prepare_events(segment)
+    return _ReferenceIndex(segment)
 
 ## Import a spike2 binary file into our unified format
 #  @param stimuli_event_channels references to stimuli channels.
@@ -473,6 +602,10 @@ def _prepare_segment(segment: Segment) -> None:
 #         A channel reference is either the channel name (after being made unique) or the spike channel ID (channel number - 1)
 #  @param raw_channels references to the raw signal channels as set/list
 #         A channel reference is either the channel name (after being made unique) or the spike channel ID (channel number - 1)
+#  @param lazy if True, the channels are resolved on the proxy objects of the file and only the referenced channels are loaded.
+#         Otherwise, all channels are loaded and the unreferenced ones are discarded afterwards
+#  @param t_start if given, only the data from this time on is loaded. Implies lazy loading
+#  @param t_stop if given, only the data up to this time is loaded. Implies lazy loading
 #  @returns the Neo Block imported from spike together with a dict mapping type ids to a dict mapping channel names to the unified id format
 #           The type id is the string value of the TypeID enum and the unified id format is type_id.id where id is an incrementing number unique per type_id
 def import_spike_file(file_name: Path,
@@ -481,18 +614,28 @@ def import_spike_file(file_name: Path,
                       mechanical_stimuli_from_raw: MechanicalStimulusReferences = None,
                       mechanical_stimuli_channels: SpikeChannelReferences = None,
                       action_potential_channels: SpikeChannelReferences=None,
-                      raw_channels: Set[ChannelReference] = None) -> Tuple[Block, Dict[TypeID, Dict[str, str]]]:
+                      raw_channels: Set[ChannelReference] = None,
+                      lazy: bool = False,
+                      t_start: Quantity = None,
+                      t_stop: Quantity = None) -> Tuple[Block, Dict[TypeID, Dict[str, str]]]:
+    lazy = lazy or t_start is not None or t_stop is not None
     spikeio = Spike2IO(filename=str(file_name.resolve()))
-    blocks = spikeio.read(lazy=False, load_waveforms=True)
+    blocks = spikeio.read(lazy=lazy, load_waveforms=True)
     spike_data = blocks[0]
     channel_id_map = { type_id: {} for type_id in TypeID }
     for segment in spike_data.segments:
-        _prepare_segment(segment)
-        raw_id_map = _prepare_raw_data(segment, raw_channels)
-        stimuli_id_map = _prepare_stimuli(segment, stimuli_event_channels)
-        extra_stimuli_id_map = _prepare_extra_stimuli(segment, extra_stimuli_event_channels)
-        mechanical_stimuli_id_map = _prepare_mechanical_stimuli(segment, mechanical_stimuli_from_raw, mechanical_stimuli_channels)
-        ap_id_map = _prepare_action_potentials(segment, action_potential_channels)
+        index = _prepare_segment(segment)
+        if lazy:
+            proxies = _referenced_proxies(segment, index, stimuli_event_channels, extra_stimuli_event_channels, mechanical_stimuli_from_raw, 
+                                          mechanical_stimuli_channels, action_potential_channels, raw_channels)
+            _load_proxies(segment, proxies, (t_start, t_stop))
+            # the index needs to reference the loaded channels instead of the proxies
+            index = _ReferenceIndex(segment)
+        raw_id_map = _prepare_raw_data(segment, index, raw_channels)
+        stimuli_id_map = _prepare_stimuli(segment, index, stimuli_event_channels)
+        extra_stimuli_id_map = _prepare_extra_stimuli(segment, index, extra_stimuli_event_channels)
+        mechanical_stimuli_id_map = _prepare_mechanical_stimuli(segment, index, mechanical_stimuli_from_raw, mechanical_stimuli_channels)
+        ap_id_map = _prepare_action_potentials(segment, index, action_potential_channels)
         prune_segment(segment)
         channel_id_map[TypeID.RAW_DATA].update(raw_id_map)
         channel_id_map[TypeID.ELECTRICAL_STIMULUS].update(stimuli_id_map)
@@ -1,12 +1,11 @@
-from typing import Iterable, List, Tuple, Dict
+from typing import Iterable, List, Tuple, Dict, Union
 
-from quantities import Quantity
+from quantities import Quantity, dimensionless
 from neo.core import Segment, AnalogSignal, IrregularlySampledSignal, SpikeTrain
 from neo.core.dataobject import DataObject
 import numpy as np
 from neo_importers.neo_wrapper import TypeID
 
-from math import ceil
 
 ## Concatinates two quantity numpy arrays and preserves the units
 #  @param a the first array
@@ -14,6 +13,23 @@ from math import ceil
 def quantity_concat(a: Quantity, b: Quantity) -> Quantity:
     return np.concatenate([a, b.rescale(a.units)]) * a.units
 
+## Maps times onto the indices of stimuli with a binary search over the (sorted) stimulus times.
+#  This can be used to look up the sweep of whole arrays of times at once, e.g. for action potentials or track latencies.
+#  @param stimulus_times the sorted times of the stimuli
+#  @param times the times to look up. If both are quantities, the times are rescaled to the units of the stimulus times
+#  @param following if False, the index of the last stimulus before each time is returned, i.e. the sweep the time falls into, or -1 if there is none.
+#         If True, the index of the first stimulus after each time is returned, or the number of stimuli if there is none.
+#  @param inclusive whether a stimulus at exactly the same time counts as before/after that time
+#  @returns an integer numpy array containing the stimulus index for each time
+def stimulus_indices(stimulus_times: Quantity, times: Quantity, following: bool = False, inclusive: bool = True) -> np.ndarray:
+    if isinstance(stimulus_times, Quantity) and isinstance(times, Quantity):
+        times = times.rescale(stimulus_times.units)
+    stimulus_times = np.asarray(stimulus_times).ravel()
+    times = np.asarray(times)
+    if following:
+        return np.searchsorted(stimulus_times, times, side = "left" if inclusive else "right")
+    return np.searchsorted(stimulus_times, times, side = "right" if inclusive else "left") - 1
+
 ## Stores the original channel names in the annotations so after creating new ones in the unified format, they can be traced back
 #  @param objects iterable container containing all channels
 def store_original_names(objects: Iterable[DataObject]) -> None:
@@ -23,7 +39,9 @@ def store_original_names(objects: Iterable[DataObject]) -> None:
 ## Ensures names are unique by numbering ambiguous names
 #  @param objects iterable container containing all channels
 def make_names_unique(objects: Iterable[DataObject]) -> None:
-    objects_by_name: Dict[str, List[DataObject]] = {obj.name: [o for o in objects if o.name == obj.name] for obj in objects}
+    objects_by_name: Dict[str, List[DataObject]] = {}
+    for obj in objects:
+        objects_by_name.setdefault(obj.name, []).append(obj)
     for obj_list in objects_by_name.values():
         if len(obj_list) > 1:
             for i, obj in enumerate(obj_list):
@@ -52,46 +70,176 @@ def prune_segment(segment: Segment) -> None:
     segment.spiketrains = [st for st in segment.spiketrains if "type_id" in st.annotations]
     segment.imagesequences = [i for i in segment.imagesequences if "type_id" in i.annotations]
 
+## Finds the parts of a signal where it is at or above a threshold.
+#  The signal is processed chunk by chunk, where the state (above or below the threshold) of the last sample is carried over to the next chunk,
+#  so crossings at the chunk borders are handled correctly.
+#  @param signal numpy array of the signal values, either one dimensional or with one column per signal channel
+#  @param threshold the threshold in the units of the signal values
+#  @param chunk_size number of samples that are compared at once
+#  @returns a list with a tuple of start and stop indices for each column. A spike starts at the first sample at or above the threshold 
+#           and stops at the first sample below the threshold. Spikes that do not end before the end of the signal are omitted
+def find_threshold_crossings(signal: np.ndarray, threshold: float, chunk_size: int = 1 << 20) -> List[Tuple[np.ndarray, np.ndarray]]:
+    signal = signal.reshape(len(signal), -1)
+    num_samples, num_columns = signal.shape
+    starts: List[List[np.ndarray]] = [[] for _ in range(num_columns)]
+    stops: List[List[np.ndarray]] = [[] for _ in range(num_columns)]
+    # the signal is below the threshold before the first sample
+    was_above = np.zeros(num_columns, dtype = np.int8)
+    for chunk_start in range(0, num_samples, chunk_size):
+        above = (signal[chunk_start : chunk_start + chunk_size] >= threshold).astype(np.int8)
+        # +1 where the signal rises to the threshold, -1 where it falls below again
+        edges = np.diff(above, axis = 0, prepend = was_above[np.newaxis, :])
+        for column in range(num_columns):
+            starts[column].append(np.flatnonzero(edges[:, column] == 1) + chunk_start)
+            stops[column].append(np.flatnonzero(edges[:, column] == -1) + chunk_start)
+        was_above = above[-1]
+
+    result = []
+    for column_starts, column_stops in zip(starts, stops):
+        column_starts = np.concatenate(column_starts) if len(column_starts) > 0 else np.zeros(0, dtype = np.int64)
+        column_stops = np.concatenate(column_stops) if len(column_stops) > 0 else np.zeros(0, dtype = np.int64)
+        # starts and stops alternate, so only the last start can be without a stop
+        result.append((column_starts[:len(column_stops)], column_stops))
+    return result
+
+## Converts a threshold to a plain number in the units of a channel
+#  @param channel the channel the threshold is applied to
+#  @param threshold the threshold, either as quantity convertable to the unit of the channel or as number in the unit of the channel
+def _threshold_magnitude(channel: AnalogSignal, threshold: Union[Quantity, float]) -> float:
+    if isinstance(threshold, Quantity) and threshold.dimensionality != dimensionless.dimensionality:
+        return float(threshold.rescale(channel.units).magnitude)
+    return float(threshold)
+
 ## Detects spikes in an analog signal where the amplitude exceeds a given threshold
 #  @param channel the analoge channel
 #  @param threshold the threshold to detect spikes
 #  @param signal_channel_index the channel index for multidimensional channels (default 0)
 #  @returns a list of start:stop datapoint indices of spikes within the analog signal
 def find_spikes(channel: AnalogSignal, threshold: Quantity, signal_channel_index: int=0) -> List[Tuple[int, int]]:
-    result: List[Tuple[int, int]] = []
-    start_index: int = None
     assert channel.shape[1] > signal_channel_index
-    for i, amp_lst in enumerate(channel):
-        amp: Quantity = amp_lst[signal_channel_index]
-        if start_index is None and amp >= threshold:
-            start_index = i
-        elif start_index is not None and amp < threshold:
-            result.append((start_index, i))
-            start_index = None
+    starts, stops = find_threshold_crossings(channel.magnitude[:, signal_channel_index], _threshold_magnitude(channel, threshold))[0]
+    return list(zip(starts.tolist(), stops.tolist()))
+
+## Result of the threshold spike detection on one column of a signal, see detect_threshold_spikes
+#  Contains the following members:
+#  * starts: the sample indices of the first samples of the spikes
+#  * stops: the sample indices behind the last samples of the spikes
+#  * times: the start times of the spikes
+#  * amplitudes: the maximum value of each spike
+#  * waveforms: the values of the spikes, with the shape (number of spikes, 1, length of the longest spike) as used by neo spiketrains. Shorter spikes are padded with NaN
+class ThresholdSpikes:
+    def __init__(self, starts: np.ndarray, stops: np.ndarray, times: Quantity, amplitudes: Quantity, waveforms: Quantity):
+        self.starts: np.ndarray = starts
+        self.stops: np.ndarray = stops
+        self.times: Quantity = times
+        self.amplitudes: Quantity = amplitudes
+        self.waveforms: Quantity = waveforms
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+## Detects spikes where an analog signal is at or above a threshold, in all columns of the signal at once.
+#  @param channel the analog channel
+#  @param threshold the threshold to detect spikes, as quantity convertable to the unit of the channel
+#  @param chunk_size number of samples that are compared at once, see find_threshold_crossings
+#  @returns a ThresholdSpikes object for each column of the signal
+def detect_threshold_spikes(channel: AnalogSignal, threshold: Quantity, chunk_size: int = 1 << 20) -> List[ThresholdSpikes]:
+    values = channel.magnitude.reshape(len(channel), -1)
+    result = []
+    for column, (starts, stops) in enumerate(find_threshold_crossings(values, _threshold_magnitude(channel, threshold), chunk_size)):
+        column_values = values[:, column]
+        lengths = stops - starts
+        # starts and stops are all within the signal, so the maximum of each spike can be reduced between its start and stop
+        if len(starts) > 0:
+            amplitudes = np.maximum.reduceat(column_values, np.stack([starts, stops], axis = 1).ravel())[::2]
+        else:
+            amplitudes = np.zeros(0, dtype = column_values.dtype)
+        # cut all waveforms at once and pad them with NaN
+        max_length = int(lengths.max()) if len(lengths) > 0 else 0
+        offsets = np.arange(max_length)
+        sample_idcs = np.minimum(starts[:, np.newaxis] + offsets[np.newaxis, :], len(column_values) - 1)
+        waveforms = np.where(offsets[np.newaxis, :] < lengths[:, np.newaxis], column_values[sample_idcs], np.nan)
+        times = (channel.t_start + starts * channel.sampling_period).rescale(channel.t_start.units)
+        result.append(ThresholdSpikes(starts = starts, stops = stops, times = times,
+                                      amplitudes = amplitudes * channel.units, waveforms = waveforms[:, np.newaxis, :] * channel.units))
     return result
 
-# TODO maybe interpolation would be nice at some points (especially if the signal indeed is irregularly sampled)
-def convert_irregularly_sampled_signal_to_analog_signal(irregular_sig: IrregularlySampledSignal, sampling_rate: Quantity(10000, "Hz")) -> AnalogSignal:
-    
-    # allocate array for the regular signal
-    num_regular_samples = ceil(Quantity(irregular_sig.duration * sampling_rate).magnitude)
-    regular_sig = Quantity(np.zeros(num_regular_samples, dtype = np.float64), irregular_sig.dimensionality)
-
-    # calculate the indices of the samples
-    idcs: Quantity = (irregular_sig.times - irregular_sig.times[0]) * sampling_rate
-    idcs = idcs.magnitude
-    to_int = np.vectorize(np.int)
-    idcs = to_int(idcs)
-
-    # conversion step
-    regular_sig[idcs] = irregular_sig[:].ravel()
+## Computes the indices of irregularly sampled times on a regular grid
+#  @param times the times of the samples in seconds, as plain numpy array
+#  @param t_start the time of the first sample of the regular grid in seconds
+#  @param sampling_rate the sampling rate of the regular grid in Hz
+#  @returns an integer numpy array with the index of the grid point at or before each time
+def _regular_sample_indices(times: np.ndarray, t_start: float, sampling_rate: float) -> np.ndarray:
+    return np.floor((times - t_start) * sampling_rate).astype(np.int64)
+
+## Resamples the values of an irregularly sampled signal onto a regular grid starting at its first sample
+#  @param times the times of the samples in seconds, as plain numpy array
+#  @param values the values of the samples, with one column per signal channel
+#  @param sampling_rate the sampling rate of the regular grid in Hz
+#  @param interpolate if True, the values are linearly interpolated at the grid points. Otherwise, each sample is placed at the grid point at or before its time
+#         and grid points without a sample are 0
+#  @returns the values on the regular grid, with the same number of columns
+def _resample_regular(times: np.ndarray, values: np.ndarray, sampling_rate: float, interpolate: bool) -> np.ndarray:
+    num_samples = int(_regular_sample_indices(times[-1:], times[0], sampling_rate)[0]) + 1
+    if interpolate:
+        grid = times[0] + np.arange(num_samples, dtype = np.float64) / sampling_rate
+        return np.stack([np.interp(grid, times, values[:, column]) for column in range(values.shape[1])], axis = 1)
+    regular_values = np.zeros((num_samples, values.shape[1]), dtype = np.float64)
+    regular_values[_regular_sample_indices(times, times[0], sampling_rate)] = values
+    return regular_values
+
+## Converts an irregularly sampled signal to an analog signal covering the whole duration of the irregular signal
+#  @param irregular_sig the irregularly sampled signal
+#  @param sampling_rate the sampling rate of the analog signal
+#  @param interpolate if True, the values are linearly interpolated at the regular sampling points. Otherwise, each sample is placed at the 
+#         sampling point at or before its time and all other points are filled with zeros
+#  @returns an analog signal that starts at the first sample of the irregular signal
+def convert_irregularly_sampled_signal_to_analog_signal(irregular_sig: IrregularlySampledSignal, sampling_rate: Quantity = Quantity(10000, "Hz"),
+                                                        interpolate: bool = False) -> AnalogSignal:
+    times = irregular_sig.times.rescale("s").magnitude
+    fs = float(Quantity(sampling_rate).rescale("Hz").magnitude)
+    regular_sig = _resample_regular(times, irregular_sig.magnitude.reshape(len(times), -1), fs, interpolate)
     result: AnalogSignal = AnalogSignal(regular_sig, 
+                                        units = irregular_sig.units,
                                         t_start = irregular_sig.times[0], 
                                         sampling_rate = sampling_rate,
                                         name = "Analog Signal", 
                                         file_origin = irregular_sig.file_origin)
     return result
 
+## Converts an irregularly sampled signal to a list of analog signals, one for each contiguous part of the recording.
+#  The signal is split wherever two consecutive samples are more than max_gap apart, so no memory is allocated for the gaps.
+#  @param irregular_sig the irregularly sampled signal
+#  @param sampling_rate the sampling rate of the analog signals
+#  @param max_gap the largest distance of two samples within one block. Defaults to two sampling periods
+#  @param interpolate if True, the values are linearly interpolated at the regular sampling points within each block, see convert_irregularly_sampled_signal_to_analog_signal
+#  @returns the analog signals of the blocks sorted by time, each annotated with its block_index
+def convert_irregularly_sampled_signal_to_analog_signal_blocks(irregular_sig: IrregularlySampledSignal, sampling_rate: Quantity = Quantity(10000, "Hz"),
+                                                               max_gap: Quantity = None, interpolate: bool = False) -> List[AnalogSignal]:
+    times = irregular_sig.times.rescale("s").magnitude
+    values = irregular_sig.magnitude.reshape(len(times), -1)
+    fs = float(Quantity(sampling_rate).rescale("Hz").magnitude)
+    gap = 2.0 / fs if max_gap is None else float(Quantity(max_gap).rescale("s").magnitude)
+
+    # the blocks are separated at every sample that follows a gap
+    block_starts = np.concatenate([[0], np.flatnonzero(np.diff(times) > gap) + 1])
+    block_stops = np.concatenate([block_starts[1:], [len(times)]])
+
+    result: List[AnalogSignal] = []
+    for block_index, (start, stop) in enumerate(zip(block_starts, block_stops)):
+        if start == stop:
+            continue
+        regular_sig = _resample_regular(times[start:stop], values[start:stop], fs, interpolate)
+        block = AnalogSignal(regular_sig,
+                             units = irregular_sig.units,
+                             t_start = Quantity(times[start], "s"),
+                             sampling_rate = sampling_rate,
+                             name = "Analog Signal",
+                             file_origin = irregular_sig.file_origin)
+        block.annotate(block_index = block_index)
+        result.append(block)
+    return result
+
 ## Converts an index for a datapoint in an analog channel, to the time of that datapoint
 #  @param channel the signal channel from which the index is
 #  @param the index of the datapoint
@@ -105,22 +253,23 @@ def channel_index_to_time(channel: AnalogSignal, index: int) -> Quantity:
 ## Creates a new spiketrain from a raw channel where a spike is detected by the amplitude being higher than a threshold
 #  @param channel the signal channel to filter spikes from
 #  @param threshold the threshold to indicate spikes
-#  @returns a spiketrain with a unique name containing the spikes where the amplitude exceeded the threshold
+#  @returns a spiketrain with a unique name containing the spikes where the amplitude exceeded the threshold.
+#           The waveforms of shorter spikes are padded with NaN, their amplitudes are annotated as array annotation amplitudes
 def spiketrain_from_raw(channel: AnalogSignal, threshold: Quantity) -> SpikeTrain:
-    assert channel.signal.shape[1] == 1
-    spikes = find_spikes(channel, threshold)
-    signal = channel.signal.squeeze()
-    times = np.array([channel_index_to_time(channel, start) for start, _ in spikes]) * channel.sampling_period.units
-    waveforms = np.array([[signal[start:stop]] for start, stop in spikes]) * channel.units
+    assert channel.shape[1] == 1
+    spikes = detect_threshold_spikes(channel, threshold)[0]
     name = f"{channel.name}#{threshold}"
-    result = SpikeTrain(name=name, times=times, units=channel.units, t_start=channel.t_start, t_stop=channel.t_stop,
-                        waveforms=waveforms, sampling_rate=channel.sampling_rate, sort=True)
+    result = SpikeTrain(name=name, times=spikes.times, units=spikes.times.units, t_start=channel.t_start, t_stop=channel.t_stop,
+                        waveforms=spikes.waveforms, sampling_rate=channel.sampling_rate)
     result.annotate(from_channel=channel.name, threshold=threshold)
+    result.array_annotate(amplitudes=spikes.amplitudes)
     return result
 
 ## Get the maximum amplitude of each spike as quantity numpy array
 #  @param channel the spiketrain channel
-#  @returns a quantity numpy array containing the maximum amplitudes of each spike
+#  @returns a quantity numpy array containing the maximum amplitudes of each spike, NaN padding of the waveforms is ignored
 def spike_amplitudes(channel: SpikeTrain) -> Quantity:
-    # there is probably a numpy version of this
-    return np.array([max(wave[0]) for wave in channel.waveforms]) * channel.units
+    waveforms = np.asarray(channel.waveforms.magnitude, dtype = np.float64)
+    if len(waveforms) == 0 or waveforms.shape[-1] == 0:
+        return np.zeros(len(waveforms)) * channel.waveforms.units
+    return np.nanmax(waveforms[:, 0, :], axis = 1) * channel.waveforms.units
@@ -1,9 +1,13 @@
-from typing import Dict, Iterable, Union, List, Type
+from typing import Dict, Iterable, Union, List, Type, Tuple
 from abc import ABC
 from enum import Enum
+from math import floor
 
-from neo.core import Event, Epoch, AnalogSignal, SpikeTrain, Segment
+import numpy as np
+
+from neo.core import Event, Epoch, AnalogSignal, IrregularlySampledSignal, SpikeTrain, Segment
 from neo.core.dataobject import DataObject
+from neo.io.proxyobjects import BaseProxy
 from quantities import Quantity, ms
 
 ## Enum for the different channel types in our unified format
@@ -35,12 +39,153 @@ def _analog_signal_by_name(channels: Iterable[AnalogSignal], name: str) -> Analo
             return channel
     raise Exception(f"""No raw data channel with name \"{name}\"""")
 
+## Raw data channel that consists of several contiguous blocks of samples, e.g. a dapsys recording, which only contains the signal around the stimuli.
+#  The blocks are analog signals with the same id, sampling rate and units, that are annotated with their block_index.
+#  Only the recorded samples are kept in memory, the gaps between the blocks are not filled.
+#  The blocks can also be proxy objects (see recording_io.load_block with lazy = True), then each block is loaded on first access.
+#  Contains the following members:
+#  * blocks: the analog signals (or proxies) of the blocks, sorted by their start times
+#  * id: the channel id that is shared by all blocks
+#  * type_id: the type id of the channel, TypeID.RAW_DATA
+#  * name: the name of the channel
+#  * sampling_rate: the sampling rate of all blocks
+#  * units: the units of all blocks
+class SegmentedSignal:
+    def __init__(self, blocks: Iterable[AnalogSignal]):
+        self.blocks: List[AnalogSignal] = sorted(blocks, key = lambda block: float(block.t_start.rescale("s")))
+        if len(self.blocks) == 0:
+            raise ValueError("A segmented signal needs at least one block.")
+        first_block = self.blocks[0]
+        self.id: str = first_block.annotations.get("id")
+        self.type_id: TypeID = TypeID(first_block.annotations.get("type_id", TypeID.RAW_DATA.value))
+        self.name: str = first_block.name
+        self.annotations: Dict = first_block.annotations
+        self.sampling_rate: Quantity = first_block.sampling_rate
+        self.units: Quantity = first_block.units
+
+        # start and stop times of the blocks in seconds, for the binary search over the blocks
+        self._fs: float = float(self.sampling_rate.rescale("Hz").magnitude)
+        self._block_starts: np.ndarray = np.array([float(block.t_start.rescale("s").magnitude) for block in self.blocks])
+        self._block_stops: np.ndarray = self._block_starts + np.array([len(block) for block in self.blocks]) / self._fs
+
+    ## Total number of recorded samples in all blocks
+    def __len__(self) -> int:
+        return sum(len(block) for block in self.blocks)
+
+    @property
+    def sampling_period(self) -> Quantity:
+        return self.first_block.sampling_period
+
+    @property
+    def first_block(self) -> AnalogSignal:
+        return self.blocks[0]
+
+    @property
+    def dimensionality(self):
+        return self.first_block.dimensionality
+
+    @property
+    def t_start(self) -> Quantity:
+        return self.first_block.t_start
+
+    @property
+    def t_stop(self) -> Quantity:
+        return self.blocks[-1].t_stop
+
+    ## Returns a block, loading it first if it is a proxy object
+    #  @param block_idx the index of the block
+    #  @returns the analog signal of the block
+    def block(self, block_idx: int) -> AnalogSignal:
+        block = self.blocks[block_idx]
+        if isinstance(block, BaseProxy):
+            block = block.load()
+            self.blocks[block_idx] = block
+        return block
+
+    ## Finds the block that contains the given time
+    #  @param time the time to look up
+    #  @returns the index of the block containing the time, or -1 if the time lies within a gap or outside of the recording
+    def block_index(self, time: Quantity) -> int:
+        time = float(Quantity(time).rescale("s").magnitude)
+        block_idx = int(np.searchsorted(self._block_starts, time, side = "right")) - 1
+        if block_idx < 0 or time >= self._block_stops[block_idx]:
+            return -1
+        return block_idx
+
+    ## Computes the sample ranges of all blocks that overlap with a time range
+    #  @param t_start start of the time range
+    #  @param t_stop end of the time range
+    #  @returns a list of (block index, first sample, stop sample) tuples
+    def _sample_ranges(self, t_start: Quantity, t_stop: Quantity) -> List[Tuple[int, int, int]]:
+        t_start = float(Quantity(t_start).rescale("s").magnitude)
+        t_stop = float(Quantity(t_stop).rescale("s").magnitude)
+        # the first block that ends after the start and the last block that starts before the end
+        first_block_idx = int(np.searchsorted(self._block_stops, t_start, side = "right"))
+        stop_block_idx = int(np.searchsorted(self._block_starts, t_stop, side = "left"))
+
+        result = []
+        for block_idx in range(first_block_idx, stop_block_idx):
+            block_len = len(self.blocks[block_idx])
+            start_idx = min(max(floor((t_start - self._block_starts[block_idx]) * self._fs), 0), block_len)
+            stop_idx = min(max(floor((t_stop - self._block_starts[block_idx]) * self._fs), 0), block_len)
+            if stop_idx > start_idx:
+                result.append((block_idx, start_idx, stop_idx))
+        return result
+
+    ## Extracts the parts of the blocks within a time range
+    #  @param t_start start of the time range
+    #  @param t_stop end of the time range
+    #  @returns a list of analog signals, which are views on the blocks
+    def time_slice(self, t_start: Quantity, t_stop: Quantity) -> List[AnalogSignal]:
+        return [self.block(block_idx)[start_idx : stop_idx] for block_idx, start_idx, stop_idx in self._sample_ranges(t_start, t_stop)]
+
+    ## Extracts the recorded samples within a time range
+    #  @param t_start start of the time range
+    #  @param t_stop end of the time range
+    #  @returns the samples as quantity array. This is a view if the time range lies within one block, 
+    #           otherwise the samples of the blocks are concatenated without filling the gaps
+    def window(self, t_start: Quantity, t_stop: Quantity) -> Quantity:
+        ranges = self._sample_ranges(t_start, t_stop)
+        if len(ranges) == 1:
+            block_idx, start_idx, stop_idx = ranges[0]
+            return Quantity(self.block(block_idx).magnitude[start_idx : stop_idx], self.units, copy = False)
+        if len(ranges) == 0:
+            return Quantity(np.zeros((0, self.first_block.shape[1])), self.units)
+        return Quantity(np.concatenate([self.block(block_idx).magnitude[start_idx : stop_idx] for block_idx, start_idx, stop_idx in ranges]), self.units)
+
+## Groups the raw data channels which consist of several blocks into segmented signals
+#  @param channels the raw data channels by their ids
+#  @param signals all analog signals of the segment
+#  @returns the raw data channels, where all channels with blocks are replaced by a segmented signal
+def _group_segmented_signals(channels: Dict[str, DataObject], signals: Iterable[AnalogSignal]) -> Dict[str, DataObject]:
+    blocks: Dict[str, List[AnalogSignal]] = {}
+    for signal in signals:
+        if signal.annotations.get("type_id") == TypeID.RAW_DATA.value and "block_index" in signal.annotations:
+            blocks.setdefault(signal.annotations["id"], []).append(signal)
+    return {**channels, **{channel_id: SegmentedSignal(channel_blocks) for channel_id, channel_blocks in blocks.items()}}
+
+## Dictionary of raw data channels, that loads channels which are proxy objects on first access through [channel_id] or get and keeps the loaded channel
+#  Iterating over the values or items returns the channels as they are, i.e. proxies that were not accessed yet are not loaded
+class _LoadingChannelDict(dict):
+    def __getitem__(self, key: str) -> DataObject:
+        channel = super().__getitem__(key)
+        if isinstance(channel, BaseProxy):
+            channel = channel.load()
+            super().__setitem__(key, channel)
+        return channel
+
+    def get(self, key: str, default: DataObject = None) -> DataObject:
+        return self[key] if key in self else default
+
 ## Base class for representing a datapoint in a channel
+#  The wrappers only store references and compute their fields on access, so creating them for all datapoints of a channel is cheap
 #  Contains the following members:
 #  * recording: a reference to the MNG recording this wrapper was created from
 #  * channel: a reference to the Neo datastructure this data is from
 #  * index: the datapoint index within the neo structure
 class ChannelDataWrapper(ABC):
+    __slots__ = ("recording", "channel", "index")
+
     # To ensure polymorphic creation all subclasses must have the same constructor signature
     # The call to the super constructor itself is not necessary if these fields are not required
     def __init__(self, recording: "MNGRecording", channel: DataObject, index: int):
@@ -48,18 +193,37 @@ class ChannelDataWrapper(ABC):
         self.channel: DataObject = channel
         self.index: int = index
 
+    ## start time of the datapoint
+    @property
+    def time(self) -> Quantity:
+        return self.channel.times[self.index]
+
+## Returns the lengths of waveforms without their padding
+#  The importers pad the waveforms of a spiketrain to the length of the longest one with NaN at the end, see neo_utils.detect_threshold_spikes
+#  @param waveforms array of waveforms, the samples are on the last axis
+#  @returns integer array of the lengths with the shape of the waveforms without the last axis
+def _waveform_lengths(waveforms: np.ndarray) -> np.ndarray:
+    return np.count_nonzero(~np.isnan(np.asarray(waveforms, dtype = np.float64)), axis = -1)
+
 ## Wrapper class representing a single action potential
 #  Contains the following members:
 #  * time: start time of the ap spike
-#  * raw_signal: raw data of the waveform
+#  * raw_signal: raw data of the waveform, without the NaN padding of shorter waveforms
 #  * duration: length of the spike
 class ActionPotentialWrapper(ChannelDataWrapper):
+    __slots__ = ()
+
     def __init__(self, recording: "MNGRecording", ap_channel: SpikeTrain, ap_index: int):
         super().__init__(recording, ap_channel, ap_index)
-        self.time: Quantity = ap_channel.times[ap_index]
-        self.raw_signal: Quantity = ap_channel.waveforms[ap_index, 0]
-        self.duration: Quantity = len(self.raw_signal) * ap_channel.sampling_period
-        self.duration.units = ms
+
+    @property
+    def raw_signal(self) -> Quantity:
+        waveform = self.channel.waveforms[self.index, 0]
+        return waveform[: _waveform_lengths(waveform.magnitude)]
+
+    @property
+    def duration(self) -> Quantity:
+        return (_waveform_lengths(self.channel.waveforms[self.index, 0].magnitude) * self.channel.sampling_period).rescale(ms)
 
     def __str__(self):
         return (f"""Action potential:\n"""  + 
@@ -71,10 +235,14 @@ class ActionPotentialWrapper(ChannelDataWrapper):
 #  * time: start time of the event
 #  * interval: the time until the next stimulus
 class ElectricalStimulusWrapper(ChannelDataWrapper):
+    __slots__ = ()
+
     def __init__(self, recording: "MNGRecording", es_channel: Event, es_index: int):
         super().__init__(recording, es_channel, es_index)
-        self.time: Quantity = es_channel.times[es_index]
-        self.interval: Quantity = es_channel.array_annotations["intervals"][es_index]
+
+    @property
+    def interval(self) -> Quantity:
+        return self.channel.array_annotations["intervals"][self.index]
 
     def __str__(self):
         return (f"""Electrical stimulus:\n"""  + 
@@ -95,11 +263,18 @@ class ElectricalStimulusWrapper(ChannelDataWrapper):
 #  * duration: length of the whole stimulus group
 #  * frequency: frequency of the stimuli within that interval
 class ElectricalExtraStimulusWrapper(ChannelDataWrapper):
+    __slots__ = ()
+
     def __init__(self, recording: "MNGRecording", ex_channel: Epoch, ex_index: int):
         super().__init__(recording, ex_channel, ex_index)
-        self.time: Quantity = ex_channel.times[ex_index]
-        self.duration: Quantity = ex_channel.durations[ex_index]
-        self.frequency: Quantity = ex_channel.array_annotations["frequency"][ex_index]
+
+    @property
+    def duration(self) -> Quantity:
+        return self.channel.durations[self.index]
+
+    @property
+    def frequency(self) -> Quantity:
+        return self.channel.array_annotations["frequencies"][self.index]
 
 ## Wrapper class representing a single mechanical stimulus
 #  Contains the following members:
@@ -108,19 +283,32 @@ class ElectricalExtraStimulusWrapper(ChannelDataWrapper):
 #  * duration: length of the stimulus
 #  * amplitude: maximum amplitude of that stimulus
 class MechanicalStimulusWrapper(ChannelDataWrapper):
+    __slots__ = ()
+
     def __init__(self, recording: "MNGRecording", ms_channel: SpikeTrain, ms_index: int):
         super().__init__(recording, ms_channel, ms_index)
-        self.time: Quantity = ms_channel.times[ms_index]
-        self.raw_signal: Quantity = ms_channel.waveforms[ms_index, 0]
-        self.duration: Quantity = len(self.raw_signal) * ms_channel.sampling_period
-        self.amplitude: Quantity = ms_channel.array_annotations["amplitudes"][ms_index]
 
-## Iterator class allows iterating over a channel and creating the wrapper instances ad-hoc
+    @property
+    def raw_signal(self) -> Quantity:
+        return self.channel.waveforms[self.index, 0]
+
+    @property
+    def duration(self) -> Quantity:
+        return self.channel.waveforms.shape[-1] * self.channel.sampling_period
+
+    @property
+    def amplitude(self) -> Quantity:
+        return self.channel.array_annotations["amplitudes"][self.index]
+
+## Iterator class allows iterating over a channel (or a view of it) and creating the wrapper instances ad-hoc
 #  This class should not be used directly, only for iteration in for-in loops
 class DataWrapperIterator:
+    __slots__ = ("channel", "indices", "length", "index")
+
     def __init__(self, channel: "ChannelWrapper"):
         self.channel: ChannelWrapper = channel
-        self.length: int = len(channel.channel)
+        self.indices: Union[range, np.ndarray] = channel.indices
+        self.length: int = len(self.indices)
         self.index: int = 0
     
     def __iter__(self):
@@ -131,20 +319,37 @@ class DataWrapperIterator:
         if self.index >= self.length:
             raise StopIteration()
         # Polymorphically create the wrapper class
-        result = self.channel.wrapper_class(self.channel.recording, self.channel.channel, self.index)
+        result = self.channel.wrapper_class(self.channel.recording, self.channel.channel, int(self.indices[self.index]))
         self.index += 1
         return result
 
+## Converts the datapoint indices of a view into an index for numpy arrays, which is a view where possible
+#  @param indices the datapoint indices as range or integer array
+#  @returns a slice for ranges, otherwise the indices
+def _numpy_index(indices: Union[range, np.ndarray]) -> Union[slice, np.ndarray]:
+    if isinstance(indices, range):
+        # a negative stop of a descending range means "up to the first datapoint", which is None for slices
+        return slice(indices.start, indices.stop if indices.stop >= 0 else None, indices.step)
+    return indices
+
 # Maybe we want to implement the polymorphism via generics (however they may work in python)
 # so we can make use of type annotations, like for the iterator
 # Because currently it *hugs* pretty badly that vscode (and probably other editors/ides) 
 # does not recognize the type of the iterated object and can't give auto completions 
 
+## Index into the datapoints of a channel for the columnar accessors of ChannelWrapper:
+#  None for all datapoints, an int, a slice, a boolean mask or an array of indices
+ChannelIndex = Union[None, int, slice, np.ndarray, List[int]]
+
 ## Wrapper class representing a channel in the recording
 #  Allows transparent access of the datapoints as wrapper classes
 #  Provides container functionality through len, accessing thorugh [index] or [start:stop(:step)] and iterating through for-in
-#  Wrapper class instances are only created ad-hoc and not stored in memory 
+#  Wrapper class instances are only created ad-hoc and not stored in memory, slices and selections by boolean masks or index arrays return a ChannelView
+#  The columnar accessors (times, waveforms, durations, intervals, amplitudes, frequencies) return the values of all datapoints at once instead,
+#  optionally only for the datapoints selected by an index, and optionally as plain float64 arrays in the units of the quantities (views where possible)
 class ChannelWrapper:
+    __slots__ = ("recording", "channel", "wrapper_class", "id", "type_id")
+
     def __init__(self, recording: "MNGRecording", channel: DataObject, wrapper_class: Type[ChannelDataWrapper]):
         self.recording: MNGRecording = recording
         self.channel: DataObject = channel
@@ -158,34 +363,390 @@ class ChannelWrapper:
         # as all channels are basically glorified nparrays this is easy
         return len(self.channel)
     
-    def __getitem__(self, key: int) -> Union[ActionPotentialWrapper, List[ActionPotentialWrapper]]:
-        # FIXME: due to performance reasons (as this creates all wrappers at once) this should be rewritten
-        # returning an iterator that crates these instances when requested
+    ## The indices of the datapoints within the Neo datastructure
+    @property
+    def indices(self) -> Union[range, np.ndarray]:
+        return range(len(self.channel))
+
+    ## Returns the wrapper of a datapoint, or a ChannelView of several datapoints, which creates their wrappers only when they are accessed
+    #  @param key an int for a single datapoint, or a slice, a boolean mask or an array of indices for a view
+    def __getitem__(self, key: Union[int, slice, np.ndarray, List[int]]) -> Union[ChannelDataWrapper, "ChannelView"]:
+        indices = self.indices
+        if isinstance(key, (int, np.integer)):
+            # raises an IndexError for indices outside of the channel
+            return self.wrapper_class(self.recording, self.channel, int(indices[key]))
         if isinstance(key, slice):
-            return [self.wrapper_class(self.recording, self.channel, index) for index in range(*key.indices(len(self)))]
-        if not isinstance(key, int):
-            raise TypeError()
-        # all error checking with regards to the index/key will be done by numpy
-        # when accessing the data in the ActionPotentialWrapper constructor
-        return self.wrapper_class(self.recording, self.channel, key)
+            return ChannelView(self, indices[key])
+        key = np.asarray(key)
+        if key.dtype == bool:
+            if key.shape != (len(indices), ):
+                raise IndexError(f"Boolean index of length {len(key)} does not match the {len(indices)} datapoints.")
+            key = np.flatnonzero(key)
+        elif key.size > 0 and not np.issubdtype(key.dtype, np.integer):
+            raise TypeError(f"Cannot index channel {self.id} with {key.dtype}, use an integer, a slice, an integer array or a boolean mask.")
+        indices = np.arange(indices.start, indices.stop, indices.step) if isinstance(indices, range) else indices
+        return ChannelView(self, indices[key.astype(np.int64)])
 
     # setitem and delitem are skipped we don't need them
 
     def __iter__(self):
         return DataWrapperIterator(self)
+
+    ## Converts an index into the datapoints of this channel into an index into the Neo datastructure
+    #  @param index the datapoints to select, see ChannelIndex
+    #  @returns the index for the arrays of the Neo datastructure
+    def _channel_index(self, index: ChannelIndex) -> ChannelIndex:
+        return index
+
+    ## Selects the datapoints of a column and strips the units if requested
+    #  @param values the values of all datapoints of the Neo datastructure
+    #  @param index the datapoints to select, see ChannelIndex
+    #  @param unitless if True, the values are returned as float64 numpy array without units
+    #  @returns the selected values
+    def _column(self, values: Quantity, index: ChannelIndex, unitless: bool) -> Union[Quantity, np.ndarray]:
+        index = self._channel_index(index)
+        if index is not None:
+            values = values[index]
+        return self._strip_units(values, unitless)
+
+    ## Strips the units of the values if requested
+    #  @param values the values
+    #  @param unitless if True, the values are returned as float64 numpy array without units
+    #  @returns the values
+    @staticmethod
+    def _strip_units(values: Quantity, unitless: bool) -> Union[Quantity, np.ndarray]:
+        if unitless:
+            return np.asarray(values.magnitude if isinstance(values, Quantity) else values, dtype = np.float64)
+        return values
+
+    ## Returns an array annotation of the channel
+    #  @param name the name of the array annotation
+    #  @returns the values of all datapoints
+    def _array_annotation(self, name: str) -> Quantity:
+        if name not in self.channel.array_annotations:
+            raise ValueError(f"Channel {self.id} has no {name}.")
+        return self.channel.array_annotations[name]
+
+    ## Returns the waveforms of all datapoints, which only spiketrain channels have
+    def _waveforms(self) -> Quantity:
+        if getattr(self.channel, "waveforms", None) is None:
+            raise ValueError(f"Channel {self.id} has no waveforms.")
+        return self.channel.waveforms[:, 0]
+
+    ## The times of the datapoints
+    #  @param index the datapoints to select, see ChannelIndex
+    #  @param unitless if True, the values are returned as float64 numpy array in the units of the channel
+    #  @returns the times
+    def times(self, index: ChannelIndex = None, unitless: bool = False) -> Union[Quantity, np.ndarray]:
+        return self._column(self.channel.times, index, unitless)
+
+    ## The waveforms of the datapoints of spiketrain channels, see ActionPotentialWrapper.raw_signal. Shorter waveforms are padded with NaN by all importers
+    #  @param index the datapoints to select, see ChannelIndex
+    #  @param unitless if True, the values are returned as float64 numpy array in the units of the waveforms
+    #  @returns the waveforms with the shape (number of datapoints, length of the longest waveform)
+    def waveforms(self, index: ChannelIndex = None, unitless: bool = False) -> Union[Quantity, np.ndarray]:
+        return self._column(self._waveforms(), index, unitless)
+
+    ## The durations of the datapoints, i.e. of the waveforms for spiketrain channels (in ms) and of the intervals for epoch channels
+    #  @param index the datapoints to select, see ChannelIndex
+    #  @param unitless if True, the values are returned as float64 numpy array in the units of the durations
+    #  @returns the durations
+    def durations(self, index: ChannelIndex = None, unitless: bool = False) -> Union[Quantity, np.ndarray]:
+        if isinstance(self.channel, Epoch):
+            return self._column(self.channel.durations, index, unitless)
+        durations = (_waveform_lengths(self._waveforms().magnitude) * self.channel.sampling_period).rescale(ms)
+        return self._column(durations, index, unitless)
+
+    ## The intervals from each electrical stimulus to the next
+    #  @param index the datapoints to select, see ChannelIndex
+    #  @param unitless if True, the values are returned as float64 numpy array in the units of the intervals
+    #  @returns the intervals, the one of the last stimulus is infinite
+    def intervals(self, index: ChannelIndex = None, unitless: bool = False) -> Union[Quantity, np.ndarray]:
+        return self._column(self._array_annotation("intervals"), index, unitless)
+
+    ## The amplitudes of the datapoints of spiketrain channels, as annotated by the importer or otherwise the maximum of each waveform
+    #  @param index the datapoints to select, see ChannelIndex
+    #  @param unitless if True, the values are returned as float64 numpy array in the units of the amplitudes
+    #  @returns the amplitudes
+    def amplitudes(self, index: ChannelIndex = None, unitless: bool = False) -> Union[Quantity, np.ndarray]:
+        if "amplitudes" in self.channel.array_annotations:
+            return self._column(self.channel.array_annotations["amplitudes"], index, unitless)
+        waveforms = self._waveforms()
+        index = self._channel_index(index)
+        if index is not None:
+            waveforms = waveforms[index]
+        if waveforms.shape[-1] == 0:
+            amplitudes = np.zeros(waveforms.shape[:-1]) * waveforms.units
+        else:
+            # ignore the NaN padding of the waveforms
+            amplitudes = np.nanmax(np.asarray(waveforms.magnitude, dtype = np.float64), axis = -1) * waveforms.units
+        return self._strip_units(amplitudes, unitless)
+
+    ## The stimulus frequencies of electrical extra stimulus channels
+    #  @param index the datapoints to select, see ChannelIndex
+    #  @param unitless if True, the values are returned as float64 numpy array in the units of the frequencies
+    #  @returns the frequencies
+    def frequencies(self, index: ChannelIndex = None, unitless: bool = False) -> Union[Quantity, np.ndarray]:
+        return self._column(self._array_annotation("frequencies"), index, unitless)
         
+## View of some datapoints of a channel, as returned by ChannelWrapper when indexing it with a slice, a boolean mask or an array of indices
+#  The view only stores the indices of its datapoints, the wrappers are created when the datapoints are accessed.
+#  It supports len, indexing (which returns views of the view), iterating and the columnar accessors of ChannelWrapper
+#  Contains the following members in addition to the ones of ChannelWrapper:
+#  * indices: the indices of the datapoints within the Neo datastructure, as range for slices or as integer array
+class ChannelView(ChannelWrapper):
+    __slots__ = ("_indices", )
+
+    def __init__(self, channel: ChannelWrapper, indices: Union[range, np.ndarray]):
+        self.recording: MNGRecording = channel.recording
+        self.channel: DataObject = channel.channel
+        self.wrapper_class: Type[ChannelDataWrapper] = channel.wrapper_class
+        self.id: str = channel.id
+        self.type_id: TypeID = channel.type_id
+        self._indices: Union[range, np.ndarray] = indices
+
+    def __len__(self) -> int:
+        return len(self._indices)
+
+    @property
+    def indices(self) -> Union[range, np.ndarray]:
+        return self._indices
+
+    def _channel_index(self, index: ChannelIndex) -> ChannelIndex:
+        if index is None:
+            return _numpy_index(self._indices)
+        if isinstance(index, (int, np.integer, slice)):
+            return _numpy_index(self._indices[index])
+        indices = np.arange(self._indices.start, self._indices.stop, self._indices.step) if isinstance(self._indices, range) else self._indices
+        return indices[np.asarray(index)]
+
+## Index of the sweeps of an electrical stimulus channel and the action potentials within them, see MNGRecording.sweep_index
+#  A sweep starts at a stimulus and ends at the next one, the last sweep ends with the recording. An AP at the same time as a stimulus belongs to the sweep of that stimulus.
+#  Both channels need to be sorted by time. The index is built with a binary search over the stimulus times, without creating any wrappers.
+#  Contains the following members:
+#  * stimulus_channel: the Neo event channel of the stimuli
+#  * ap_channel: the Neo spiketrain channel of the action potentials
+#  * sweep_indices: the index of the sweep (i.e. of the last stimulus at or before it) of each AP, or -1 for APs before the first stimulus
+#  * latencies: the time from the start of the sweep to each AP, in the units of the stimulus times, NaN for APs before the first stimulus
+#  * ap_starts: the index of the first AP of each sweep
+#  * ap_stops: the index behind the last AP of each sweep, so the APs of sweep k are ap_starts[k]:ap_stops[k]
+class SweepIndex:
+    def __init__(self, stimulus_channel: Event, ap_channel: SpikeTrain):
+        self.stimulus_channel: Event = stimulus_channel
+        self.ap_channel: SpikeTrain = ap_channel
+        stimulus_times: np.ndarray = stimulus_channel.times.magnitude
+        ap_times: np.ndarray = ap_channel.times.rescale(stimulus_channel.times.units).magnitude
+
+        self.sweep_indices: np.ndarray = np.searchsorted(stimulus_times, ap_times, side = "right") - 1
+        latencies = np.full(len(ap_times), np.nan)
+        in_sweep = self.sweep_indices >= 0
+        latencies[in_sweep] = ap_times[in_sweep] - stimulus_times[self.sweep_indices[in_sweep]]
+        self.latencies: Quantity = Quantity(latencies, stimulus_channel.times.units)
+        self.ap_starts: np.ndarray = np.searchsorted(ap_times, stimulus_times, side = "left")
+        self.ap_stops: np.ndarray = np.append(self.ap_starts[1:], len(ap_times)).astype(self.ap_starts.dtype)
+
+    ## Number of sweeps, i.e. of stimuli
+    def __len__(self) -> int:
+        return len(self.ap_starts)
+
+    ## The indices of the APs within a sweep
+    #  @param sweep_idx the index of the sweep
+    #  @returns the range of the AP indices
+    def aps(self, sweep_idx: int) -> range:
+        return range(int(self.ap_starts[sweep_idx]), int(self.ap_stops[sweep_idx]))
+
+    ## Checks if the index was built for these channels, which are unchanged as far as can be checked without comparing the times
+    #  @param stimulus_channel the Neo event channel of the stimuli
+    #  @param ap_channel the Neo spiketrain channel of the action potentials
+    def matches(self, stimulus_channel: Event, ap_channel: SpikeTrain) -> bool:
+        return self.stimulus_channel is stimulus_channel and self.ap_channel is ap_channel \
+            and len(self.ap_starts) == len(stimulus_channel) and len(self.sweep_indices) == len(ap_channel)
+
+## Computes the range of the samples of an analog signal within a time range, in the same way as SegmentedSignal does for its blocks
+#  @param signal the analog signal or its proxy
+#  @param t_start start of the time range in seconds
+#  @param t_stop end of the time range in seconds
+#  @returns the index of the first sample and the index behind the last sample
+def _sample_range(signal: AnalogSignal, t_start: float, t_stop: float) -> Tuple[int, int]:
+    fs = float(signal.sampling_rate.rescale("Hz").magnitude)
+    signal_start = float(signal.t_start.rescale("s").magnitude)
+    start_idx = min(max(floor((t_start - signal_start) * fs), 0), len(signal))
+    stop_idx = min(max(floor((t_stop - signal_start) * fs), start_idx), len(signal))
+    return start_idx, stop_idx
+
+## Computes the range of the datapoints with sorted times within a time range
+#  @param times the sorted times
+#  @param t_start start of the time range in seconds
+#  @param t_stop end of the time range in seconds
+#  @returns the index of the first datapoint at or after t_start and the index behind the last datapoint before t_stop
+def _time_range(times: Quantity, t_start: float, t_stop: float) -> Tuple[int, int]:
+    # convert the bounds instead of the times, so the cost does not depend on the number of datapoints
+    scale = float(Quantity(1.0, "s").rescale(times.units).magnitude)
+    start_idx, stop_idx = np.searchsorted(times.magnitude, [t_start * scale, t_stop * scale], side = "left")
+    return int(start_idx), int(max(stop_idx, start_idx))
+
+## The data of all channels of a recording within a time window, see MNGRecording.time_window
+#  The datapoints of all channels at or after t_start and before t_stop are looked up with binary searches over the sorted times,
+#  so the cost depends on the size of the window, not on the length of the recording.
+#  Contains the following members:
+#  * t_start: start of the window
+#  * t_stop: end of the window
+#  * raw_data_channels: the samples of the raw data channels within the window, by their ids. Analog signals are views of the recorded signals,
+#    segmented signals are lists of views of their blocks (see SegmentedSignal.time_slice), proxies are loaded for the window only
+#  * raw_data_ranges: the sample ranges of the raw data channels, (first sample, stop sample) for signals and a list of (block index, first sample, stop sample)
+#    for segmented signals
+#  * action_potential_channels, electrical_stimulus_channels, mechanical_stimulus_channels: ChannelViews of the datapoints within the window, by the channel ids.
+#    Their indices are the ranges of the datapoints within the channels, and their columnar accessors give the times, waveforms etc. of these datapoints
+#  * electrical_extra_stimulus_channels: ChannelViews of the extra stimuli that overlap with the window, assuming that the extra stimuli of one channel do not overlap
+class RecordingWindow:
+    def __init__(self, recording: "MNGRecording", t_start: Quantity, t_stop: Quantity):
+        self.t_start: Quantity = t_start
+        self.t_stop: Quantity = t_stop
+        start = float(Quantity(t_start).rescale("s").magnitude)
+        stop = float(Quantity(t_stop).rescale("s").magnitude)
+
+        self.raw_data_channels: Dict[str, Union[AnalogSignal, IrregularlySampledSignal, List[AnalogSignal]]] = {}
+        self.raw_data_ranges: Dict[str, Union[Tuple[int, int], List[Tuple[int, int, int]]]] = {}
+        # iterating does not load the proxies, but gives the signals that were already loaded
+        for channel_id, channel in recording.raw_data_channels.items():
+            if isinstance(channel, SegmentedSignal):
+                self.raw_data_ranges[channel_id] = channel._sample_ranges(t_start, t_stop)
+                self.raw_data_channels[channel_id] = [channel.block(block_idx)[start_idx : stop_idx] for block_idx, start_idx, stop_idx in self.raw_data_ranges[channel_id]]
+                continue
+            if isinstance(channel, IrregularlySampledSignal) or getattr(channel, "proxy_for", None) is IrregularlySampledSignal:
+                start_idx, stop_idx = _time_range(channel.times, start, stop)
+            else:
+                start_idx, stop_idx = _sample_range(channel, start, stop)
+            self.raw_data_ranges[channel_id] = (start_idx, stop_idx)
+            if isinstance(channel, BaseProxy) and channel.proxy_for is IrregularlySampledSignal:
+                # the proxy includes a sample at t_stop, while the window does not
+                self.raw_data_channels[channel_id] = channel.load(time_slice = (t_start, t_stop))[: stop_idx - start_idx]
+            elif isinstance(channel, BaseProxy):
+                self.raw_data_channels[channel_id] = channel.load(time_slice = (channel.t_start + start_idx * channel.sampling_period,
+                                                                                channel.t_start + stop_idx * channel.sampling_period), strict_slicing = False)
+            else:
+                self.raw_data_channels[channel_id] = channel[start_idx : stop_idx]
+
+        self.action_potential_channels: Dict[str, ChannelView] = self._channel_views(recording.action_potential_channels, start, stop)
+        self.electrical_stimulus_channels: Dict[str, ChannelView] = self._channel_views(recording.electrical_stimulus_channels, start, stop)
+        self.mechanical_stimulus_channels: Dict[str, ChannelView] = self._channel_views(recording.mechanical_stimulus_channels, start, stop)
+        self.electrical_extra_stimulus_channels: Dict[str, ChannelView] = {}
+        for channel_id, channel in recording.electrical_extra_stimulus_channels.items():
+            start_idx, stop_idx = _time_range(channel.channel.times, start, stop)
+            # the extra stimulus before the window can still last into it
+            if start_idx > 0 and float((channel.channel.times[start_idx - 1] + channel.channel.durations[start_idx - 1]).rescale("s").magnitude) > start:
+                start_idx -= 1
+            self.electrical_extra_stimulus_channels[channel_id] = channel[start_idx : stop_idx]
+
+    ## Creates the views of the datapoints within the window
+    #  @param channels the channel wrappers by their ids
+    #  @param start start of the window in seconds
+    #  @param stop end of the window in seconds
+    #  @returns the views by the channel ids
+    @staticmethod
+    def _channel_views(channels: Dict[str, ChannelWrapper], start: float, stop: float) -> Dict[str, ChannelView]:
+        result = {}
+        for channel_id, channel in channels.items():
+            start_idx, stop_idx = _time_range(channel.channel.times, start, stop)
+            result[channel_id] = channel[start_idx : stop_idx]
+        return result
+
+## The samples of a raw data channel after each stimulus of an electrical stimulus channel, as (sweeps, samples) matrix, see MNGRecording.sweep_matrix
+#  Sweep k starts at the sample of the stimulus, i.e. floor((stimulus time - signal start) * sampling rate), like the sample ranges of SegmentedSignal.
+#  If the stimuli are a whole number of samples apart and all sweeps lie within the signal, e.g. for fixed interval protocols, the matrix is a read-only
+#  strided view of the signal without any copy. Otherwise, the sweeps are copied into a matrix once, which is padded with NaN where the signal has no samples.
+#  For segmented signals, each sweep is taken from the block that contains its stimulus and is always copied.
+#  Only the first channel of multi-channel signals is used.
+#  Contains the following members:
+#  * stimulus_channel: the Neo event channel of the stimuli
+#  * signal: the analog signal or segmented signal of the raw data
+#  * sweeps: the indices of the stimuli of the rows of the matrix
+#  * matrix: the samples as (sweeps, samples) array, without units
+#  * units: the units of the samples
+#  * times: the times of the columns relative to the stimuli
+#  * offsets: the index of the first sample of each sweep within the signal, or within its block for segmented signals
+#  * block_indices: the index of the block of each sweep for segmented signals, -1 for stimuli in a gap, None for other signals
+#  * lengths: the number of columns of each sweep before the end of the signal or block, the columns behind them are padding
+#  * is_view: whether the matrix is a view of the signal
+class SweepMatrix:
+    def __init__(self, stimulus_channel: Event, signal: Union[AnalogSignal, SegmentedSignal], window: Quantity, sweeps: range):
+        if not isinstance(signal, (AnalogSignal, SegmentedSignal)):
+            raise ValueError("A sweep matrix needs a regularly sampled raw data channel.")
+        self.stimulus_channel: Event = stimulus_channel
+        self.signal: Union[AnalogSignal, SegmentedSignal] = signal
+        self.sweeps: range = sweeps
+        self.units: Quantity = signal.units
+        fs = float(signal.sampling_rate.rescale("Hz").magnitude)
+        num_samples = max(floor(float(Quantity(window).rescale("s").magnitude) * fs), 0)
+        self.times: Quantity = (np.arange(num_samples) / fs * Quantity(1.0, "s")).rescale(Quantity(window).units)
+        stimulus_times: np.ndarray = stimulus_channel.times.rescale("s").magnitude[_numpy_index(sweeps)]
+
+        self.block_indices: np.ndarray = None
+        if isinstance(signal, SegmentedSignal):
+            self.block_indices = np.searchsorted(signal._block_starts, stimulus_times, side = "right") - 1
+            self.block_indices[(self.block_indices >= 0) & (stimulus_times >= signal._block_stops[self.block_indices])] = -1
+            self.offsets: np.ndarray = np.where(self.block_indices >= 0, np.floor((stimulus_times - signal._block_starts[self.block_indices]) * fs), 0).astype(np.int64)
+            block_lengths = np.array([len(block) for block in signal.blocks])[self.block_indices]
+            self.lengths: np.ndarray = np.where(self.block_indices >= 0, np.clip(block_lengths - self.offsets, 0, num_samples), 0)
+            self.is_view: bool = False
+            self.matrix: np.ndarray = np.full((len(sweeps), num_samples), np.nan)
+            for row, (block_idx, offset, length) in enumerate(zip(self.block_indices, self.offsets, self.lengths)):
+                if length > 0:
+                    self.matrix[row, : length] = self._samples(signal.block(block_idx))[offset : offset + length]
+            return
+
+        samples = self._samples(signal)
+        self.offsets: np.ndarray = np.floor((stimulus_times - float(signal.t_start.rescale("s").magnitude)) * fs).astype(np.int64)
+        self.lengths: np.ndarray = np.clip(len(samples) - self.offsets, 0, num_samples)
+        steps = np.unique(np.diff(self.offsets))
+        self.is_view: bool = len(self.offsets) > 0 and len(steps) <= 1 and self.offsets[0] >= 0 and self.offsets[-1] + num_samples <= len(samples)
+        if self.is_view:
+            step = int(steps[0]) if len(steps) == 1 else 0
+            self.matrix: np.ndarray = np.lib.stride_tricks.as_strided(samples[self.offsets[0] :], shape = (len(sweeps), num_samples),
+                                                                      strides = (step * samples.strides[0], samples.strides[0]), writeable = False)
+        else:
+            self.matrix: np.ndarray = np.full((len(sweeps), num_samples), np.nan)
+            for row, (offset, length) in enumerate(zip(self.offsets, self.lengths)):
+                # sweeps that start before the signal are padded at the start
+                first_idx = max(-offset, 0)
+                if length > first_idx:
+                    self.matrix[row, first_idx : length] = samples[offset + first_idx : offset + length]
+
+    ## Returns the samples of the first channel of a signal without units
+    @staticmethod
+    def _samples(signal: AnalogSignal) -> np.ndarray:
+        samples = signal.magnitude
+        return samples[:, 0] if samples.ndim == 2 else samples
+
+    ## Number of sweeps, i.e. of rows
+    def __len__(self) -> int:
+        return len(self.sweeps)
+
+    ## The samples of a sweep without the padding at its end
+    #  @param row the row of the sweep within the matrix
+    #  @returns the samples with units
+    def sweep(self, row: int) -> Quantity:
+        return Quantity(self.matrix[row, : self.lengths[row]], self.units, copy = False)
+
+    ## Checks if the matrix was built for these channels, which are unchanged as far as can be checked without comparing the times or samples
+    #  @param stimulus_channel the Neo event channel of the stimuli
+    #  @param signal the analog signal or segmented signal of the raw data
+    def matches(self, stimulus_channel: Event, signal: Union[AnalogSignal, SegmentedSignal]) -> bool:
+        return self.stimulus_channel is stimulus_channel and self.signal is signal and self.sweeps.stop <= len(stimulus_channel)
+
 ## Wrapper class representing a recording session using a Neo segment as data storage
 #  Allows access through [channel_id] to the Neo datastructures.
 #  Contains the following members:
 #  * name: The name of the recording
 #  * file_name: the filename this recording was stored in
 #  * all_channels: a dictionary mapping channel ids to the Neo channel objects
-#  * raw_data_channels_raw: a dictionary mapping the raw data channel ids to the Neo channel objects
+#  * raw_data_channels_raw: a dictionary mapping the raw data channel ids to the Neo channel objects, or to a SegmentedSignal if the channel consists of several blocks.
+#    If the segment was loaded lazily, the channels are proxy objects, which can load time slices with time_slice or load
 #  * action_potential_channels_raw: a dictionary mapping the action potential channel ids to the Neo channel objects
 #  * electrical_stimulus_channels_raw: a dictionary mapping the electrical stimulus channel ids to the Neo channel objects
 #  * electrical_extra_stimulus_channels_raw: a dictionary mapping the electrical extra stimulus channel ids to the Neo channel objects
 #  * mechanical_stimulus_channels_raw: a dictionary mapping the mechanical extra stimulus channel ids to the Neo channel objects
-#  * raw_dat_channels: the same as raw_data_channels_raw
+#  * raw_dat_channels: the same as raw_data_channels_raw, but proxy objects are loaded completely on first access through [channel_id]
 #  * action_potential_channels: a dictionary mapping the action potential channel ids to the channel wrapper objects
 #  * electrical_stimulus_channels: a dictionary mapping the electrical stimulus channel ids to the channel wrapper objects
 #  * electrical_extra_stimulus_channels: a dictionary mapping the electrical extra stimulus channel ids to the channel wrapper objects
@@ -207,15 +768,18 @@ class MNGRecording:
             channel.annotations["id"]: channel for channel in segment.data_children if "id" in channel.annotations
         }
 
-        self.raw_data_channels_raw: Dict[str, AnalogSignal] = {**_index_channels(segment.analogsignals, TypeID.RAW_DATA), \
-            **_index_channels(segment.irregularlysampledsignals, TypeID.RAW_DATA)}
+        self.raw_data_channels_raw: Dict[str, Union[AnalogSignal, SegmentedSignal]] = _group_segmented_signals({
+            **_index_channels(segment.analogsignals, TypeID.RAW_DATA), **_index_channels(segment.irregularlysampledsignals, TypeID.RAW_DATA)
+            }, segment.analogsignals)
+        # the blocks of segmented signals share their id, so we need to reference the whole signal instead
+        self.all_channels.update({channel_id: channel for channel_id, channel in self.raw_data_channels_raw.items() if isinstance(channel, SegmentedSignal)})
         self.action_potential_channels_raw: Dict[str, SpikeTrain] = _index_channels(segment.spiketrains, TypeID.ACTION_POTENTIAL)
         self.electrical_stimulus_channels_raw: Dict[str, Event] = _index_channels(segment.events, TypeID.ELECTRICAL_STIMULUS)
-        self.electrical_extra_stimulus_channels_raw: Dict[str, Epoch] = _index_channels(segment.events, TypeID.ELECTRICAL_EXTRA_STIMULUS)
+        self.electrical_extra_stimulus_channels_raw: Dict[str, Epoch] = _index_channels(segment.epochs, TypeID.ELECTRICAL_EXTRA_STIMULUS)
         self.mechanical_stimulus_channels_raw: Dict[str, SpikeTrain] = _index_channels(segment.spiketrains, TypeID.MECHANICAL_STIMULUS)
 
         # access wrappers
-        self.raw_data_channels = self.raw_data_channels_raw.copy()
+        self.raw_data_channels: Dict[str, Union[AnalogSignal, SegmentedSignal]] = _LoadingChannelDict(self.raw_data_channels_raw)
         self.action_potential_channels: Dict[str, ChannelWrapper] = \
             self.__create_channel_wrappers(self.action_potential_channels_raw, ActionPotentialWrapper)
         self.electrical_stimulus_channels: Dict[str, ChannelWrapper] = \
@@ -224,9 +788,70 @@ class MNGRecording:
             self.__create_channel_wrappers(self.electrical_extra_stimulus_channels_raw, ElectricalExtraStimulusWrapper)
         self.mechanical_stimulus_channels: Dict[str, ChannelWrapper] = \
             self.__create_channel_wrappers(self.mechanical_stimulus_channels_raw, MechanicalStimulusWrapper)
+
+        # sweep indices by the ids of the stimulus and AP channel, see sweep_index
+        self._sweep_indices: Dict[Tuple[str, str], SweepIndex] = {}
+        # sweep matrices by the ids of the stimulus and raw data channel, the number of samples and the range of the sweeps, see sweep_matrix
+        self._sweep_matrices: Dict[Tuple, SweepMatrix] = {}
     
     def __getitem__(self, key: str) -> DataObject:
+        # raw data channels are loaded on first access if they are proxies
+        if key in self.raw_data_channels:
+            return self.raw_data_channels[key]
         return self.all_channels.get(key)
 
-    def raw_data_channel_by_name(self, name: str) -> AnalogSignal:
-        return _analog_signal_by_name(channels = self.raw_data_channels.values(), name = name)
\ No newline at end of file
+    def raw_data_channel_by_name(self, name: str) -> Union[AnalogSignal, SegmentedSignal]:
+        channel = _analog_signal_by_name(channels = self.raw_data_channels.values(), name = name)
+        # access it by id, s.t. proxies are loaded
+        return self.raw_data_channels[channel.annotations["id"]]
+
+    ## Returns the data of all channels within a time window, see RecordingWindow
+    #  @param t_start start of the window (inclusive)
+    #  @param t_stop end of the window (exclusive)
+    #  @returns the data of the window
+    def time_window(self, t_start: Quantity, t_stop: Quantity) -> RecordingWindow:
+        return RecordingWindow(self, t_start, t_stop)
+
+    ## Returns the index of the sweeps of an electrical stimulus channel and the APs of an AP channel within them, see SweepIndex.
+    #  The index is built on first access and cached. It is rebuilt if one of the channels was replaced or changed its length,
+    #  call invalidate_sweep_indices after changing the times of a channel in place.
+    #  @param stimulus_channel_id the id of the electrical stimulus channel
+    #  @param ap_channel_id the id of the action potential channel
+    #  @returns the sweep index
+    def sweep_index(self, stimulus_channel_id: str, ap_channel_id: str) -> SweepIndex:
+        stimulus_channel = self.electrical_stimulus_channels[stimulus_channel_id].channel
+        ap_channel = self.action_potential_channels[ap_channel_id].channel
+        sweep_index = self._sweep_indices.get((stimulus_channel_id, ap_channel_id), None)
+        if sweep_index is None or not sweep_index.matches(stimulus_channel, ap_channel):
+            sweep_index = SweepIndex(stimulus_channel, ap_channel)
+            self._sweep_indices[(stimulus_channel_id, ap_channel_id)] = sweep_index
+        return sweep_index
+
+    ## Returns the samples of a raw data channel after each stimulus of an electrical stimulus channel as (sweeps, samples) matrix, see SweepMatrix.
+    #  The matrix is built on first access and cached, like the sweep indices. For fixed interval protocols it is a view of the signal, otherwise a padded copy.
+    #  @param stimulus_channel_id the id of the electrical stimulus channel
+    #  @param raw_data_channel_id the id of the raw data channel, proxies are loaded
+    #  @param window the duration of the sweeps after the stimuli
+    #  @param sweeps optional slice of the stimuli to include, all stimuli by default
+    #  @returns the sweep matrix
+    def sweep_matrix(self, stimulus_channel_id: str, raw_data_channel_id: str, window: Quantity, sweeps: slice = None) -> SweepMatrix:
+        stimulus_channel = self.electrical_stimulus_channels[stimulus_channel_id].channel
+        signal = self.raw_data_channels[raw_data_channel_id]
+        sweeps = range(len(stimulus_channel))[sweeps if sweeps is not None else slice(None)]
+        num_samples = floor(float(Quantity(window).rescale("s").magnitude * signal.sampling_rate.rescale("Hz").magnitude))
+        key = (stimulus_channel_id, raw_data_channel_id, num_samples, sweeps.start, sweeps.stop, sweeps.step)
+        sweep_matrix = self._sweep_matrices.get(key, None)
+        if sweep_matrix is None or not sweep_matrix.matches(stimulus_channel, signal):
+            sweep_matrix = SweepMatrix(stimulus_channel, signal, window, sweeps)
+            self._sweep_matrices[key] = sweep_matrix
+        return sweep_matrix
+
+    ## Removes the cached sweep indices and sweep matrices, see sweep_index and sweep_matrix
+    #  @param channel_id if given, only the ones that use the channel with this id are removed
+    def invalidate_sweep_indices(self, channel_id: str = None) -> None:
+        self._sweep_indices = {
+            channel_ids: sweep_index for channel_ids, sweep_index in self._sweep_indices.items() if channel_id is not None and channel_id not in channel_ids
+        }
+        self._sweep_matrices = {
+            key: sweep_matrix for key, sweep_matrix in self._sweep_matrices.items() if channel_id is not None and channel_id not in key[: 2]
+        }
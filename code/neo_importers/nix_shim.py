@@ -0,0 +1,89 @@
+import warnings
+from importlib.metadata import version
+from typing import Any, Callable, Dict, List
+
+import nixio
+import numpy as np
+from neo.core import AnalogSignal, IrregularlySampledSignal
+from neo.io import NixIO
+
+## Shim for the private APIs of neo.io.NixIO and nixio that recording_io needs, this is the only module that uses them.
+#  NixIO offers no public way to read signals as proxies or to customize the storage of the samples,
+#  and nixio can only chunk datasets automatically and compress them with gzip at level 6.
+#  The shim was checked against the versions in TESTED_VERSIONS, which are the ones in requirements.txt.
+#  A warning is issued on import if other versions are installed, check this module and update TESTED_VERSIONS when upgrading them.
+
+## Versions of neo and nixio the shim was checked against
+TESTED_VERSIONS: Dict[str, str] = {"neo": "0.9.0", "nixio": "1.5.0b6"}
+
+## Returns the installed versions of neo and nixio, to compare them with TESTED_VERSIONS
+def installed_versions() -> Dict[str, str]:
+    return {package: version(package) for package in TESTED_VERSIONS}
+
+if installed_versions() != TESTED_VERSIONS:
+    warnings.warn(f"nix_shim was checked against {TESTED_VERSIONS}, but {installed_versions()} are installed")
+
+## Returns the time dimension of a NIX DataArray of a signal
+#  @param data_array the NIX DataArray
+#  @returns the sampled or range dimension with the times
+def time_dimension(data_array: nixio.DataArray) -> Any:
+    return NixIO._get_time_dimension(data_array)
+
+## NixIO that creates proxy objects for the analog and irregularly sampled signals instead of reading their samples, see recording_io._LazyNixIO
+class ProxyNixIO(NixIO):
+    ## @param filename path of the file
+    #  @param mode the mode of NixIO
+    #  @param create_proxy function (reader, nix_da_group, neo_attrs, signal_type) that creates the proxy for a signal from its NIX DataArrays (one per channel),
+    #         its attributes and annotations and its class, AnalogSignal or IrregularlySampledSignal
+    def __init__(self, filename: str, mode: str, create_proxy: Callable[[NixIO, List[nixio.DataArray], Dict[str, Any], type], Any]):
+        super().__init__(filename, mode)
+        self._create_proxy = create_proxy
+
+    ## Creates the proxy for a signal and registers it like NixIO does for the signals it reads
+    def _nix_to_neo_proxy(self, nix_da_group: List[nixio.DataArray], signal_type: type) -> Any:
+        neo_attrs = self._nix_attr_to_neo(nix_da_group[0])
+        neo_attrs["nix_name"] = nix_da_group[0].metadata.name
+        proxy = self._create_proxy(self, nix_da_group, neo_attrs, signal_type)
+        self._neo_map[neo_attrs["nix_name"]] = proxy
+        for source in nix_da_group[0].sources:
+            self._ref_map.setdefault(source.name, []).append(proxy)
+        return proxy
+
+    def _nix_to_neo_analogsignal(self, nix_da_group):
+        return self._nix_to_neo_proxy(nix_da_group, AnalogSignal)
+
+    def _nix_to_neo_irregularlysampledsignal(self, nix_da_group):
+        return self._nix_to_neo_proxy(nix_da_group, IrregularlySampledSignal)
+
+## Wraps a NIX Block while NixIO writes an analog signal, s.t. its DataArrays are created by the given function
+class _DataArrayFactoryBlock:
+    def __init__(self, nixblock: nixio.Block, create_data_array: Callable[[nixio.Block, str, str, np.ndarray], nixio.DataArray]):
+        self._nixblock = nixblock
+        self._create_data_array = create_data_array
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._nixblock, name)
+
+    def create_data_array(self, name: str, array_type: str, data: np.ndarray, **kwargs) -> nixio.DataArray:
+        return self._create_data_array(self._nixblock, name, array_type, data)
+
+## NixIO that creates the DataArrays of analog signals with a custom function, everything else is written as usual
+class StorageNixIO(NixIO):
+    ## @param filename path of the file
+    #  @param mode the mode of NixIO, "rw" or "ow"
+    #  @param create_data_array function (nixblock, name, array_type, data) that creates a DataArray with the samples of one channel
+    def __init__(self, filename: str, mode: str, create_data_array: Callable[[nixio.Block, str, str, np.ndarray], nixio.DataArray]):
+        super().__init__(filename, mode)
+        self._create_data_array = create_data_array
+
+    def _write_analogsignal(self, anasig, nixblock, nixgroup):
+        return super()._write_analogsignal(anasig, _DataArrayFactoryBlock(nixblock, self._create_data_array), nixgroup)
+
+## Replaces the dataset of a DataArray with one that has the given HDF5 options, for the settings that nixio cannot set
+#  @param data_array the new DataArray, its dataset needs to be empty
+#  @param data the samples to write
+#  @param dataset_options options of h5py.Group.create_dataset, e.g. chunks or compression
+def replace_dataset(data_array: nixio.DataArray, data: np.ndarray, **dataset_options) -> None:
+    h5group = data_array._h5group.group
+    del h5group["data"]
+    h5group.create_dataset("data", data=data, maxshape=(None,), **dataset_options)
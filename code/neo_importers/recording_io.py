@@ -1,9 +1,21 @@
+import os
+import shutil
+import tempfile
+import weakref
 from pathlib import Path
-from typing import Dict, Tuple, List
-from neo.core import Block, Segment
+from typing import Any, Callable, Dict, Iterable, Tuple, List, Union
+import numpy as np
+import yaml
+from quantities import Quantity
+from neo.core import Block, Segment, AnalogSignal, IrregularlySampledSignal
 from neo.core.dataobject import DataObject
 from neo.io import NixIO, NeoHdf5IO
-from neo_importers.neo_wrapper import MNGRecording, TypeID
+from neo.io.nixio import create_quantity
+import nixio
+from nixio import Compression
+from neo.io.proxyobjects import BaseProxy, AnalogSignalProxy
+from neo_importers.neo_wrapper import MNGRecording, SegmentedSignal, TypeID
+from neo_importers import nix_shim
 
 ## Allowed file extensions for loading and storing
 EXTENSIONS = {'.h5', '.nix'}
@@ -13,15 +25,264 @@ EXTENSIONS = {'.h5', '.nix'}
 def _check_extension(file_name: Path) -> bool:
     return file_name.suffix in EXTENSIONS
 
+## Base class for proxies of signals stored in a NIX file, which read the samples from the file only when they are loaded.
+#  Like the proxy objects of Neo, they contain all the attributes and annotations of the signal, but not the samples.
+#  The proxies keep a reference to the reader, so the file stays open as long as any of them is in use, or until it is closed with close_lazy_files.
+#  Contains the following members in addition to the attributes of the signal:
+#  * units: the units of the signal as quantity
+#  * dtype: the data type of the samples in the file
+#  * shape: the shape of the signal, (number of samples, number of channels)
+class _NixSignalProxy(BaseProxy):
+    _single_parent_objects = ("Segment", "ChannelIndex")
+    _recommended_attrs = BaseProxy._recommended_attrs
+
+    ## Creates the proxy
+    #  @param reader the NixIO object that read the block, it needs to stay open
+    #  @param data_arrays the NIX DataArrays of the signal, one per channel
+    #  @param neo_attrs the attributes and annotations of the signal, as read by the reader
+    def __init__(self, reader: NixIO, data_arrays: List[Any], neo_attrs: Dict[str, Any]):
+        self._reader: NixIO = reader
+        self._data_arrays: List[Any] = data_arrays
+        self.units: Quantity = create_quantity(1.0, data_arrays[0].unit)
+        self.dtype: np.dtype = data_arrays[0].dtype
+        self.shape: Tuple[int, int] = (data_arrays[0].shape[0], len(data_arrays))
+        neo_attrs.setdefault("file_origin", reader.filename)
+        array_annotations = neo_attrs.pop("array_annotations", None)
+        BaseProxy.__init__(self, array_annotations=array_annotations, **neo_attrs)
+
+    ## Number of samples of the signal
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    @property
+    def dimensionality(self):
+        return self.units.dimensionality
+
+    ## Reads a range of samples from the file
+    #  @param start_idx index of the first sample
+    #  @param stop_idx index behind the last sample
+    #  @returns the samples as (samples, channels) array
+    def _read_samples(self, start_idx: int, stop_idx: int) -> np.ndarray:
+        if self._reader.nix_file is None:
+            raise IOError(f"Cannot load the signal \"{self.name}\", because the file {self._reader.filename} was closed")
+        return np.array([data_array[start_idx : stop_idx] for data_array in self._data_arrays]).transpose()
+
+    ## Returns the annotations that are passed to the loaded signal
+    def _signal_attrs(self) -> Dict[str, Any]:
+        return dict(name=self.name, description=self.description, file_origin=self.file_origin, array_annotations=dict(self.array_annotations), **self.annotations)
+
+## Proxy for an AnalogSignal stored in a NIX file, see _NixSignalProxy
+#  The time slices are computed in the same way as AnalogSignal.time_slice, so loading a time slice gives the same samples as slicing the loaded signal.
+class NixAnalogSignalProxy(_NixSignalProxy):
+    _necessary_attrs = AnalogSignalProxy._necessary_attrs
+    proxy_for = AnalogSignal
+
+    def __init__(self, reader: NixIO, data_arrays: List[Any], neo_attrs: Dict[str, Any]):
+        timedim = nix_shim.time_dimension(data_arrays[0])
+        self.sampling_period: Quantity = create_quantity(timedim.sampling_interval, timedim.unit)
+        self.sampling_rate: Quantity = 1 / self.sampling_period
+        # see NixIO._nix_to_neo_analogsignal, older files don't store t_start in the metadata
+        self.t_start: Quantity = neo_attrs.pop("t_start", create_quantity(timedim.offset, timedim.unit))
+        super().__init__(reader, data_arrays, neo_attrs)
+        self.t_stop: Quantity = self.t_start + self.shape[0] * self.sampling_period
+
+    ## Loads the signal, or a time slice of it, from the file
+    #  @param time_slice optional tuple of start and stop time, either of them can be None
+    #  @param strict_slicing if True, a time slice outside of the signal raises a ValueError, otherwise it is clipped to the signal
+    #  @returns the loaded AnalogSignal
+    def load(self, time_slice: Tuple[Quantity, Quantity] = None, strict_slicing: bool = True, **kwargs) -> AnalogSignal:
+        start_idx, stop_idx = 0, len(self)
+        if time_slice is not None:
+            t_start, t_stop = time_slice
+            if t_start is not None:
+                start_idx = int(np.rint(((t_start - self.t_start) * self.sampling_rate).simplified.magnitude))
+            if t_stop is not None:
+                stop_idx = start_idx + int(np.rint(((t_stop - (self.t_start if t_start is None else t_start)) * self.sampling_rate).simplified.magnitude))
+            if strict_slicing and (start_idx < 0 or stop_idx > len(self)):
+                raise ValueError("t_start, t_stop have to be within the analog signal duration")
+            start_idx, stop_idx = min(max(start_idx, 0), len(self)), min(max(stop_idx, 0), len(self))
+            stop_idx = max(stop_idx, start_idx)
+        return AnalogSignal(signal=self._read_samples(start_idx, stop_idx), units=self.units, sampling_period=self.sampling_period,
+                            t_start=self.t_start + start_idx * self.sampling_period, **self._signal_attrs())
+
+## Proxy for an IrregularlySampledSignal stored in a NIX file, see _NixSignalProxy
+#  The times of the samples are read from the file when a time slice is loaded for the first time, the signal values only for the time slice.
+class NixIrregularlySampledSignalProxy(_NixSignalProxy):
+    proxy_for = IrregularlySampledSignal
+
+    def __init__(self, reader: NixIO, data_arrays: List[Any], neo_attrs: Dict[str, Any]):
+        self._timedim = nix_shim.time_dimension(data_arrays[0])
+        self._times: Quantity = None
+        super().__init__(reader, data_arrays, neo_attrs)
+
+    ## The times of all samples, read from the file on first access
+    @property
+    def times(self) -> Quantity:
+        if self._times is None:
+            self._times = create_quantity(self._timedim.ticks, self._timedim.unit)
+        return self._times
+
+    @property
+    def t_start(self) -> Quantity:
+        return self.times[0]
+
+    @property
+    def t_stop(self) -> Quantity:
+        return self.times[-1]
+
+    ## Loads the signal, or a time slice of it, from the file
+    #  @param time_slice optional tuple of start and stop time (both inclusive), either of them can be None
+    #  @returns the loaded IrregularlySampledSignal
+    def load(self, time_slice: Tuple[Quantity, Quantity] = None, **kwargs) -> IrregularlySampledSignal:
+        start_idx, stop_idx = 0, len(self)
+        if time_slice is not None:
+            t_start, t_stop = time_slice
+            times = self.times.magnitude
+            if t_start is not None:
+                start_idx = int(np.searchsorted(times, float(Quantity(t_start).rescale(self.times.units).magnitude), side="left"))
+            if t_stop is not None:
+                stop_idx = max(int(np.searchsorted(times, float(Quantity(t_stop).rescale(self.times.units).magnitude), side="right")), start_idx)
+        return IrregularlySampledSignal(times=self.times[start_idx : stop_idx], signal=self._read_samples(start_idx, stop_idx), units=self.units,
+                                        **self._signal_attrs())
+
+## The readers of the lazily loaded files, see _LazyNixIO
+_lazy_readers: "weakref.WeakSet[_LazyNixIO]" = weakref.WeakSet()
+
+## Creates the proxy for a signal stored in a NIX file, see nix_shim.ProxyNixIO
+#  @param reader the NixIO object that reads the block
+#  @param nix_da_group the NIX DataArrays of the signal, one per channel
+#  @param neo_attrs the attributes and annotations of the signal
+#  @param signal_type the class of the signal, AnalogSignal or IrregularlySampledSignal
+#  @returns the proxy
+def _create_proxy(reader: NixIO, nix_da_group: List[nixio.DataArray], neo_attrs: Dict[str, Any], signal_type: type) -> _NixSignalProxy:
+    proxy_class = NixAnalogSignalProxy if signal_type is AnalogSignal else NixIrregularlySampledSignalProxy
+    return proxy_class(reader, nix_da_group, neo_attrs)
+
+## NixIO that creates proxy objects for the signals instead of reading their samples, while events, epochs and spiketrains are read as usual.
+#  The file needs to stay open as long as the proxies are used, so it is only closed by close_lazy_files or when this object is garbage collected.
+#  Files are never written while they are open, update_block writes new files and store_block closes the readers of the file it replaces.
+class _LazyNixIO(nix_shim.ProxyNixIO):
+    def __init__(self, filename: str):
+        super().__init__(filename, "ro", _create_proxy)
+        _lazy_readers.add(self)
+
+## Returns the readers of the lazily loaded files that are still open
+#  @param file_name path of the stored file, its updates are included (see update_block), or None for all files
+#  @returns the list of the readers
+def _open_lazy_readers(file_name: Path = None) -> List[_LazyNixIO]:
+    def matches(reader: _LazyNixIO) -> bool:
+        path = Path(reader.filename).resolve()
+        return path == Path(file_name).resolve() or path.parent == _updates_directory(Path(file_name)).resolve()
+    return [reader for reader in list(_lazy_readers) if reader.nix_file is not None and (file_name is None or matches(reader))]
+
+## Closes files that were loaded lazily (see load_block), the proxies of their signals cannot be loaded anymore afterwards
+#  @param file_name path of the stored file to close together with its updates, or None to close all lazily loaded files
+def close_lazy_files(file_name: Path = None) -> None:
+    for reader in _open_lazy_readers(file_name):
+        reader.close()
+
+## Suffix of the directory next to a stored file, which contains the files written by update_block
+UPDATES_SUFFIX = ".updates"
+## Name of the index in the updates directory, which lists the committed updates in the order they were written
+UPDATES_INDEX = "index.yml"
+
+## Returns the directory with the updates of a stored file, see update_block
+#  @param file_name path of the stored file
+def _updates_directory(file_name: Path) -> Path:
+    return file_name.with_name(file_name.name + UPDATES_SUFFIX)
+
+## Flushes a file or a directory entry to the disk. Directories can only be flushed on POSIX systems, elsewhere they are skipped.
+#  @param path path of the file or directory
+def _sync(path: Path) -> None:
+    if path.is_dir() and os.name != "posix":
+        return
+    fd = os.open(str(path), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+## Writes a file atomically. It is written to a temporary file in the same directory, which is flushed to the disk and then renamed to the file.
+#  So after a crash, the path contains either the complete old or the complete new file, and at most a temporary file is left over.
+#  @param file_name path of the file
+#  @param write function that writes the file to the temporary path it gets
+def _write_atomically(file_name: Path, write: Callable[[Path], None]) -> None:
+    fd, temp_name = tempfile.mkstemp(suffix=".tmp", prefix="." + file_name.name + ".", dir=str(file_name.parent))
+    os.close(fd)
+    try:
+        write(Path(temp_name))
+        _sync(Path(temp_name))
+        os.replace(temp_name, str(file_name))
+    except BaseException:
+        if os.path.exists(temp_name):
+            os.remove(temp_name)
+        raise
+    _sync(file_name.parent)
+
+## Returns the committed updates of a stored file, see update_block
+#  @param file_name path of the stored file
+#  @param file_id the id of the NIX file, the updates of files that were overwritten by store_block have a different one and are ignored
+#  @returns the file names of the updates in the updates directory, in the order they were written
+def _read_update_index(file_name: Path, file_id: str) -> List[str]:
+    index_file = _updates_directory(file_name) / UPDATES_INDEX
+    if not index_file.exists():
+        return []
+    with open(index_file, "r") as fl:
+        index = yaml.load(fl, Loader=yaml.FullLoader)
+    return list(index["updates"]) if index["file_id"] == file_id else []
+
+## Reads the block of a NIX file
+#  @param file_name path of the file
+#  @param lazy if True, the signals are read as proxies, see load_block
+#  @returns the block and the id of the NIX file
+def _read_block(file_name: Path, lazy: bool) -> Tuple[Block, str]:
+    if lazy:
+        reader = _LazyNixIO(str(file_name))
+        return reader.read(lazy=False)[0], reader.nix_file.id
+    with NixIO(str(file_name), "ro") as reader:
+        return reader.read(lazy=False)[0], reader.nix_file.id
+
+## Returns the name of the list of a segment that contains a data object, e.g. "analogsignals"
+#  @param data_object the data object or its proxy
+def _segment_list_name(data_object: DataObject) -> str:
+    return getattr(data_object, "proxy_for", type(data_object)).__name__.lower() + "s"
+
+## Merges the block of an update into the block of the stored file, see update_block
+#  Segments are matched by their NIX names, channels by their ids. Stored channels are replaced by the channels of the update at the same position,
+#  other channels and segments of the update are appended.
+#  @param block the stored block, it is modified
+#  @param update the block of the update
+def _merge_update(block: Block, update: Block) -> None:
+    segments = {segment.annotations.get("nix_name", None): segment for segment in block.segments}
+    for update_segment in update.segments:
+        segment = segments.get(update_segment.annotations["nix_name"], None)
+        if segment is None:
+            update_segment.block = block
+            block.segments.append(update_segment)
+            continue
+        for data_object in update_segment.data_children:
+            data_objects = getattr(segment, _segment_list_name(data_object))
+            channel_id = data_object.annotations.get("id", None)
+            stored_ids = [stored_object.annotations.get("id", None) for stored_object in data_objects]
+            if channel_id is not None and channel_id in stored_ids:
+                data_objects[stored_ids.index(channel_id)] = data_object
+            else:
+                data_objects.append(data_object)
+            data_object.segment = segment
+
 ## Loads a Neo block object from disk
+#  The updates written by update_block are merged into the block.
 #  @param file_name path object pointing to the file on the disk
+#  @param lazy if True, the analog and irregularly sampled signals are only read from the file when they are loaded.
+#         The segments then contain proxy objects for them, which can be loaded completely or per time slice with load and time_slice.
+#         Events, epochs and spiketrains are always read. The file stays open as long as any of the proxies is in use, or until it is closed with close_lazy_files.
 #  @returns the Neo Block object and a dictionary mapping channel names to the unified id format
-def load_block(file_name: Path) -> Tuple[Block, Dict[TypeID, Dict[str, str]]]:
+def load_block(file_name: Path, lazy: bool = False) -> Tuple[Block, Dict[TypeID, Dict[str, str]]]:
     assert _check_extension(file_name)
-    reader = NixIO(str(file_name), "ro")
-
-    blocks = reader.read(lazy=False)
-    block: Block = blocks[0]
+    block, file_id = _read_block(file_name, lazy)
+    for update_name in _read_update_index(file_name, file_id):
+        update, _ = _read_block(_updates_directory(file_name) / update_name, lazy)
+        _merge_update(block, update)
     if block.name is None or len(block.name) == 0:
         block.name = str(file_name.stem)
     if block.file_origin is None:
@@ -39,9 +300,10 @@ def load_block(file_name: Path) -> Tuple[Block, Dict[TypeID, Dict[str, str]]]:
 
 ## Loads recordings the neo Block storage from a file
 #  @param file_name path object pointing to the file on the disk
+#  @param lazy if True, the raw data channels of the recordings are proxy objects, which read the samples from the file on first access, see load_block
 #  @returns a list of MNGRecordings for each segment in the Neo block and a dictionary mapping channel names to the unified id format
-def load_recordings(file_name: Path) -> Tuple[List[MNGRecording], Dict[TypeID, Dict[str, str]]]:
-    block, id_map = load_block(file_name)
+def load_recordings(file_name: Path, lazy: bool = False) -> Tuple[List[MNGRecording], Dict[TypeID, Dict[str, str]]]:
+    block, id_map = load_block(file_name, lazy=lazy)
     result = []
     segment: Segment
     for segment in block.segments:
@@ -51,13 +313,114 @@ def load_recordings(file_name: Path) -> Tuple[List[MNGRecording], Dict[TypeID, D
         result.append(MNGRecording(segment, name, str(file_name)))
     return result, id_map
 
+## Compression filters for the samples of analog signals, see store_block
+COMPRESSIONS = {None, "gzip", "lzf"}
+## On-disk data types for the samples of analog signals, see store_block
+DTYPES = {None, "float64", "float32", "int16"}
+
+## Level of the gzip compression of nixio, see _SignalStorage.create_data_array
+NIXIO_GZIP_LEVEL = 6
+
+## Storage settings for the samples of analog signals, see store_block
+#  Contains the following members:
+#  * chunk_size: number of samples per HDF5 chunk, or None to let h5py choose it
+#  * compression: the compression filter, one of COMPRESSIONS
+#  * compression_level: the level of the gzip compression, or None for the default of nixio (NIXIO_GZIP_LEVEL)
+#  * dtype: the on-disk data type, one of DTYPES
+class _SignalStorage:
+    def __init__(self, chunk_size: int = None, compression: str = None, compression_level: int = None, dtype: str = None):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression \"{compression}\", use one of {COMPRESSIONS}")
+        if dtype not in DTYPES:
+            raise ValueError(f"Unknown dtype \"{dtype}\", use one of {DTYPES}")
+        self.chunk_size: int = chunk_size
+        self.compression: str = compression
+        self.compression_level: int = compression_level
+        self.dtype: str = dtype
+
+    ## Checks if all settings are the defaults of NixIO, so no custom storage is needed
+    def is_default(self) -> bool:
+        return self.chunk_size is None and self.compression is None and self.dtype in (None, "float64")
+
+    ## Converts the samples of a channel to the on-disk data type
+    #  @param data the samples of one channel
+    #  @returns the converted samples, and the polynomial coefficients which convert them back, or an empty tuple
+    def encode(self, data: np.ndarray) -> Tuple[np.ndarray, Tuple[float, ...]]:
+        if self.dtype == "int16":
+            # scale the value range of the channel to the range of int16, the rounding error is at most half of the gain
+            min_value, max_value = (float(np.min(data)), float(np.max(data))) if len(data) > 0 else (0.0, 0.0)
+            offset = (max_value + min_value) / 2
+            gain = (max_value - min_value) / (2 * np.iinfo(np.int16).max) or 1.0
+            return np.rint((data - offset) / gain).astype(np.int16), (offset, gain)
+        if self.dtype == "float32":
+            return data.astype(np.float32), ()
+        return data, ()
+
+    ## Creates a NIX DataArray, with the samples stored according to the settings
+    #  nixio stores the data types, and chunks and compresses the samples with gzip by itself. Only the other settings need nix_shim.replace_dataset.
+    #  @param nixblock the NIX Block to create the DataArray in
+    #  @param name the name of the DataArray
+    #  @param array_type the type of the DataArray
+    #  @param data the samples of one channel
+    #  @returns the new DataArray
+    def create_data_array(self, nixblock: nixio.Block, name: str, array_type: str, data: np.ndarray) -> nixio.DataArray:
+        stored_data, coefficients = self.encode(np.ascontiguousarray(data))
+        if self.chunk_size is None and self.compression is None:
+            data_array = nixblock.create_data_array(name, array_type, dtype=stored_data.dtype, data=stored_data, compression=Compression.No)
+        elif self.chunk_size is None and self.compression == "gzip" and self.compression_level in (None, NIXIO_GZIP_LEVEL):
+            data_array = nixblock.create_data_array(name, array_type, dtype=stored_data.dtype, data=stored_data, compression=Compression.DeflateNormal)
+        else:
+            # let nixio create an empty DataArray, and replace its dataset with one using our settings
+            data_array = nixblock.create_data_array(name, array_type, dtype=stored_data.dtype, shape=(0,), compression=Compression.No)
+            dataset_options = {"chunks": (min(self.chunk_size, max(len(stored_data), 1)),) if self.chunk_size is not None else True}
+            if self.compression is not None:
+                dataset_options.update(compression=self.compression, shuffle=True)
+                if self.compression == "gzip":
+                    dataset_options["compression_opts"] = self.compression_level if self.compression_level is not None else NIXIO_GZIP_LEVEL
+            nix_shim.replace_dataset(data_array, stored_data, **dataset_options)
+        if len(coefficients) > 0:
+            # nixio applies these when reading, so the readers get the scaled values
+            data_array.polynom_coefficients = coefficients
+        return data_array
+
 ## Stores a Neo Block object of our unified format on the disk
+#  The storage of the analog signals can be customized. Reading a time slice (see load_block with lazy = True) then only reads the chunks within the slice.
+#  Small chunks make reading short windows faster, while compression makes the file smaller at the cost of decompressing whole chunks when reading.
+#  Without any of these settings, the signals are stored with the defaults of NixIO.
 #  @params file_name Path object pointing to the file to store
 #  @param block the Neo Block object to be stored
-def store_block(file_name: Path, block: Block) -> None:
+#  @param chunk_size number of samples per HDF5 chunk of the analog signals, or None to let h5py choose it
+#  @param compression compression filter for the analog signals, either None, "gzip" or "lzf"
+#  @param compression_level level of the gzip compression (0 - 9), or None for the default of nixio (6)
+#  @param dtype on-disk data type of the analog signals, either None (as in memory), "float64", "float32" or "int16".
+#         For "int16", the value range of each channel is scaled to the int16 range. This is lossy, the error is at most 1/65534 of the value range.
+#         The values are scaled back when reading, so the loaded signals have the original units.
+#  The file is written atomically, so a crash leaves either the old or the new file. The updates of the old file (see update_block) are removed.
+#  If the file was loaded lazily, it is closed before it is overwritten, see close_lazy_files.
+def store_block(file_name: Path, block: Block, chunk_size: int = None, compression: str = None, compression_level: int = None, dtype: str = None) -> None:
     assert _check_extension(file_name)
-    writer = NixIO(str(file_name), "ow")
-    writer.write(block)
+    storage = _SignalStorage(chunk_size=chunk_size, compression=compression, compression_level=compression_level, dtype=dtype)
+    close_lazy_files(file_name)
+    _write_atomically(file_name, lambda path: _write_block(path, block, storage))
+    # the new file has a new id, so the old updates are ignored even if removing them fails
+    shutil.rmtree(_updates_directory(file_name), ignore_errors=True)
+
+## Writes a block into a new NIX file
+#  @param file_name path of the file
+#  @param block the Neo Block object to be stored
+#  @param storage the storage settings of the analog signals
+def _write_block(file_name: Path, block: Block, storage: _SignalStorage) -> None:
+    writer = NixIO(str(file_name), "ow") if storage.is_default() else nix_shim.StorageNixIO(str(file_name), "ow", storage.create_data_array)
+    with writer:
+        writer.write(block)
+
+## Removes a stored file together with its updates, see update_block
+#  @param file_name path of the stored file
+def remove_block(file_name: Path) -> None:
+    close_lazy_files(file_name)
+    if file_name.exists():
+        os.remove(file_name)
+    shutil.rmtree(_updates_directory(file_name), ignore_errors=True)
 
 ## Stores one or more MNGRecordings as one Neo block in a file
 #  @param file_name Path object pointing to the file to store
@@ -66,4 +429,194 @@ def store_recordings(file_name: Path, *recordings: List[MNGRecording]) -> None:
     block = Block(name = file_name.stem)
     for recording in recordings:
         block.segments.append(recording.segment)
-    store_block(file_name, block)
\ No newline at end of file
+    store_block(file_name, block)
+
+## Collects the channels of the segments in a NIX file
+#  @param stored_segments dict mapping the NIX names of the segments to the ids and the NIX names of their channels, the channels of the file are added
+#  @param file_name path of the NIX file
+#  @returns the id of the NIX file
+def _collect_stored_channels(stored_segments: Dict[str, Tuple[set, set]], file_name: Path) -> str:
+    with nixio.File.open(str(file_name), nixio.FileMode.ReadOnly) as nix_file:
+        for nixgroup in nix_file.blocks[0].groups:
+            if nixgroup.type != "neo.segment":
+                continue
+            stored_ids, stored_names = stored_segments.setdefault(nixgroup.name, (set(), set()))
+            stored_names.update(section.name for section in nixgroup.metadata.sections)
+            for nix_object in list(nixgroup.data_arrays) + list(nixgroup.multi_tags):
+                if nix_object.metadata is not None and "id" in nix_object.metadata.props:
+                    stored_ids.add(nix_object.metadata["id"])
+        return nix_file.id
+
+## Selects the channels of a segment that update_block needs to write
+#  @param update_segment the segment of the update, the channels are added to it
+#  @param segment the segment with the channels
+#  @param stored_ids the ids of the channels of the segment in the stored file and its updates
+#  @param stored_names the NIX names of the channels of the segment in the stored file and its updates
+#  @param channel_ids ids of the channels to replace, or None
+def _update_segment(update_segment: Segment, segment: Segment, stored_ids: set, stored_names: set, channel_ids: set) -> None:
+    for data_object in segment.data_children:
+        channel_id = data_object.annotations.get("id", None)
+        if channel_id in stored_ids and (channel_ids is None or channel_id not in channel_ids):
+            # the channel is in the file and was not asked to be replaced
+            continue
+        if channel_id not in stored_ids and data_object.annotations.get("nix_name", None) in stored_names:
+            # the channel without id was written to the file before
+            continue
+        # write it with a new name, the NIX names of channels are only unique within a file
+        data_object.annotations.pop("nix_name", None)
+        getattr(update_segment, _segment_list_name(data_object)).append(data_object)
+
+## Updates a Neo Block that was stored with store_block, without rewriting the channels that did not change.
+#  The segments are matched by the NIX names that NixIO annotates when storing and loading them, otherwise by their index.
+#  The channels are matched by their ids. Channels that are not in the file yet are appended, channels whose ids are given in channel_ids are replaced,
+#  all other channels are kept. Segments that are not in the file yet are appended completely.
+#  The stored file is never modified. The new and replaced channels are written into a new file in the updates directory next to it (the file name with UPDATES_SUFFIX),
+#  and load_block merges them into the stored block. Both the update and the index of the updates (UPDATES_INDEX) are written atomically, see _write_atomically,
+#  and an update only becomes visible once the index lists it. So a crash leaves the stored block as it was before update_block, or with the complete update.
+#  The data of replaced channels stays on the disk, storing the loaded block again with store_block writes everything into a single file and removes the updates.
+#  @param file_name Path object pointing to the stored file, if it does not exist, the block is stored with store_block
+#  @param block the Neo Block object with the new or changed channels
+#  @param channel_ids ids of the channels in the block that replace the channels with the same ids in the file
+#  @param storage_args the storage settings of the new analog signals, see store_block
+def update_block(file_name: Path, block: Block, channel_ids: Iterable[str] = None, **storage_args) -> None:
+    assert _check_extension(file_name)
+    if not Path(file_name).exists():
+        store_block(file_name, block, **storage_args)
+        return
+    storage = _SignalStorage(**storage_args)
+    channel_ids = set(channel_ids) if channel_ids is not None else None
+    stored_segments: Dict[str, Tuple[set, set]] = {}
+    file_id = _collect_stored_channels(stored_segments, file_name)
+    directory = _updates_directory(file_name)
+    update_names = _read_update_index(file_name, file_id)
+    for update_name in update_names:
+        _collect_stored_channels(stored_segments, directory / update_name)
+    segment_names = list(stored_segments)
+
+    update = Block(name = block.name)
+    for idx, segment in enumerate(block.segments):
+        nix_name = segment.annotations.get("nix_name", None)
+        stored_name = nix_name if nix_name is not None and nix_name in stored_segments \
+            else segment_names[idx] if nix_name is None and idx < len(segment_names) \
+            else None
+        if stored_name is None:
+            update.segments.append(segment)
+            continue
+        update_segment = Segment(nix_name = stored_name)
+        _update_segment(update_segment, segment, *stored_segments[stored_name], channel_ids)
+        if len(update_segment.data_children) > 0:
+            update.segments.append(update_segment)
+    if len(update.segments) == 0:
+        return
+
+    directory.mkdir(exist_ok=True)
+    _sync(directory.parent)
+    # the numbers of uncommitted updates are reused, so the files left over by a crash are overwritten
+    update_name = f"{len(update_names) + 1:06d}.nix"
+    _write_atomically(directory / update_name, lambda path: _write_block(path, update, storage))
+    def write_index(path: Path) -> None:
+        with open(path, "w") as fl:
+            yaml.dump({"file_id": file_id, "updates": update_names + [update_name]}, fl)
+    _write_atomically(directory / UPDATES_INDEX, write_index)
+
+## Updates the recordings stored with store_recordings, see update_block
+#  @param file_name Path object pointing to the stored file
+#  @recordings vararg list of MNGRecordings, in the same order as they were stored
+#  @param channel_ids ids of the channels in the recordings that replace the channels with the same ids in the file
+def update_recordings(file_name: Path, *recordings: List[MNGRecording], channel_ids: Iterable[str] = None) -> None:
+    block = Block(name = file_name.stem)
+    for recording in recordings:
+        block.segments.append(recording.segment)
+    update_block(file_name, block, channel_ids=channel_ids)
+
+## File name of the header of the exported raw data channels, see export_raw_channels
+RAW_CHANNELS_HEADER = "raw_channels.yml"
+
+## Saves the samples of an analog signal as .npy file. Proxies are copied in chunks, so they are never loaded completely
+#  @param file_name path of the .npy file
+#  @param signal the analog signal or its proxy
+#  @param chunk_size number of samples that are copied at once from a proxy
+def _save_samples(file_name: Path, signal: Union[AnalogSignal, NixAnalogSignalProxy], chunk_size: int = 1 << 20) -> None:
+    if not isinstance(signal, BaseProxy):
+        np.save(file_name, np.ascontiguousarray(signal.magnitude))
+        return
+    samples = np.lib.format.open_memmap(file_name, mode="w+", dtype=np.float64, shape=signal.shape)
+    for start_idx in range(0, len(signal), chunk_size):
+        stop_idx = min(start_idx + chunk_size, len(signal))
+        samples[start_idx : stop_idx] = signal._read_samples(start_idx, stop_idx)
+    samples.flush()
+    del samples
+
+## Exports the raw data channels of a recording as flat arrays, which can be memory mapped by load_memmap_recording.
+#  Each analog signal (or each block of a segmented signal) is stored as .npy file, and a YAML header lists the files together with the channel id,
+#  name, sampling rate, t_start and units of the signals. Irregularly sampled signals are not exported, as Neo always copies their times.
+#  The other channels are not exported either, store them with store_recordings.
+#  @param directory the directory to write the files to, will be created on demand
+#  @param recording the recording with the raw data channels
+def export_raw_channels(directory: Path, recording: MNGRecording) -> None:
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    entries = []
+    for channel_id, channel in recording.raw_data_channels_raw.items():
+        if isinstance(channel, SegmentedSignal):
+            signals = list(enumerate(channel.blocks))
+        elif isinstance(channel, (AnalogSignal, NixAnalogSignalProxy)):
+            signals = [(None, channel)]
+        else:
+            continue
+        for block_idx, signal in signals:
+            file_name = f"{channel_id}.npy" if block_idx is None else f"{channel_id}.{block_idx}.npy"
+            _save_samples(directory/file_name, signal)
+            entry = {
+                "id": channel_id,
+                "type_id": TypeID.RAW_DATA.value,
+                "name": signal.name,
+                "file": file_name,
+                "sampling_rate": float(signal.sampling_rate.rescale("Hz").magnitude),
+                "t_start": float(signal.t_start.rescale("s").magnitude),
+                "units": signal.units.dimensionality.string
+            }
+            if block_idx is not None:
+                entry["block_index"] = block_idx
+            entries.append(entry)
+    # the header is written last, so an interrupted export is never read
+    tmp_header_file = directory/f"tmp_{RAW_CHANNELS_HEADER}"
+    with open(tmp_header_file, "w") as fl:
+        yaml.dump({"channels": entries}, fl)
+    os.replace(tmp_header_file, directory/RAW_CHANNELS_HEADER)
+
+## Opens the raw data channels exported by export_raw_channels as memory mapped analog signals.
+#  The files are mapped read-only, so the pages are only read when they are accessed and are shared between processes.
+#  @param directory the directory containing the exported files
+#  @returns the analog signals, annotated with their ids (and the block index if they are blocks of a segmented signal)
+def load_raw_channels(directory: Path) -> List[AnalogSignal]:
+    directory = Path(directory)
+    with open(directory/RAW_CHANNELS_HEADER, "r") as fl:
+        header = yaml.load(fl, Loader=yaml.FullLoader)
+    result = []
+    for entry in header["channels"]:
+        samples = np.load(directory/entry["file"], mmap_mode="r")
+        signal = AnalogSignal(samples, units=entry["units"], sampling_rate=Quantity(entry["sampling_rate"], "Hz"), t_start=Quantity(entry["t_start"], "s"),
+                              name=entry["name"], copy=False)
+        signal.annotate(id=entry["id"], type_id=entry["type_id"])
+        if "block_index" in entry:
+            signal.annotate(block_index=entry["block_index"])
+        result.append(signal)
+    return result
+
+## Creates a recording whose raw data channels are memory mapped from the files exported by export_raw_channels
+#  @param directory the directory containing the exported files
+#  @param segment optionally, the segment with the other channels of the recording, e.g. loaded by load_block.
+#         Its analog signals with the same ids as the exported channels are replaced by the memory mapped ones
+#  @param name the name of the recording
+#  @param file_name the filename this recording was stored in
+#  @returns the recording
+def load_memmap_recording(directory: Path, segment: Segment = None, name: str = "UNNAMED", file_name: str = None) -> MNGRecording:
+    raw_channels = load_raw_channels(directory)
+    raw_ids = {channel.annotations["id"] for channel in raw_channels}
+    if segment is None:
+        segment = Segment(name = name)
+    segment.analogsignals = [signal for signal in segment.analogsignals if signal.annotations.get("id") not in raw_ids] + raw_channels
+    for signal in raw_channels:
+        signal.segment = segment
+    return MNGRecording(segment, name, file_name)
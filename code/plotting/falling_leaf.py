@@ -1,14 +1,13 @@
 # import matplotlib.pyplot as plt
 # from fibre_tracking.ap_track import APTrack
 from typing import Iterable, Union
-from neo.core.spiketrain import SpikeTrain
 import numpy as np
 import plotly.graph_objects as go
 from math import floor, ceil
 
 from quantities.quantity import Quantity
 from plotting import get_fibre_color
-from neo_importers.neo_wrapper import ChannelWrapper, ElectricalStimulusWrapper, ActionPotentialWrapper, MNGRecording
+from neo_importers.neo_wrapper import ChannelWrapper, ChannelView, ElectricalStimulusWrapper, ActionPotentialWrapper, MNGRecording, SegmentedSignal
 from fibre_tracking.ap_track import APTrack
 from features import FeatureDatabase
 from neo.core import AnalogSignal
@@ -36,14 +35,14 @@ class FallingLeafPlot:
             post_stimulus_timeframe: float = float("infinity") * second, plot_raw_signal: bool = False):
         
         # first, select the intervals according to start time and number of intervals
-        el_stimuli = list(self.recording.electrical_stimulus_channels[el_stimuli_channel]) 
-        el_stimuli = sorted(el_stimuli, key = lambda st: st.time)
-        disp_el_stimuli = [st for st in el_stimuli if st.time > t_start]
-        disp_el_stimuli = np.array(disp_el_stimuli[0 : num_intervals])
+        # the stimuli are sorted by time, so the first displayed one is found with a binary search
+        el_stimuli: ChannelWrapper = self.recording.electrical_stimulus_channels[el_stimuli_channel]
+        stimulus_times: Quantity = el_stimuli.times()
+        first_stimulus_idx = int(np.searchsorted(stimulus_times.magnitude, float(Quantity(t_start, stimulus_times.units).magnitude), side = "right"))
+        disp_el_stimuli: ChannelView = el_stimuli[first_stimulus_idx : first_stimulus_idx + num_intervals]
 
         # calculate the max. time that we need to display
-        last_stimulus_idx = np.argmax([st.time for st in disp_el_stimuli])
-        t_max = disp_el_stimuli[last_stimulus_idx].time + disp_el_stimuli[last_stimulus_idx].interval
+        t_max = disp_el_stimuli[-1].time + disp_el_stimuli[-1].interval
 
         # set up the figure object
         fig = go.Figure(layout = {
@@ -80,20 +79,29 @@ class FallingLeafPlot:
                 # start_idx = max(0, floor(t_start * raw_signal.sampling_rate))
                 # stop_idx = min(len(raw_signal), ceil(t_max * raw_signal.sampling_rate))
                 # raw_signal = raw_signal[start_idx : stop_idx]
-                # TODO check if flattening the signal is always a good idea here
-                raw_signal = raw_signal.flatten()
+                if isinstance(raw_signal, SegmentedSignal):
+                    # get the max signal value that must be printed, the sweeps are cut from the blocks below
+                    max_signal_value = max(np.max(raw_signal.block(block_idx)) for block_idx in range(len(raw_signal.blocks)))
+                else:
+                    # get the max signal value that must be printed
+                    max_signal_value = np.max(raw_signal)
 
-                # get the max signal value that must be printed
-                max_signal_value = np.max(raw_signal)
+                # cut the sweeps of the displayed stimuli at once, long enough for the longest displayed sweep
+                sweep_disp_durations = [min(stim.interval, post_stimulus_timeframe) for stim in disp_el_stimuli]
+                finite_durations = [duration for duration in sweep_disp_durations if np.isfinite(duration)]
+                sweep_window = max(finite_durations) if len(finite_durations) > 0 else raw_signal.t_stop - disp_el_stimuli[0].time
+                sweep_matrix = self.recording.sweep_matrix(el_stimuli_channel, analog_signal_channel, sweep_window, \
+                    sweeps = slice(first_stimulus_idx, first_stimulus_idx + num_intervals))
             
                 stim: ElectricalStimulusWrapper
                 # print the raw signal for each of the intervals
                 for index, stim in enumerate(disp_el_stimuli):
-                    # cut the raw signal snippets according to the desired timeframe after the stimulus
-                    sweep_disp_duration = min(stim.interval, post_stimulus_timeframe)
-                    sweep_first_idx = max(0, floor(raw_signal.sampling_rate * stim.time))
-                    sweep_last_idx = min(len(raw_signal), ceil(raw_signal.sampling_rate * (stim.time + sweep_disp_duration)))
-                    sweep_raw_signal = raw_signal[sweep_first_idx : sweep_last_idx]
+                    # restrict the sweep to the desired timeframe after the stimulus
+                    sweep_disp_duration = sweep_disp_durations[index]
+                    num_samples = sweep_matrix.lengths[index]
+                    if np.isfinite(sweep_disp_duration):
+                        num_samples = min(num_samples, ceil(float((sweep_disp_duration * raw_signal.sampling_rate).simplified)))
+                    sweep_raw_signal = sweep_matrix.sweep(index)[: num_samples]
                     
                     # check how much space we have for scaling the raw data
                     if index > 0:
@@ -110,9 +118,9 @@ class FallingLeafPlot:
                     
                     # scale the signal accordingly
                     signal_scaling_factor: Quantity = space_margin / max_signal_value
-                    time_space = np.linspace(0 * second, sweep_disp_duration, len(sweep_raw_signal))
+                    time_space = sweep_matrix.times[: num_samples].rescale(second)
 
-                    # plot the signal using linspace for the time
+                    # plot the signal against the times of the sweep
                     fig.add_trace(
                         go.Scattergl(
                             mode = "lines",
@@ -144,31 +152,27 @@ class FallingLeafPlot:
             # Finally, print markers for the action potentials
             # we do this individually for each channel
             channel_wrapper: ChannelWrapper
-            ap_channel: SpikeTrain
             for channel_name, channel_wrapper in self.recording.action_potential_channels.items():
                 # skip if this channel should not be displayed
                 if channel_name not in action_potential_channels:
                     continue
-                # otherwise, get info about the APs
-                ap_channel = channel_wrapper.channel
-                ap_indices = np.where((ap_channel.times >= t_start) & (ap_channel.times <= t_max))
-                ap_times = ap_channel.times[ap_indices]
-                # calculate durations of APs from their waveforms
-                ap_durations: Quantity = np.array([ap.size for ap in ap_channel.waveforms[ap_indices]]) / ap_channel.sampling_rate
-                ap_durations = ap_durations.magnitude * second
-                
-                assert len(ap_times) == len(ap_durations)
+                # otherwise, get the APs of each sweep and their latencies from the sweep index
+                sweep_index = self.recording.sweep_index(el_stimuli_channel, channel_name)
+                # durations of APs from their waveforms
+                ap_durations: Quantity = channel_wrapper.durations().rescale(second)
 
                 aps_x = []
                 aps_y = []
                 stim: ElectricalStimulusWrapper
                 for stim in disp_el_stimuli:
+                    ap_indices = np.arange(sweep_index.ap_starts[stim.index], sweep_index.ap_stops[stim.index])
+                    latencies = sweep_index.latencies[ap_indices].rescale(second)
                     # check if the action potentials are within the display range,
                     # i.e. lie before the end of the interval
-                    aps_in_display_range = (ap_times >= stim.time) & (ap_times <= stim.time + min(stim.interval, post_stimulus_timeframe))
+                    aps_in_display_range = latencies <= min(stim.interval, post_stimulus_timeframe)
                     # calculate their x- and y-coordinates
-                    start_times = ap_times[aps_in_display_range] - stim.time
-                    stop_times = ap_times[aps_in_display_range] + ap_durations[aps_in_display_range] - stim.time
+                    start_times = latencies[aps_in_display_range]
+                    stop_times = start_times + ap_durations[ap_indices][aps_in_display_range]
                     # add new points to the list of x- and y-coordinates
                     for t_onset, t_offset in zip(start_times, stop_times):
                         aps_x += [t_onset, t_offset]
@@ -1,14 +1,20 @@
 import unittest
 import os
 import csv
+import shutil
+import numpy as np
+from quantities import Quantity
 from pathlib import Path
 from tests.helpers import download_files
 
 from neo.core.block import Block
 from neo.core.segment import Segment
 
-from neo_importers.neo_dapsys_importer import _fix_separator_decimal_matching, import_dapsys_csv_files, _do_files_need_fixing, check_and_fix_dapsys_files
-from neo_importers.neo_wrapper import MNGRecording
+from neo_importers.neo_dapsys_importer import _fix_separator_decimal_matching, import_dapsys_csv_files, _do_files_need_fixing, check_and_fix_dapsys_files, \
+    _get_files_with_extension
+from neo_importers import import_cache
+from neo_importers.neo_utils import convert_irregularly_sampled_signal_to_analog_signal, convert_irregularly_sampled_signal_to_analog_signal_blocks
+from neo_importers.neo_wrapper import MNGRecording, SegmentedSignal, TypeID
 
 ORIG_DIR_NAME = Path("..")/"resources"/"test"/"dapsys"/"dapsys_crossing_tracks_0_1400"
 FIXED_DIR_NAME = Path("..")/"resources"/"test"/"dapsys"/"dapsys_crossing_tracks_0_1400_fixed"
@@ -92,4 +98,74 @@ class DapsysImporterTest(unittest.TestCase):
         recording: MNGRecording = MNGRecording(seg)
         self.assertTrue(recording.action_potential_channels)
         self.assertTrue(recording.electrical_stimulus_channels)
-        self.assertTrue(recording.raw_data_channels)
\ No newline at end of file
+        self.assertTrue(recording.raw_data_channels)
+
+    # Check if importing the original files with on-the-fly decimal comma repair gives the same result as importing the fixed copies
+    def test_streaming_fix(self):
+        block, id_map, ap_tracks = import_dapsys_csv_files(directory = FIXED_DIR_NAME)
+        streamed_block, streamed_id_map, streamed_ap_tracks = import_dapsys_csv_files(directory = ORIG_DIR_NAME, fix_decimal_comma = "auto")
+        seg: Segment = block.segments[0]
+        streamed_seg: Segment = streamed_block.segments[0]
+        self.assertEqual(id_map, streamed_id_map)
+        self.assertEqual(len(ap_tracks), len(streamed_ap_tracks))
+        self.assertEqual(len(seg.events[0]), len(streamed_seg.events[0]))
+        self.assertTrue(np.array_equal(seg.irregularlysampledsignals[0].magnitude, streamed_seg.irregularlysampledsignals[0].magnitude))
+        self.assertTrue(np.array_equal(seg.spiketrains[0].times.magnitude, streamed_seg.spiketrains[0].times.magnitude))
+
+    # Check if a cached import gives the same result and if the cache is rebuilt when the files change
+    def test_import_cache(self):
+        cache_dir = FIXED_DIR_NAME/"tmp_cache"
+        if os.path.exists(cache_dir):
+            shutil.rmtree(cache_dir)
+        block, id_map, ap_tracks = import_dapsys_csv_files(directory = FIXED_DIR_NAME, cache = cache_dir)
+        self.assertTrue(import_cache.is_cache_valid(cache_dir, import_cache.fingerprint(_get_files_with_extension(FIXED_DIR_NAME, ".csv"),
+            sampling_rate = "imply", ap_correlation_window_size = Quantity(0.003, "s"), segmented = False, t_start = None, t_stop = None)))
+        cached_block, cached_id_map, cached_ap_tracks = import_dapsys_csv_files(directory = FIXED_DIR_NAME, cache = cache_dir)
+        self.assertEqual(id_map, cached_id_map)
+        self.assertEqual([track.sweep_idcs for track in ap_tracks], [track.sweep_idcs for track in cached_ap_tracks])
+        self.assertTrue(np.array_equal(block.segments[0].spiketrains[0].times.magnitude, cached_block.segments[0].spiketrains[0].times.magnitude))
+        # a different argument must not use the cached result
+        key = import_cache.fingerprint(_get_files_with_extension(FIXED_DIR_NAME, ".csv"), sampling_rate = Quantity(20000, "Hz"), 
+            ap_correlation_window_size = Quantity(0.003, "s"), segmented = False, t_start = None, t_stop = None)
+        self.assertIsNone(import_cache.load_dapsys_import(cache_dir, key))
+        shutil.rmtree(cache_dir)
+
+    # Check if splitting the signal into contiguous blocks gives the same samples as the dense conversion
+    def test_analog_signal_blocks(self):
+        block, id_map, ap_tracks = import_dapsys_csv_files(directory = FIXED_DIR_NAME)
+        irregular_sig = block.segments[0].irregularlysampledsignals[0]
+        analog_sig = convert_irregularly_sampled_signal_to_analog_signal(irregular_sig, sampling_rate = Quantity(SAMPLING_RATE, "Hz"))
+        signal_blocks = convert_irregularly_sampled_signal_to_analog_signal_blocks(irregular_sig, sampling_rate = Quantity(SAMPLING_RATE, "Hz"))
+        self.assertGreater(len(signal_blocks), 0)
+        self.assertLessEqual(sum(len(signal_block) for signal_block in signal_blocks), len(analog_sig))
+        for signal_block in signal_blocks:
+            start_idx = int(round(float(((signal_block.t_start - analog_sig.t_start) * analog_sig.sampling_rate).simplified)))
+            self.assertTrue(np.allclose(signal_block.magnitude, analog_sig.magnitude[start_idx : start_idx + len(signal_block)]))
+
+    # Check if a segmented import only keeps the recorded blocks and if the recording can cut windows from them
+    def test_segmented_signal(self):
+        block, id_map, ap_tracks = import_dapsys_csv_files(directory = FIXED_DIR_NAME, segmented = True)
+        recording: MNGRecording = MNGRecording(block.segments[0])
+        raw_signal = recording.raw_data_channels[id_map[TypeID.RAW_DATA]["Analog Signal"]]
+        self.assertIsInstance(raw_signal, SegmentedSignal)
+        self.assertLessEqual(len(raw_signal), len(block.segments[0].irregularlysampledsignals[0]))
+        first_block = raw_signal.blocks[0]
+        window = raw_signal.window(first_block.t_start, first_block.t_stop)
+        self.assertEqual(len(window), len(first_block))
+        self.assertTrue(np.shares_memory(window.magnitude, first_block.magnitude))
+
+    # Check if a windowed import contains the same data as the full import within the window, with the same channel ids
+    def test_time_window(self):
+        block, id_map, ap_tracks = import_dapsys_csv_files(directory = FIXED_DIR_NAME)
+        t_start, t_stop = Quantity(100, "s"), Quantity(200, "s")
+        window_block, window_id_map, window_ap_tracks = import_dapsys_csv_files(directory = FIXED_DIR_NAME, t_start = t_start, t_stop = t_stop)
+        self.assertEqual(id_map, window_id_map)
+        self.assertEqual(len(ap_tracks), len(window_ap_tracks))
+        irregular_sig = block.segments[0].irregularlysampledsignals[0]
+        window_sig = window_block.segments[0].irregularlysampledsignals[0]
+        in_window = (irregular_sig.times >= t_start) & (irregular_sig.times <= t_stop)
+        self.assertTrue(np.array_equal(irregular_sig.times.magnitude[in_window], window_sig.times.magnitude))
+        self.assertTrue(np.array_equal(irregular_sig.magnitude[in_window], window_sig.magnitude))
+        main_pulses = block.segments[0].events[0]
+        window_pulses = window_block.segments[0].events[0]
+        self.assertTrue(np.array_equal(main_pulses.times.magnitude[(main_pulses.times >= t_start) & (main_pulses.times <= t_stop)], window_pulses.times.magnitude))
@@ -2,13 +2,19 @@ from datetime import datetime
 from tests.helpers import download_files
 import unittest
 import os
+import shutil
+import itertools
 from pathlib import Path
 
-from neo.core import Segment
+import numpy as np
+from quantities import s
+from neo.core import Segment, AnalogSignal, SpikeTrain
+from neo.io.proxyobjects import BaseProxy
 
 import neo_importers.neo_spike_importer as spike_importer
-from neo_importers.recording_io import load_block, store_block, load_recordings, store_recordings
-from neo_importers.neo_wrapper import MNGRecording
+from neo_importers.recording_io import load_block, store_block, update_block, load_recordings, store_recordings, update_recordings, close_lazy_files, remove_block, \
+    export_raw_channels, load_memmap_recording, COMPRESSIONS, DTYPES, UPDATES_SUFFIX
+from neo_importers.neo_wrapper import MNGRecording, TypeID
 
 # PARAMETERS FOR THIS TEST
 TEST_DIR_NAME = Path("..")/"resources"/"test"/"hdf5"
@@ -61,4 +67,118 @@ class HDF5IOTest(unittest.TestCase):
         self.assertEquals(self.id_map, id_map2)
         self.assertEquals(len(self.recording.raw_data_channels), len(recording2.raw_data_channels))
         self.assertEquals(len(self.recording.electrical_stimulus_channels), len(recording2.electrical_stimulus_channels))
-        self.assertEquals(len(self.recording.action_potential_channels), len(recording2.action_potential_channels))
\ No newline at end of file
+        self.assertEquals(len(self.recording.action_potential_channels), len(recording2.action_potential_channels))
+
+    def test_lazy_load(self):
+        fname = Path(os.path.join(TEST_DIR_NAME, "tmp_" + datetime.now().strftime("%Y_%m_%d_%H_%M_%S") + ".nix"))
+        store_block(fname, self.block)
+        block2, id_map2 = load_block(fname, lazy = True)
+        self.assertEquals(self.id_map, id_map2)
+
+        seg: Segment = self.block.segments[0]
+        seg2: Segment = block2.segments[0]
+        self.assertEquals(len(seg.data_children), len(seg2.data_children))
+        self.assertIsInstance(seg2.analogsignals[0], BaseProxy)
+        self.assertTrue(np.array_equal(seg.analogsignals[0].magnitude, seg2.analogsignals[0].load().magnitude))
+        t_start = seg.analogsignals[0].t_start
+        window = seg2.analogsignals[0].time_slice(t_start + 1 * s, t_start + 2 * s)
+        self.assertTrue(np.array_equal(seg.analogsignals[0].time_slice(t_start + 1 * s, t_start + 2 * s).magnitude, window.magnitude))
+
+        (recording2,), _ = load_recordings(fname, lazy = True)
+        channel_id = next(iter(recording2.raw_data_channels_raw))
+        self.assertIsInstance(recording2.raw_data_channels_raw[channel_id], BaseProxy)
+        self.assertIsInstance(recording2.raw_data_channels[channel_id], AnalogSignal)
+        del block2, seg2, recording2
+        if os.path.exists(fname):
+            os.remove(fname)
+
+    def test_storage_settings_round_trip(self):
+        fname = Path(os.path.join(TEST_DIR_NAME, "tmp_" + datetime.now().strftime("%Y_%m_%d_%H_%M_%S") + ".nix"))
+        signal: AnalogSignal = self.block.segments[0].analogsignals[0]
+        t_start = signal.t_start
+        value_range = float(np.max(signal.magnitude) - np.min(signal.magnitude))
+        tolerances = {None: 0, "float64": 0, "float32": 1e-6 * float(np.max(np.abs(signal.magnitude))), "int16": value_range / 65534}
+        for chunk_size, compression, compression_level, dtype in itertools.product([None, 1024], COMPRESSIONS, [None, 1], DTYPES):
+            if compression != "gzip" and compression_level is not None:
+                continue
+            settings = {"chunk_size": chunk_size, "compression": compression, "compression_level": compression_level, "dtype": dtype}
+            with self.subTest(**settings):
+                store_block(fname, self.block, **settings)
+                block2, id_map2 = load_block(fname)
+                self.assertEquals(self.id_map, id_map2)
+                self.assertLessEqual(np.max(np.abs(signal.magnitude - block2.segments[0].analogsignals[0].magnitude)), tolerances[dtype])
+                block3, _ = load_block(fname, lazy = True)
+                window = block3.segments[0].analogsignals[0].time_slice(t_start + 1 * s, t_start + 2 * s)
+                self.assertLessEqual(np.max(np.abs(signal.time_slice(t_start + 1 * s, t_start + 2 * s).magnitude - window.magnitude)), tolerances[dtype])
+                # a new channel that is written into the stored segment
+                new_signal = signal.copy()
+                new_signal.annotations = dict(signal.annotations, id = "rd.new")
+                new_signal.annotations.pop("nix_name", None)
+                block2.segments[0].analogsignals.append(new_signal)
+                update_block(fname, block2, **settings)
+                block4, _ = load_block(fname)
+                signal4 = [signal4 for signal4 in block4.segments[0].analogsignals if signal4.annotations["id"] == "rd.new"][0]
+                self.assertEquals(signal.units, signal4.units)
+                self.assertLessEqual(np.max(np.abs(new_signal.magnitude - signal4.magnitude)), tolerances[dtype])
+                remove_block(fname)
+
+    def test_raw_channels_memmap(self):
+        directory = Path(os.path.join(TEST_DIR_NAME, "tmp_" + datetime.now().strftime("%Y_%m_%d_%H_%M_%S")))
+        export_raw_channels(directory, self.recording)
+        recording2 = load_memmap_recording(directory, name = "Test Recording")
+        self.assertEquals(set(self.recording.raw_data_channels_raw), set(recording2.raw_data_channels_raw))
+        for channel_id, channel in self.recording.raw_data_channels_raw.items():
+            channel2: AnalogSignal = recording2.raw_data_channels[channel_id]
+            self.assertFalse(channel2.flags.writeable)
+            self.assertTrue(np.array_equal(channel.magnitude, channel2.magnitude))
+            self.assertEquals(channel.t_start, channel2.t_start)
+            self.assertEquals(channel.sampling_rate, channel2.sampling_rate)
+        del recording2, channel2
+        shutil.rmtree(directory)
+
+    def test_update_recordings(self):
+        fname = Path(os.path.join(TEST_DIR_NAME, "tmp_" + datetime.now().strftime("%Y_%m_%d_%H_%M_%S") + ".nix"))
+        store_recordings(fname, self.recording)
+        with open(fname, "rb") as fl:
+            stored_bytes = fl.read()
+        (recording2,), _ = load_recordings(fname)
+        # append a new channel and replace an existing one
+        ap_channel: SpikeTrain = recording2.segment.spiketrains[0]
+        replaced_channel = ap_channel[:len(ap_channel) // 2]
+        replaced_channel.annotations = dict(ap_channel.annotations)
+        recording2.segment.spiketrains[0] = replaced_channel
+        recording2.segment.spiketrains.append(SpikeTrain(ap_channel.times[:3], t_stop = ap_channel.t_stop, name = "track", id = "track0", type_id = "ap"))
+        update_recordings(fname, recording2, channel_ids = [replaced_channel.annotations["id"]])
+        (recording3,), id_map3 = load_recordings(fname)
+        # the stored file is not modified, and an update that was not committed to the index, like after a crash, is ignored
+        with open(fname, "rb") as fl:
+            self.assertEquals(stored_bytes, fl.read())
+        shutil.copy(fname, fname.with_name(fname.name + UPDATES_SUFFIX) / "000002.nix")
+        (recording4,), _ = load_recordings(fname)
+        remove_block(fname)
+
+        self.assertEquals(len(recording2.segment.data_children), len(recording3.segment.data_children))
+        self.assertEquals(len(recording3.segment.data_children), len(recording4.segment.data_children))
+        self.assertEquals(id_map3[TypeID.ACTION_POTENTIAL]["track"], "track0")
+        self.assertEquals(len(recording3.action_potential_channels[replaced_channel.annotations["id"]]), len(replaced_channel))
+        self.assertEquals(len(self.recording.raw_data_channels), len(recording3.raw_data_channels))
+
+    def test_update_lazy_recordings(self):
+        fname = Path(os.path.join(TEST_DIR_NAME, "tmp_" + datetime.now().strftime("%Y_%m_%d_%H_%M_%S") + ".nix"))
+        store_recordings(fname, self.recording)
+        (recording2,), _ = load_recordings(fname, lazy = True)
+        # the lazily loaded file stays open while updating it, and the proxies can be loaded afterwards
+        ap_channel: SpikeTrain = recording2.segment.spiketrains[0]
+        recording2.segment.spiketrains.append(SpikeTrain(ap_channel.times[:3], t_stop = ap_channel.t_stop, name = "track", id = "track0", type_id = "ap"))
+        update_recordings(fname, recording2)
+        signal: AnalogSignal = self.recording.segment.analogsignals[0]
+        self.assertTrue(np.array_equal(signal.magnitude, recording2.segment.analogsignals[0].load().magnitude))
+        # the proxies cannot be loaded anymore after closing the file
+        close_lazy_files(fname)
+        with self.assertRaises(IOError):
+            recording2.segment.analogsignals[0].load()
+        (recording3,), id_map3 = load_recordings(fname)
+        remove_block(fname)
+
+        self.assertEquals(id_map3[TypeID.ACTION_POTENTIAL]["track"], "track0")
+        self.assertEquals(len(recording2.segment.data_children), len(recording3.segment.data_children))
@@ -0,0 +1,107 @@
+import unittest
+from math import floor, sqrt
+from statistics import median
+
+import numpy as np
+from neo.core import AnalogSignal, Event, Segment
+from quantities import Hz, mV, ms, s, uV
+from scipy.signal import correlate
+
+from metrics import kernels
+from metrics.normalized_cross_correlation import normalized_cross_correlation
+from metrics.root_mean_square_power import median_RMS, median_RMS_grid
+from neo_importers.neo_wrapper import MNGRecording
+
+# PARAMETERS FOR THIS TEST
+SAMPLING_RATE = 1000
+DURATION = 60
+NUM_STIMULI = 20
+RADIUS = 3
+
+## Creates a recording with a random raw signal and stimuli at random times
+#  @param t_start time of the first sample of the raw signal in seconds
+#  @returns the recording
+def _synthetic_recording(t_start: float) -> MNGRecording:
+    rng = np.random.default_rng(1)
+    segment = Segment()
+    segment.analogsignals.append(AnalogSignal(rng.normal(scale = 10.0, size = (DURATION * SAMPLING_RATE, 1)), units = uV, sampling_rate = SAMPLING_RATE * Hz, \
+        t_start = t_start * s, id = "rd.0", type_id = "rd"))
+    stimulus_times = t_start + np.sort(rng.uniform(1, DURATION - 1, size = NUM_STIMULI))
+    segment.events.append(Event(times = stimulus_times * s, labels = np.array(["stimulus"] * NUM_STIMULI), id = "es.0", type_id = "es"))
+    return MNGRecording(segment, name = "synthetic")
+
+## The median RMS computed with a loop over the sweeps, as median_RMS computed it before the kernels, with the window indices offset by t_start
+def _loop_median_rms(raw_signal: AnalogSignal, el_stimuli, center_stim_idx: int, latency_slope: float, latency: float, radius: int, window_size: float) -> float:
+    t_start = float(raw_signal.t_start.rescale(s))
+    sampling_rate = float(raw_signal.sampling_rate.rescale(Hz))
+    samples = raw_signal.magnitude[:, 0]
+    rms = []
+    for r, el_stimulus in zip(range(-radius, radius + 1), el_stimuli[center_stim_idx - radius : center_stim_idx + radius]):
+        t = float(el_stimulus.time.rescale(s)) + latency + r * latency_slope
+        t_min_idx = min(max(floor((t - (window_size / 2) - t_start) * sampling_rate), 0), len(samples))
+        t_max_idx = max(min(floor((t + (window_size / 2) - t_start) * sampling_rate), len(samples)), 0)
+        window = samples[t_min_idx : t_max_idx]
+        rms.append(sqrt(np.sum(np.square(window)) / len(window)) if len(window) > 0 else 0.0)
+    return median(rms)
+
+class MetricsTest(unittest.TestCase):
+
+    # Check if the median RMS of the kernels gives the same values as the loop over the sweeps, also for signals that do not start at 0
+    def test_median_rms(self):
+        rng = np.random.default_rng(2)
+        for t_start in [0.0, 3.7]:
+            recording = _synthetic_recording(t_start)
+            raw_signal = recording.raw_data_channels["rd.0"]
+            el_stimuli = recording.electrical_stimulus_channels["es.0"]
+            for _ in range(20):
+                center_idx = int(rng.integers(RADIUS, NUM_STIMULI - RADIUS))
+                latency, slope = float(rng.uniform(0, 0.5)), float(rng.uniform(-0.01, 0.01))
+                with self.subTest(t_start = t_start, center_idx = center_idx, latency = latency, slope = slope):
+                    expected = _loop_median_rms(raw_signal, list(el_stimuli), center_idx, slope, latency, RADIUS, 0.002)
+                    result = median_RMS(raw_signal, el_stimuli, center_idx, slope * s, latency * s, RADIUS, 2 * ms)
+                    self.assertEqual(result.dimensionality, (uV**2).dimensionality)
+                    self.assertAlmostEqual(float(result.magnitude), expected, places = 9)
+
+    # Check if the median RMS grid gives the same values as median_RMS for each combination of latency and slope
+    def test_median_rms_grid(self):
+        recording = _synthetic_recording(2.5)
+        raw_signal = recording.raw_data_channels["rd.0"]
+        el_stimuli = recording.electrical_stimulus_channels["es.0"]
+        center_idx = NUM_STIMULI // 2
+        latencies = np.linspace(0.01, 0.3, 7)
+        slopes = np.linspace(-0.005, 0.005, 5)
+        grid = median_RMS_grid(raw_signal, el_stimuli, center_idx, slopes[np.newaxis, :] * s, latencies[:, np.newaxis] * s, RADIUS, 1 * ms)
+        self.assertEqual(grid.shape, (len(latencies), len(slopes)))
+        for latency_idx, latency in enumerate(latencies):
+            for slope_idx, slope in enumerate(slopes):
+                expected = _loop_median_rms(raw_signal, list(el_stimuli), center_idx, slope, latency, RADIUS, 0.001)
+                self.assertAlmostEqual(float(grid[latency_idx, slope_idx].magnitude), expected, places = 9)
+        with self.assertRaises(ValueError):
+            median_RMS_grid(raw_signal, el_stimuli, RADIUS - 1, slopes * s, 0.1 * s, RADIUS)
+
+    # Check if the counts of the binary searches are the same as the counts of boolean masks, also for times on the borders of the intervals
+    def test_interval_counts(self):
+        rng = np.random.default_rng(3)
+        # integer times, so many of them are on the borders
+        times = np.sort(rng.integers(0, 100, size = 500)).astype(float)
+        starts = rng.integers(-10, 110, size = 200).astype(float)
+        stops = starts + rng.integers(-5, 30, size = 200)
+        counts = kernels.interval_counts(times, starts, stops)
+        expected = [np.count_nonzero((times > start) & (times < stop)) for start, stop in zip(starts, stops)]
+        self.assertTrue(np.array_equal(counts, expected))
+        self.assertTrue(np.array_equal(kernels.interval_counts(times, starts.reshape(20, 10), stops.reshape(20, 10)), np.reshape(expected, (20, 10))))
+
+    # Check if the normalized cross correlation of 1-D quantities takes the maximum over all lags, and rescales the second signal to the units of the first one
+    def test_normalized_cross_correlation(self):
+        rng = np.random.default_rng(4)
+        x = rng.normal(size = 200)
+        y = rng.normal(size = 30)
+        corr = correlate(x, y, "valid")
+        expected = float(np.max(corr)) / sqrt(np.sum(np.square(x)) * np.sum(np.square(y)))
+        self.assertAlmostEqual(normalized_cross_correlation(x, y), expected, places = 12)
+        self.assertAlmostEqual(normalized_cross_correlation(x * uV, y * uV), expected, places = 12)
+        self.assertAlmostEqual(normalized_cross_correlation(x * uV, (y / 1000) * mV), expected, places = 12)
+        with self.assertRaises(ValueError):
+            normalized_cross_correlation(x * uV, y * s)
+        with self.assertRaises(ValueError):
+            normalized_cross_correlation(x * uV, y)
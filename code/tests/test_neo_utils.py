@@ -0,0 +1,71 @@
+import unittest
+
+import numpy as np
+from neo.core import AnalogSignal
+from quantities import Hz, mV, s, uV
+
+from neo_importers.neo_utils import detect_threshold_spikes, find_threshold_crossings
+
+# PARAMETERS FOR THIS TEST
+CHUNK_SIZES = [1, 2, 3, 7, 64, 1000, 5000]
+NUM_SIGNALS = 20
+
+## Finds the spikes of one column of a signal with a loop over the samples
+#  @param values the values of the column
+#  @param threshold the threshold
+#  @returns the lists of the start and stop indices of the spikes that end before the end of the signal
+def _loop_threshold_crossings(values: np.ndarray, threshold: float):
+    starts, stops = [], []
+    start = None
+    for idx, value in enumerate(values):
+        if value >= threshold and start is None:
+            start = idx
+        elif value < threshold and start is not None:
+            starts.append(start)
+            stops.append(idx)
+            start = None
+    return starts, stops
+
+class NeoUtilsTest(unittest.TestCase):
+
+    # Check if the chunked threshold crossings are the same as the ones of the loop over the samples, for any chunk size
+    def test_find_threshold_crossings(self):
+        rng = np.random.default_rng(5)
+        for signal_idx in range(NUM_SIGNALS):
+            # integer values, so some samples are exactly at the threshold, and long runs above the threshold that span the chunk borders
+            num_samples = int(rng.integers(1, 1000))
+            values = np.repeat(rng.integers(-3, 4, size = (num_samples, 3)), rng.integers(1, 20), axis = 0).astype(float)
+            threshold = float(rng.integers(-1, 3))
+            expected = [_loop_threshold_crossings(values[:, column], threshold) for column in range(values.shape[1])]
+            for chunk_size in CHUNK_SIZES:
+                with self.subTest(signal_idx = signal_idx, chunk_size = chunk_size):
+                    crossings = find_threshold_crossings(values, threshold, chunk_size)
+                    self.assertEqual(len(crossings), values.shape[1])
+                    for (starts, stops), (expected_starts, expected_stops) in zip(crossings, expected):
+                        self.assertEqual(starts.tolist(), expected_starts)
+                        self.assertEqual(stops.tolist(), expected_stops)
+                    # a one dimensional signal gives the crossings of its only column
+                    starts, stops = find_threshold_crossings(values[:, 0], threshold, chunk_size)[0]
+                    self.assertEqual((starts.tolist(), stops.tolist()), expected[0])
+
+    # Check if the amplitudes, waveforms and times of the detected spikes are the ones of the samples between their starts and stops
+    def test_detect_threshold_spikes(self):
+        rng = np.random.default_rng(6)
+        for signal_idx in range(NUM_SIGNALS):
+            values = rng.normal(size = (int(rng.integers(50, 500)), 2)) * 1000
+            channel = AnalogSignal(values, units = uV, sampling_rate = 100 * Hz, t_start = 2 * s)
+            for chunk_size in CHUNK_SIZES:
+                with self.subTest(signal_idx = signal_idx, chunk_size = chunk_size):
+                    spikes = detect_threshold_spikes(channel, 1 * mV, chunk_size)
+                    self.assertEqual(len(spikes), values.shape[1])
+                    for column, column_spikes in enumerate(spikes):
+                        expected_starts, expected_stops = _loop_threshold_crossings(values[:, column], 1000)
+                        self.assertEqual(column_spikes.starts.tolist(), expected_starts)
+                        self.assertEqual(column_spikes.stops.tolist(), expected_stops)
+                        self.assertTrue(np.allclose(column_spikes.times.rescale(s).magnitude, 2 + np.array(expected_starts, dtype = float) / 100))
+                        self.assertEqual(column_spikes.amplitudes.units, uV)
+                        self.assertEqual(column_spikes.amplitudes.magnitude.tolist(),
+                                         [np.max(values[start : stop, column]) for start, stop in zip(expected_starts, expected_stops)])
+                        for waveform, start, stop in zip(column_spikes.waveforms.magnitude[:, 0, :], expected_starts, expected_stops):
+                            self.assertEqual(waveform[: stop - start].tolist(), values[start : stop, column].tolist())
+                            self.assertTrue(np.all(np.isnan(waveform[stop - start :])))
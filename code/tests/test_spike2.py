@@ -1,12 +1,19 @@
 from tests.helpers import download_files
 import unittest
 import os
+import sys
+import shutil
+import subprocess
+import tempfile
 from pathlib import Path
 
 import neo
+import numpy as np
+from quantities import s, ms, Hz
 
 import neo_importers.neo_spike_importer as spike_importer
-from neo_importers.neo_wrapper import MNGRecording
+import neo_importers.neo_spike_batch_importer as spike_batch_importer
+from neo_importers.neo_wrapper import MNGRecording, ChannelView
 
 # PARAMETERS FOR THIS TEST
 TEST_DIR_NAME = Path("..")/"resources"/"test"/"spike2"
@@ -15,10 +22,18 @@ FILE_URLS = ["https://gin.g-node.org/fschlebusch/openMNGlab-testdata/raw/688671e
 
 class Spike2ImporterTest(unittest.TestCase):
 
-    def setUp(self) -> None:
-        
+    @classmethod
+    def setUpClass(cls) -> None:
         download_files(FILE_URLS, FILENAMES, TEST_DIR_NAME)
+        # the block that the tests of the recording share, each of them gets its own recording of it
+        cls.block, cls.id_map = spike_importer.import_spike_file(Path(os.path.join(TEST_DIR_NAME, FILENAMES[0])), 
+                                                                 stimuli_event_channels={"DigMark"},
+                                                                 action_potential_channels={"nw-1#2"}
+                                                                )
+        return super().setUpClass()
 
+    def setUp(self) -> None:
+        self.recording: MNGRecording = MNGRecording(self.block.segments[0])
         return super().setUp()
 
     def test_spike2_import(self):
@@ -38,4 +53,177 @@ class Spike2ImporterTest(unittest.TestCase):
 
         self.assertGreater(len(recording.action_potential_channels), 0)
         self.assertGreater(len(recording.electrical_stimulus_channels), 0)
-        self.assertGreater(len(recording.raw_data_channels), 0)
\ No newline at end of file
+        self.assertGreater(len(recording.raw_data_channels), 0)
+
+    # Check if the lazy import loads the same referenced channels as the eager one, and if it can restrict the import to a time window
+    def test_spike2_lazy_import(self):
+        fname = Path(os.path.join(TEST_DIR_NAME, FILENAMES[0]))
+        bl, id_map = self.block, self.id_map
+        lazy_bl, lazy_id_map = spike_importer.import_spike_file(fname, stimuli_event_channels={"DigMark"}, action_potential_channels={"nw-1#2"}, lazy=True)
+        self.assertEqual(id_map, lazy_id_map)
+        seg: neo.core.Segment = bl.segments[0]
+        lazy_seg: neo.core.Segment = lazy_bl.segments[0]
+        self.assertEqual([st.name for st in seg.spiketrains], [st.name for st in lazy_seg.spiketrains])
+        self.assertTrue(np.array_equal(seg.spiketrains[0].times.magnitude, lazy_seg.spiketrains[0].times.magnitude))
+        self.assertTrue(np.array_equal(seg.events[0].times.magnitude, lazy_seg.events[0].times.magnitude))
+        self.assertTrue(np.array_equal(seg.analogsignals[0].magnitude, lazy_seg.analogsignals[0].magnitude))
+
+        window_bl, _ = spike_importer.import_spike_file(fname, stimuli_event_channels={"DigMark"}, action_potential_channels={"nw-1#2"}, 
+                                                        t_start=10 * s, t_stop=20 * s)
+        window_seg: neo.core.Segment = window_bl.segments[0]
+        self.assertTrue(all((ev.times >= 10 * s).all() and (ev.times <= 20 * s).all() for ev in window_seg.events))
+        self.assertLess(len(window_seg.analogsignals[0]), len(seg.analogsignals[0]))
+
+    # Check if the batch import stores the same channels as the single file import, and if up to date files are skipped
+    def test_spike2_batch_import(self):
+        fname = Path(os.path.join(TEST_DIR_NAME, FILENAMES[0]))
+        id_map = self.id_map
+        with tempfile.TemporaryDirectory() as output_dir:
+            manifest = spike_batch_importer.import_spike_files(TEST_DIR_NAME, output_dir, workers=1,
+                                                               stimuli_event_channels={"DigMark"}, action_potential_channels={"nw-1#2"})
+            entry = manifest[fname.name]
+            self.assertNotIn("error", entry)
+            self.assertTrue((Path(output_dir)/entry["output"]).is_file())
+            self.assertEqual(entry["channel_id_map"], {type_id.value: channels for type_id, channels in id_map.items()})
+            self.assertGreater(entry["duration"], 0)
+
+            manifest = spike_batch_importer.import_spike_files(TEST_DIR_NAME, output_dir, workers=1,
+                                                               stimuli_event_channels={"DigMark"}, action_potential_channels={"nw-1#2"})
+            self.assertEqual(manifest[fname.name]["timing"], entry["timing"])
+            self.assertGreaterEqual(entry["peak_memory_mb"], 0)
+
+    # Check if the fingerprint of the import arguments is the same in different interpreter sessions, also for channels with marker sets
+    def test_batch_import_fingerprint(self):
+        fname = Path(os.path.join(TEST_DIR_NAME, FILENAMES[0]))
+        script = "import sys; from neo_importers import import_cache; from neo_importers.neo_spike_batch_importer import _canonical_argument; " \
+            "print(import_cache.fingerprint([sys.argv[1]], stimuli_event_channels = _canonical_argument({'DigMark': {'A', 'B', 'C', 'D'}, 'Keyboard': {'x', 'y'}})))"
+        keys = set()
+        for seed in ["1", "2"]:
+            result = subprocess.run([sys.executable, "-c", script, str(fname)], env = {**os.environ, "PYTHONHASHSEED": seed},
+                                    stdout = subprocess.PIPE, universal_newlines = True, check = True)
+            keys.add(result.stdout)
+        self.assertEqual(len(keys), 1)
+
+    # Check if files with the same name in different directories are imported into different outputs
+    def test_batch_import_same_names(self):
+        fname = Path(os.path.join(TEST_DIR_NAME, FILENAMES[0]))
+        with tempfile.TemporaryDirectory() as input_dir, tempfile.TemporaryDirectory() as output_dir:
+            for subject in ["subject1", "subject2"]:
+                os.makedirs(os.path.join(input_dir, subject))
+                shutil.copy(fname, os.path.join(input_dir, subject, fname.name))
+            manifest = spike_batch_importer.import_spike_files(os.path.join(input_dir, "*", fname.name), output_dir, workers=0, root=input_dir,
+                                                               stimuli_event_channels={"DigMark"}, action_potential_channels={"nw-1#2"})
+            self.assertEqual(set(manifest), {f"subject1/{fname.name}", f"subject2/{fname.name}"})
+            for entry in manifest.values():
+                self.assertNotIn("error", entry)
+                self.assertIsNone(entry["peak_memory_mb"])
+                self.assertTrue((Path(output_dir)/entry["output"]).is_file())
+
+            # a narrower pattern keeps the names relative to the root, so the file is up to date, and only its entry is returned
+            narrow_manifest = spike_batch_importer.import_spike_files(os.path.join(input_dir, "subject1", "*.smr"), output_dir, workers=0, root=input_dir,
+                                                                      stimuli_event_channels={"DigMark"}, action_potential_channels={"nw-1#2"})
+            self.assertEqual(set(narrow_manifest), {f"subject1/{fname.name}"})
+            self.assertEqual(narrow_manifest[f"subject1/{fname.name}"]["timing"], manifest[f"subject1/{fname.name}"]["timing"])
+            with self.assertRaises(ValueError):
+                spike_batch_importer.import_spike_files(os.path.join(input_dir, "*", fname.name), output_dir, workers=0, root=os.path.join(input_dir, "subject1"),
+                                                        stimuli_event_channels={"DigMark"}, action_potential_channels={"nw-1#2"})
+
+    # Check if the columnar accessors of the channels return the same values as the wrappers of the datapoints
+    def test_columnar_access(self):
+        recording = self.recording
+
+        ap_channel = next(iter(recording.action_potential_channels.values()))
+        self.assertTrue(np.array_equal(ap_channel.times(unitless = True), [float(ap.time) for ap in ap_channel]))
+        self.assertEqual(ap_channel.times(unitless = True).dtype, np.float64)
+        self.assertTrue(np.array_equal(ap_channel.durations(), [ap.duration for ap in ap_channel]))
+        self.assertEqual(ap_channel.waveforms().shape[0], len(ap_channel))
+        self.assertEqual(len(ap_channel.amplitudes()), len(ap_channel))
+
+        es_channel = next(iter(recording.electrical_stimulus_channels.values()))
+        mask = np.arange(len(es_channel)) % 2 == 0
+        self.assertTrue(np.array_equal(es_channel.times(mask), [stim.time for stim in es_channel][::2]))
+        self.assertTrue(np.array_equal(es_channel.intervals([1, 2], unitless = True), [float(es_channel[1].interval), float(es_channel[2].interval)]))
+        with self.assertRaises(ValueError):
+            es_channel.waveforms()
+
+    # Check if slices and selections of the channels are views that give the same datapoints as the channel
+    def test_channel_views(self):
+        recording = self.recording
+
+        ap_channel = next(iter(recording.action_potential_channels.values()))
+        view = ap_channel[1::2]
+        self.assertIsInstance(view, ChannelView)
+        self.assertEqual(len(view), len(ap_channel) // 2)
+        self.assertEqual([ap.index for ap in view], list(range(1, len(ap_channel), 2)))
+        self.assertEqual(view[-1].index, ap_channel[len(view) * 2 - 1].index)
+        self.assertTrue(np.array_equal(view.times(), ap_channel.times()[1::2]))
+        self.assertTrue(np.array_equal(view[:3].times(unitless = True), ap_channel.times(unitless = True)[[1, 3, 5]]))
+
+        mask = ap_channel.times() > ap_channel[len(ap_channel) // 2].time
+        selection = ap_channel[mask]
+        self.assertEqual(len(selection), np.count_nonzero(mask))
+        self.assertTrue(np.array_equal(selection.durations(), ap_channel.durations(mask)))
+        self.assertFalse(hasattr(selection[0], "__dict__"))
+
+    # Check if the sweep index assigns each AP to the last stimulus before it, and if it is cached
+    def test_sweep_index(self):
+        recording = self.recording
+
+        es_id = next(iter(recording.electrical_stimulus_channels))
+        ap_id = next(iter(recording.action_potential_channels))
+        sweep_index = recording.sweep_index(es_id, ap_id)
+        self.assertIs(sweep_index, recording.sweep_index(es_id, ap_id))
+        self.assertEqual(len(sweep_index), len(recording.electrical_stimulus_channels[es_id]))
+
+        stimulus_times = recording.electrical_stimulus_channels[es_id].times(unitless = True)
+        ap_times = recording.action_potential_channels[ap_id].times().rescale(s).magnitude
+        for ap_idx in range(0, len(ap_times), max(len(ap_times) // 50, 1)):
+            expected = np.count_nonzero(stimulus_times <= ap_times[ap_idx]) - 1
+            self.assertEqual(sweep_index.sweep_indices[ap_idx], expected)
+            if expected >= 0:
+                self.assertIn(ap_idx, sweep_index.aps(expected))
+                self.assertAlmostEqual(float(sweep_index.latencies[ap_idx].rescale(s)), ap_times[ap_idx] - stimulus_times[expected])
+
+        recording.invalidate_sweep_indices(ap_id)
+        self.assertIsNot(sweep_index, recording.sweep_index(es_id, ap_id))
+
+    # Check if a time window of the recording contains the datapoints within the window, and views of the raw data
+    def test_time_window(self):
+        recording = self.recording
+
+        ap_id = next(iter(recording.action_potential_channels))
+        ap_times = recording.action_potential_channels[ap_id].times().rescale(s).magnitude
+        t_start, t_stop = ap_times[len(ap_times) // 4] * s, ap_times[len(ap_times) // 2] * s
+        window = recording.time_window(t_start, t_stop)
+        self.assertEqual(list(window.action_potential_channels[ap_id].indices), list(np.nonzero((ap_times >= ap_times[len(ap_times) // 4]) & (ap_times < ap_times[len(ap_times) // 2]))[0]))
+        for es_id, stimuli in window.electrical_stimulus_channels.items():
+            stimulus_times = recording.electrical_stimulus_channels[es_id].times().rescale(s).magnitude
+            self.assertEqual(len(stimuli), np.count_nonzero((stimulus_times >= float(t_start)) & (stimulus_times < float(t_stop))))
+        for rd_id, signal in window.raw_data_channels.items():
+            raw_signal = recording.raw_data_channels[rd_id]
+            start_idx, stop_idx = window.raw_data_ranges[rd_id]
+            self.assertTrue(np.shares_memory(signal, raw_signal))
+            self.assertTrue(np.array_equal(signal.magnitude, raw_signal.magnitude[start_idx : stop_idx]))
+            self.assertLessEqual(abs(float((signal.t_start - t_start).rescale(s))), float(raw_signal.sampling_period.rescale(s)))
+
+    # Check if the rows of the sweep matrix are the raw data behind each stimulus, and if the matrix is cached
+    def test_sweep_matrix(self):
+        recording = self.recording
+
+        es_id = next(iter(recording.electrical_stimulus_channels))
+        rd_id = next(iter(recording.raw_data_channels))
+        signal = recording.raw_data_channels[rd_id]
+        sweep_matrix = recording.sweep_matrix(es_id, rd_id, 100 * ms)
+        self.assertIs(sweep_matrix, recording.sweep_matrix(es_id, rd_id, 100 * ms))
+        self.assertEqual(sweep_matrix.matrix.shape, (len(recording.electrical_stimulus_channels[es_id]), int(0.1 * float(signal.sampling_rate.rescale(Hz)))))
+        self.assertEqual(sweep_matrix.is_view, np.shares_memory(sweep_matrix.matrix, signal))
+
+        stimulus_times = recording.electrical_stimulus_channels[es_id].times().rescale(s).magnitude
+        samples = signal.magnitude[:, 0]
+        for row in range(0, len(sweep_matrix), max(len(sweep_matrix) // 20, 1)):
+            first_idx = int(np.floor((stimulus_times[row] - float(signal.t_start.rescale(s))) * float(signal.sampling_rate.rescale(Hz))))
+            if first_idx >= 0:
+                self.assertTrue(np.array_equal(sweep_matrix.sweep(row).magnitude, samples[first_idx : first_idx + sweep_matrix.lengths[row]]))
+
+        part = recording.sweep_matrix(es_id, rd_id, 100 * ms, sweeps = slice(1, 4))
+        self.assertTrue(np.array_equal(part.matrix, sweep_matrix.matrix[1:4], equal_nan = True))